@@ -1,24 +1,23 @@
 import os
-import re
-from pathlib import Path
+import json
 from typing import Optional
-import asyncio
-import concurrent.futures
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException, BackgroundTasks
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from io import BytesIO
 
-from app.models.state_schema import SOPState
-from app.utils.json_parser import parse_json
-from app.workflow import create_workflow
-from app.services.rag_services.rag import fetch_relevant_issues
-from app.services.file_services.create_pdf import create_pdf_from_screenshots
+from app.services.template_services.template_store import broadcast_template_invalidation
+from app.services.ai_services.screenshot_parts import INPUT_MODES
 from app.services.file_services.pdf_converter import convert_to_pdf
 from app.services.file_services.docx_converter import convert_to_docx
-from app.services.file_services.file_readers import read_excel_file, read_pdf_file, read_docx_file
-from app.core.database import get_supabase_client
+from app.core.repositories import get_generated_docs_repository
+from app.core.job_queue import submit_job, QueueFullError
+from app.core.rate_limiter import PRIORITY_INTERACTIVE, RateLimitTimeout, get_generate_rate_limiter
+from app.config.pipeline_config import RateLimitConfig
+from app.services.ai_services.prompt_budget import count_tokens
+from app.services.ai_services.model_router import route_model
+from app.prompts.rephrase_prompts import rephrase_prompt_template
+from app.core.status_bus import get_status_bus, publish_job_status
 from app.config.logging import get_logger
-from app.utils.download_screenshot import download_screenshot
 from app.utils.update_status import update_document_status
 
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -29,294 +28,37 @@ logger = get_logger(__name__)
 # Create router
 router = APIRouter()
 
-# Initialize workflow
-workflow = create_workflow()
-
-async def process_sop_generation(
-    file_content: Optional[bytes],
-    file_filename: Optional[str],
-    user_id: str,
-    job_id: str,
-    query: str,
-    templates_id: str,
-    integration_type: str
-):
+async def mark_job_abandoned(job_id: str) -> None:
     """
-    Background task to handle SOP generation logic.
+    Called by the worker pool when a job exhausted its attempts without finishing
+    (e.g. every worker that picked it up died).
     """
-    temp_files = []
-    screenshot_info = []
-    full_component_schema: Optional[dict] = None
-    supabase = get_supabase_client()
-
     try:
-        logger.debug(f"Starting background SOP generation for user_id={user_id}, job_id={job_id}, template_id='{templates_id}', integration_type='{integration_type}'")
-
-        # --- Initialize Record with 'pending' Status ---
-        logger.info(f"Initializing generated_docs record with status='pending' for job_id={job_id}")
-        try:
-            supabase.table("generated_docs").upsert(
-                {"id": job_id, "user_id": user_id, "status": "pending"},
-                on_conflict="id"
-            ).execute()
-            logger.info(f"Initialized generated_docs record for job_id={job_id}")
-        except Exception as e:
-            logger.error(f"Failed to initialize generated_docs record: {str(e)}")
-            update_document_status(supabase, job_id, "failed")
-            return
-
-        # --- Fetch Template Components Schema from Supabase ---
-        try:
-            logger.debug(f"Fetching template components schema for template_id={templates_id}, user_id={user_id}")
-            response = supabase.table('templates') \
-                             .select('components','name') \
-                             .eq('id', templates_id) \
-                             .eq('user_id', user_id) \
-                             .maybe_single() \
-                             .execute()
-
-            logger.debug(f"Supabase template query response: {response}")
-            logger.debug(f"Supabase template query response data: {getattr(response, 'data', None)}")
-
-            if response and hasattr(response, 'data') and response.data and 'components' in response.data:
-                full_component_schema = response.data['components']
-                category_name = response.data.get('name', 'SOP')
-            else:
-                logger.info(f"Template not found in private table. Checking 'publictemplates' table.")
-                public_response = supabase.table('publictemplates') \
-                                        .select('components, name') \
-                                        .eq('id', templates_id) \
-                                        .maybe_single() \
-                                        .execute()
-                
-                logger.debug(f"Supabase public template query response: {public_response}")
-                logger.debug(f"Supabase public template query response data: {getattr(public_response, 'data', None)}")
-                
-                if public_response and hasattr(public_response, 'data') and public_response.data and 'components' in public_response.data:
-                    full_component_schema = public_response.data['components']
-                    category_name = public_response.data.get('name', 'SOP')
-                    logger.info(f"Template found in publictemplates table for template_id={templates_id}")
-                else:
-                    logger.error(f"No components found for template_id={templates_id} in both private and public tables")
-                    update_document_status(supabase, job_id, "failed")
-                    return
-
-        except Exception as e:
-            logger.error(f"Failed to fetch template schema: {str(e)}")
-            update_document_status(supabase, job_id, "failed")
-            return
-
-        # --- File Processing ---
-        storage = supabase.storage.from_('log_dataa')
-        json_directory = f"{user_id}/{job_id}/json"
-        screenshots_directory = f"{user_id}/{job_id}/screenshots"
-        logger.debug(f"JSON Directory: {json_directory}")
-        logger.debug(f"Screenshot Directory: {screenshots_directory}")
-
-        try:
-            json_files = storage.list(json_directory)
-            screenshot_files = storage.list(screenshots_directory)
-            logger.debug(f"Found JSON files: {len(json_files) if json_files else 0}")
-            logger.debug(f"Found screenshot files: {len(screenshot_files) if screenshot_files else 0}")
-        except Exception as e:
-            logger.error(f"Failed to list storage directories: {str(e)}")
-            update_document_status(supabase, job_id, "failed")
-            return
-
-        if not json_files and not screenshot_files:
-            update_document_status(supabase, job_id, "failed")
-            return
-
-        # Process uploaded file content based on file type
-        uploaded_file_content = ""
-        if file_content is not None and file_filename is not None:
-            file_extension = Path(file_filename).suffix.lower()
-            if file_extension in ['.xlsx', '.xls']:
-                uploaded_file_content = read_excel_file(file_content)
-            elif file_extension == '.pdf':
-                uploaded_file_content = read_pdf_file(file_content)
-            elif file_extension == '.docx':
-                uploaded_file_content = read_docx_file(file_content)
-
-        # Process screenshots in parallel
-        if screenshot_files:
-            logger.info(f"Starting parallel download of {len(screenshot_files)} screenshots...")
-            download_tasks = []
-            for file in screenshot_files:
-                file_name = file.get('name')
-                if file_name and file_name.lower().endswith(('.png', '.jpg', '.jpeg')) and file_name != '.emptyFolderPlaceholder':
-                    full_path = f"{screenshots_directory}/{file_name}"
-                    safe_local_name = file_name.replace('/', '_').replace('\\', '_')
-                    temp_path = f"temp_{user_id}_{job_id}_{safe_local_name}"
-                    task = download_screenshot(storage, full_path, temp_path, file_name)
-                    download_tasks.append(task)
-            
-            max_concurrent_downloads = 10
-            semaphore = asyncio.Semaphore(max_concurrent_downloads)
-            
-            async def bounded_download(task):
-                async with semaphore:
-                    return await task
-            
-            logger.debug(f"Processing {len(download_tasks)} screenshot downloads with max concurrency of {max_concurrent_downloads}")
-            results = await asyncio.gather(*[bounded_download(task) for task in download_tasks], return_exceptions=True)
-            
-            successful_downloads = 0
-            for result in results:
-                if isinstance(result, tuple) and result is not None:
-                    temp_path, file_name = result
-                    screenshot_info.append((temp_path, file_name))
-                    temp_files.append(temp_path)
-                    successful_downloads += 1
-                elif isinstance(result, Exception):
-                    logger.error(f"Download task failed with exception: {str(result)}")
-            
-            logger.info(f"Completed parallel downloads: {successful_downloads}/{len(download_tasks)} successful")
-
-        # Process JSON file
-        json_path = None
-        json_file_name_to_process = None
-        if json_files:
-            for file in json_files:
-                file_name = file.get('name')
-                if file_name and file_name.lower().endswith('.json') and file_name != '.emptyFolderPlaceholder':
-                    json_path = f"{json_directory}/{file_name}"
-                    json_file_name_to_process = file_name
-                    logger.debug(f"JSON file selected: {json_path}")
-                    break
-
-        if not screenshot_info: 
-            update_document_status(supabase, job_id, "failed")
-            return
-        if not json_path: 
-            update_document_status(supabase, job_id, "failed")
-            return
-
-        # Create PDF
-        pdf_temp_path = f"temp_{user_id}_{job_id}_generated.pdf"
-        try:
-            logger.debug(f"Creating PDF: {pdf_temp_path}")
-            if not screenshot_info: 
-                raise ValueError("No screenshots for PDF")
-            create_pdf_from_screenshots(screenshot_info, pdf_temp_path)
-            temp_files.append(pdf_temp_path)
-            logger.debug("PDF created")
-        except Exception as e:
-            logger.error(f"Failed to create PDF: {str(e)}")
-            update_document_status(supabase, job_id, "failed")
-            return
-
-        # Process JSON data
-        try:
-            safe_json_filename = re.sub(r'[^\w\-_.]', '_', json_file_name_to_process)
-            short_json_filename = safe_json_filename[:50] + Path(safe_json_filename).suffix
-            json_temp_path = f"temp_{user_id}_{job_id}_{short_json_filename}"
-            
-            logger.debug(f"Downloading event JSON: {json_path}")
-            json_response = storage.download(json_path)
-            if not isinstance(json_response, bytes):
-                logger.error(f"Failed download event JSON: {json_file_name_to_process}")
-                update_document_status(supabase, job_id, "failed")
-                return
-            with open(json_temp_path, "wb") as f: 
-                f.write(json_response)
-            temp_files.append(json_temp_path)
-            logger.debug(f"Saved temp event JSON: {json_temp_path}")
-            event_data = await parse_json(json_temp_path)
-            logger.debug(f"Parsed event data type: {type(event_data)}")
-            if not event_data: 
-                update_document_status(supabase, job_id, "failed")
-                return
-            if isinstance(event_data, list) and event_data and isinstance(event_data[0], dict) and "error" in event_data[0]:
-                update_document_status(supabase, job_id, "failed")
-                return
-        except Exception as e:
-            logger.error(f"Event JSON processing failed: {str(e)}")
-            update_document_status(supabase, job_id, "failed")
-            return
-
-        # --- Fetch RAG Context ---
-        rag_context = f"{integration_type.capitalize()} context unavailable."
-        try:
-            logger.debug(f"Fetching relevant issues for query: {query}, integration_type: {integration_type}")
-            if integration_type:
-                relevant_issues = fetch_relevant_issues(user_id, query, integration_type, top_k=5)
-                if relevant_issues:
-                    rag_context = "\n".join([
-                        f"{integration_type.capitalize()} Item: {issue.get('issue_id', 'N/A')}\nDetails: {issue.get('text_data', 'N/A')}" 
-                        for issue in relevant_issues
-                    ])
-                else: 
-                    rag_context = f"No relevant {integration_type} items found."
-            logger.debug("Fetched RAG context")
-        except Exception as e:
-            logger.warning(f"Error fetching {integration_type} issues: {str(e)}")
-            rag_context = f"Error fetching {integration_type} issues: {str(e)}"
-
-        # --- Prepare and Invoke Workflow ---
-        knowledge_base = f"### Relevant {integration_type.capitalize()} Content:\n{rag_context}\n"
-        logger.debug("Prepared knowledge base")
-
-        try:
-            logger.debug("Invoking workflow with component schema...")
-            initial_state = SOPState(
-                KB=knowledge_base,
-                file_path=pdf_temp_path,
-                user_id=user_id,
-                job_id=job_id,
-                event_data=event_data,
-                user_query=query,
-                components=full_component_schema,
-                category_name=category_name,
-                contents=uploaded_file_content
-            )
-            result = await workflow.ainvoke(initial_state)
-            logger.debug("SOP workflow completed")
-            logger.debug(f"SOP result type: {type(result)}")
-
-            # --- Verify Status After Workflow ---
-            response = supabase.table('generated_docs').select('status').eq('id', job_id).single().execute()
-            if response.data and response.data.get('status') != 'success':
-                logger.warning(f"Workflow completed but status is {response.data.get('status')} for job_id={job_id}")
-                update_document_status(supabase, job_id, "success")
-
-        except Exception as e:
-            logger.error(f"SOP workflow failed: {str(e)}")
-            update_document_status(supabase, job_id, "failed")
-            return
-
+        await update_document_status(job_id, "failed")
     except Exception as e:
-        logger.error(f"Fatal unexpected error in background task: {str(e)}")
-        update_document_status(supabase, job_id, "failed")
-    finally:
-        # --- Cleanup Temporary Files ---
-        logger.debug(f"Cleaning up {len(temp_files)} temporary files...")
-        cleaned_count = 0
-        for temp_file in temp_files:
-            try:
-                if temp_file and os.path.exists(temp_file):
-                    os.remove(temp_file)
-                    cleaned_count += 1
-            except Exception as e:
-                logger.warning(f"Temp file cleanup failed for {temp_file}: {str(e)}")
-        logger.debug(f"Cleanup finished. Removed {cleaned_count} files.")
+        logger.error(f"Failed to mark abandoned job {job_id} as failed: {str(e)}")
 
 @router.post("/generate")
 async def generate_sop_api(
-    background_tasks: BackgroundTasks,
     file: Optional[UploadFile] = File(None),
     user_id: str = Form(...),
     job_id: str = Form(...),
     query: str = Form(...),
     templates_id: str = Form(...),
-    integration_type: str = Form(...)
+    integration_type: str = Form(...),
+    input_mode: Optional[str] = Form(None)
 ):
     """
     API endpoint to generate SOP using a component schema defined
     in a user-specific template (from JSONB).
-    Returns immediate acknowledgment and processes SOP generation in the background.
+    input_mode ("pdf", "images" or "auto") selects how screenshots are given to the model.
+    Returns immediate acknowledgment and queues SOP generation on the persistent job queue.
+    Returns 429 with a Retry-After header when the queue is full.
     Updates the status in the generated_docs table.
     """
+    if input_mode is not None and input_mode.lower() not in INPUT_MODES:
+        raise HTTPException(status_code=400, detail=f"input_mode must be one of {', '.join(INPUT_MODES)}")
+
     try:
         logger.debug(f"Received SOP generation request for user_id={user_id}, job_id={job_id}, template_id='{templates_id}', integration_type='{integration_type}'")
 
@@ -327,17 +69,24 @@ async def generate_sop_api(
             file_content = await file.read()
             file_filename = file.filename
 
-        # Add SOP generation task to background
-        background_tasks.add_task(
-            process_sop_generation,
-            file_content,
-            file_filename,
-            user_id,
+        # Persist the job; a worker slot picks it up when one is free
+        queued = await submit_job(
             job_id,
-            query,
-            templates_id,
-            integration_type
+            {
+                "file_filename": file_filename,
+                "user_id": user_id,
+                "job_id": job_id,
+                "query": query,
+                "templates_id": templates_id,
+                "integration_type": integration_type,
+                "input_mode": input_mode.lower() if input_mode else None
+            },
+            file_content
         )
+        if queued:
+            publish_job_status(job_id, status="pending", stage="queued", message="waiting for a worker")
+        else:
+            logger.info(f"Job {job_id} is already queued or running, ignoring duplicate submission")
 
         # Return immediate acknowledgment
         return {
@@ -351,31 +100,109 @@ async def generate_sop_api(
             }
         }
 
+    except QueueFullError as e:
+        logger.warning(f"Rejecting job_id={job_id}: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail="SOP generation queue is full, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Error queuing SOP generation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to queue SOP generation: {str(e)}")
 
+async def _fetch_document_status(job_id: str) -> Optional[str]:
+    """Status column of the job's generated_docs record, or None if there is none."""
+    return await get_generated_docs_repository().get_status(job_id)
+
 @router.get("/status/{job_id}")
 async def check_job_status(job_id: str):
     """
     API endpoint to check the status of a background SOP generation task.
+    Answered from the job status bus; Supabase is only queried for jobs the bus does not know
+    (e.g. finished longer ago than the snapshot TTL).
+    While the model streams the document, "partial" holds the sections generated so far as markdown.
     """
     try:
-        supabase = get_supabase_client()
-        response = supabase.table('generated_docs').select('status').eq('id', job_id).single().execute()
-        
-        if response.data:
-            return {
+        snapshot = await get_status_bus().get(job_id)
+        if snapshot is not None:
+            response = {
                 "job_id": job_id,
-                "status": response.data.get('status', 'not_found')
+                "status": snapshot.get("status", "pending"),
+                "stage": snapshot.get("stage"),
+                "message": snapshot.get("message"),
+                "progress": snapshot.get("progress", {})
             }
-        else:
+            if snapshot.get("partial"):
+                response["partial"] = snapshot["partial"]
+            return response
+
+        status = await _fetch_document_status(job_id)
+        if status is None:
             raise HTTPException(status_code=404, detail="Job not found")
-            
+        return {
+            "job_id": job_id,
+            "status": status
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error checking job status for job_id={job_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to check job status: {str(e)}")
 
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Server-sent event stream of a job's status and per-stage progress.
+    Sends an `event: status` message on every change (including each newly generated section,
+    in "partial") and closes once the job succeeded or failed.
+    """
+    snapshot = await get_status_bus().get(job_id)
+    known_to_bus = snapshot is not None
+    if not known_to_bus:
+        # Not known to the bus; answer once from Supabase
+        try:
+            status = await _fetch_document_status(job_id)
+        except Exception as e:
+            logger.error(f"Error checking job status for job_id={job_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to check job status: {str(e)}")
+        if status is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        snapshot = {"job_id": job_id, "status": status}
+
+    def format_event(data: dict) -> str:
+        return f"event: status\ndata: {json.dumps(data)}\n\n"
+
+    async def event_source():
+        if not known_to_bus:
+            yield format_event(snapshot)
+            return
+        async for update in get_status_bus().stream(job_id):
+            if await request.is_disconnected():
+                logger.debug(f"Event stream client for job_id={job_id} disconnected")
+                return
+            yield ": keep-alive\n\n" if update is None else format_event(update)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/templates/{template_id}/invalidate")
+async def invalidate_template_cache(template_id: str, user_id: Optional[str] = Form(None)):
+    """
+    API endpoint to drop a template from the schema cache after it was edited.
+    Every worker on the node drops its entries before its next template lookup
+    (invalidated_entries counts this worker's); other nodes rely on the realtime listener or the TTL.
+    """
+    removed = await broadcast_template_invalidation(template_id, user_id)
+    return {
+        "template_id": template_id,
+        "invalidated_entries": removed
+    }
+
 @router.post("/rephrase")
 async def rephrase_markdown(
     query: str = Form(...),
@@ -386,6 +213,8 @@ async def rephrase_markdown(
     """
     API endpoint to rephrase a specific section of a markdown string using Google Gemini via LangChain,
     based on the user query, returning only the updated section and job_id.
+    Served ahead of background generation by the rate limiter; returns 429 with a Retry-After
+    header if the model quota stays exhausted for too long.
     """
     try:
         logger.debug(f"Rephrasing markdown section for job_id={job_id if job_id else 'None'}")
@@ -398,10 +227,19 @@ async def rephrase_markdown(
         if text_to_update not in markdown_text:
             raise HTTPException(status_code=400, detail="Specified section not found in the markdown text")
 
-        # Initialize Google Gemini model
+        # Create LangChain prompt
+        prompt = rephrase_prompt_template.format(
+            query=query,
+            markdown_text=markdown_text,
+            text_to_update=text_to_update
+        )
+        prompt_tokens = count_tokens(prompt)
+
+        # Initialize Google Gemini model of the tier chosen for this request
+        routing = await route_model("rephrase", prompt_tokens, job_id=job_id)
         try:
             gemini_model = ChatGoogleGenerativeAI(
-                model="gemini-2.0-flash",  # Updated to a valid model name
+                model=routing.model_name,
                 google_api_key=os.getenv("GOOGLE_API_KEY"),
                 temperature=0,
             )
@@ -409,16 +247,22 @@ async def rephrase_markdown(
             logger.error(f"Failed to initialize Google Gemini model: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Model initialization failed: {str(e)}")
 
-        # Create LangChain prompt
-        prompt = rephrase_prompt_template.format(
-            query=query,
-            markdown_text=markdown_text,
-            text_to_update=text_to_update
-        )
-
-        # Invoke Google Gemini model
+        # Wait for the model quota (ahead of background generation), then invoke Google Gemini model
+        try:
+            await get_generate_rate_limiter().acquire(
+                prompt_tokens + count_tokens(text_to_update),
+                PRIORITY_INTERACTIVE,
+                timeout=RateLimitConfig.INTERACTIVE_MAX_WAIT_SECONDS
+            )
+        except RateLimitTimeout as e:
+            logger.warning(f"Rejecting rephrase for job_id={job_id}: {str(e)}")
+            raise HTTPException(
+                status_code=429,
+                detail="Model quota is exhausted, please retry later",
+                headers={"Retry-After": str(max(1, round(e.retry_after)))}
+            )
         try:
-            response = gemini_model.invoke(prompt)
+            response = await gemini_model.ainvoke(prompt)
             rephrased_section = response.content if hasattr(response, 'content') else str(response)
             logger.debug(f"Rephrasing successful for job_id={job_id if job_id else 'None'}")
         except Exception as e:
@@ -0,0 +1,9 @@
+"""
+Application configuration.
+
+The .env file is loaded here, once, before any config module reads os.getenv,
+whichever of them is imported first.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
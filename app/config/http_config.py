@@ -0,0 +1,32 @@
+"""
+Configuration for the shared outbound HTTP client.
+"""
+import os
+
+
+class HttpClientConfig:
+    """Connection pool and timeout settings for the process-wide async HTTP client."""
+
+    # Total connections the pool may open, and how many idle keep-alive connections it keeps
+    MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+    # Negotiate HTTP/2 when the server and the h2 package support it
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+    CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+    READ_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "60"))
+
+    # Size of the chunks streamed from storage downloads
+    STREAM_CHUNK_BYTES: int = int(os.getenv("HTTP_STREAM_CHUNK_BYTES", str(256 * 1024)))
+
+
+class SupabaseClientConfig:
+    """Health checking of this process's Supabase connections."""
+
+    # How often the lifespan task probes Supabase; 0 disables the periodic check
+    HEALTH_CHECK_INTERVAL_SECONDS: float = float(os.getenv("SUPABASE_HEALTH_CHECK_INTERVAL_SECONDS", "30"))
+
+    # Consecutive failed probes after which the clients and the HTTP connection pool are rebuilt
+    RECONNECT_AFTER_FAILURES: int = int(os.getenv("SUPABASE_RECONNECT_AFTER_FAILURES", "2"))
@@ -0,0 +1,69 @@
+"""
+Configuration for the persistent SOP generation job queue.
+"""
+import os
+
+
+class JobQueueConfig:
+    """Configuration settings for the job queue and per-process worker pool."""
+
+    # SQLite database shared by every gunicorn worker on the node.
+    # Use ":memory:" for a process-local stand-in (e.g. in tests).
+    DATABASE_PATH: str = os.getenv("JOB_QUEUE_DB_PATH", "data/job_queue.sqlite3")
+
+    # Maximum number of queued (not yet running) jobs before /generate returns 429
+    MAX_DEPTH: int = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100"))
+
+    # Number of SOP generations each worker process runs at the same time
+    WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+
+    # Value of the Retry-After header sent with a 429 response
+    RETRY_AFTER_SECONDS: int = int(os.getenv("JOB_QUEUE_RETRY_AFTER_SECONDS", "30"))
+
+    # A running job whose lease is not renewed within this window is handed to another worker
+    LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+    # Jobs are given up after this many attempts (worker crashes, recycles, ...)
+    MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    # On shutdown running jobs get this long to finish before they are interrupted and requeued
+    # (keep it below graceful_timeout in gunicorn.conf.py)
+    SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("JOB_SHUTDOWN_GRACE_SECONDS", "90"))
+
+    # How often idle workers check the queue for jobs enqueued by other processes
+    POLL_INTERVAL_SECONDS: float = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+
+    # Finished jobs are removed from the queue database after this many seconds
+    RETENTION_SECONDS: int = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+
+class JobDedupConfig:
+    """Configuration settings for reusing the result of a job with identical inputs."""
+
+    # Fingerprint job inputs and join or reuse identical jobs of the same user
+    ENABLED: bool = os.getenv("JOB_DEDUP_ENABLED", "true").lower() == "true"
+
+    # A finished job's document is reused by identical jobs submitted within this window
+    REUSE_SECONDS: int = int(os.getenv("JOB_DEDUP_REUSE_SECONDS", "3600"))
+
+    # A job waiting on an identical in-flight job is returned to the queue and claimed again after this many seconds
+    JOIN_POLL_INTERVAL_SECONDS: float = float(os.getenv("JOB_DEDUP_JOIN_POLL_INTERVAL_SECONDS", "5.0"))
+
+    # A waiting job gives up and runs the pipeline itself after this many seconds
+    JOIN_TIMEOUT_SECONDS: float = float(os.getenv("JOB_DEDUP_JOIN_TIMEOUT_SECONDS", "1800"))
+
+
+class StatusBusConfig:
+    """Configuration settings for the in-process job status bus and event stream."""
+
+    # Minimum interval between writes of a job's progress snapshot to the shared queue database
+    PERSIST_INTERVAL_SECONDS: float = float(os.getenv("STATUS_PERSIST_INTERVAL_SECONDS", "0.5"))
+
+    # How often an event stream checks the shared database for jobs running in another worker
+    STREAM_POLL_INTERVAL_SECONDS: float = float(os.getenv("STATUS_STREAM_POLL_INTERVAL_SECONDS", "0.5"))
+
+    # Interval of keep-alive comments on idle event streams
+    STREAM_KEEPALIVE_SECONDS: float = float(os.getenv("STATUS_STREAM_KEEPALIVE_SECONDS", "15"))
+
+    # Seconds a job's latest snapshot is kept in memory
+    SNAPSHOT_TTL_SECONDS: float = float(os.getenv("STATUS_SNAPSHOT_TTL_SECONDS", "3600"))
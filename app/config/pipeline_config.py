@@ -0,0 +1,265 @@
+"""
+Configuration for the SOP generation pipeline (artifacts, screenshots, PDF assembly).
+"""
+import os
+from typing import Optional
+
+
+class ArtifactConfig:
+    """Configuration settings for in-memory pipeline artifacts."""
+
+    # Artifacts larger than this are moved from memory to an anonymous temp file
+    SPILL_THRESHOLD_BYTES: int = int(os.getenv("ARTIFACT_SPILL_THRESHOLD_BYTES", str(64 * 1024 * 1024)))
+
+    # Directory for spilled artifacts (e.g. /dev/shm for tmpfs); defaults to the system temp dir
+    SPILL_DIR: Optional[str] = os.getenv("ARTIFACT_SPILL_DIR") or None
+
+
+class TemplateCacheConfig:
+    """Configuration settings for the in-process template schema cache."""
+
+    # Seconds a fetched template schema is served from memory
+    TTL_SECONDS: float = float(os.getenv("TEMPLATE_CACHE_TTL_SECONDS", "300"))
+
+    # Seconds a "not in the user's private templates" result is remembered
+    NEGATIVE_TTL_SECONDS: float = float(os.getenv("TEMPLATE_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+
+    # Maximum number of cached entries (least recently used are evicted first)
+    MAX_ENTRIES: int = int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "1024"))
+
+    # Subscribe to Supabase realtime changes on the template tables to invalidate entries
+    REALTIME_INVALIDATION: bool = os.getenv("TEMPLATE_CACHE_REALTIME", "false").lower() == "true"
+
+
+class ImageNormalizationConfig:
+    """Configuration settings for screenshot normalisation before PDF assembly."""
+
+    # Downsample and re-encode screenshots on a process pool before building the PDF
+    ENABLED: bool = os.getenv("IMAGE_NORMALIZATION_ENABLED", "true").lower() == "true"
+
+    # Resolution screenshots are downsampled to for their area on the letter page
+    TARGET_DPI: int = int(os.getenv("IMAGE_TARGET_DPI", "150"))
+
+    # Quality of JPEGs produced from opaque screenshots (1-95)
+    JPEG_QUALITY: int = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+
+    # Worker processes per server process
+    MAX_WORKERS: int = int(os.getenv("IMAGE_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+class ScreenshotDedupConfig:
+    """Configuration settings for collapsing near-identical consecutive screenshots."""
+
+    # Drop screenshots that look the same as the one kept before them
+    ENABLED: bool = os.getenv("SCREENSHOT_DEDUP_ENABLED", "true").lower() == "true"
+
+    # Side of the difference-hash grid; the hash has HASH_SIZE * HASH_SIZE bits
+    HASH_SIZE: int = int(os.getenv("SCREENSHOT_HASH_SIZE", "16"))
+
+    # Screenshots whose hashes differ in at most this many bits are treated as duplicates
+    MAX_DISTANCE: int = int(os.getenv("SCREENSHOT_DEDUP_MAX_DISTANCE", "4"))
+
+
+class PdfLayoutConfig:
+    """Configuration settings for placing screenshots on PDF pages."""
+
+    # Screenshots per page: 1, 2, 4 or 6 (contact sheet), or "auto" to choose from the session
+    SCREENSHOTS_PER_PAGE: str = os.getenv("PDF_SCREENSHOTS_PER_PAGE", "1").lower()
+
+    # auto: sessions with fewer screenshots keep one screenshot per page
+    AUTO_MIN_SCREENSHOTS: int = int(os.getenv("PDF_AUTO_MIN_SCREENSHOTS", "12"))
+
+    # auto: smallest fraction of its source resolution a screenshot may be shrunk to (at IMAGE_TARGET_DPI)
+    AUTO_MIN_SCALE: float = float(os.getenv("PDF_AUTO_MIN_SCALE", "0.3"))
+
+
+class GenerationInputConfig:
+    """Configuration settings for how screenshots are given to the model."""
+
+    # "pdf" (screenshots assembled into a PDF), "images" (sent as image parts) or "auto"
+    MODE: str = os.getenv("GENERATION_INPUT_MODE", "pdf").lower()
+
+    # auto: sessions with at most this many screenshots are sent as images
+    AUTO_MAX_SCREENSHOTS: int = int(os.getenv("GENERATION_AUTO_MAX_SCREENSHOTS", "30"))
+
+    # images: screenshots are sent inline when they total at most this many bytes, else uploaded
+    INLINE_MAX_BYTES: int = int(os.getenv("GENERATION_INLINE_MAX_BYTES", str(14 * 1024 * 1024)))
+
+    # images: parallel GenAI File API uploads per job when not sent inline
+    UPLOAD_CONCURRENCY: int = int(os.getenv("GENERATION_UPLOAD_CONCURRENCY", "8"))
+
+
+class GenerationStreamingConfig:
+    """Configuration settings for streaming the model's response."""
+
+    # Stream the generated JSON and publish each finished section as partial markdown on the job status
+    ENABLED: bool = os.getenv("GENERATION_STREAMING_ENABLED", "true").lower() == "true"
+
+
+class GenaiResilienceConfig:
+    """Configuration settings for retrying and hedging GenAI calls."""
+
+    # Attempts per call (1 = no retries); only timeouts, connection errors, 408/429 and 5xx are retried
+    MAX_ATTEMPTS: int = int(os.getenv("GENAI_MAX_ATTEMPTS", "3"))
+
+    # Backoff before retry n is a random delay up to min(BACKOFF_MAX, BACKOFF_BASE * 2^(n-1)) seconds
+    BACKOFF_BASE_SECONDS: float = float(os.getenv("GENAI_BACKOFF_BASE_SECONDS", "1"))
+    BACKOFF_MAX_SECONDS: float = float(os.getenv("GENAI_BACKOFF_MAX_SECONDS", "30"))
+
+    # Deadline of a single attempt
+    GENERATE_DEADLINE_SECONDS: float = float(os.getenv("GENAI_GENERATE_DEADLINE_SECONDS", "300"))
+    UPLOAD_DEADLINE_SECONDS: float = float(os.getenv("GENAI_UPLOAD_DEADLINE_SECONDS", "120"))
+
+    # Send a second generate request when the first outlives the p95 of recent ones (doubles the cost of slow calls)
+    HEDGE_ENABLED: bool = os.getenv("GENAI_HEDGE_ENABLED", "false").lower() == "true"
+
+    # Latencies needed before hedging starts, the window they are taken from, and the shortest hedge delay
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("GENAI_HEDGE_MIN_SAMPLES", "20"))
+    LATENCY_WINDOW: int = int(os.getenv("GENAI_LATENCY_WINDOW", "200"))
+    HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("GENAI_HEDGE_MIN_DELAY_SECONDS", "10"))
+
+
+class RateLimitConfig:
+    """Configuration settings for the node-wide limits on Google API calls (0 = no limit)."""
+
+    ENABLED: bool = os.getenv("GENAI_RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+    # Quota shared by generation, rephrasing and the MCP agent, per node (divide the project quota by the nodes)
+    GENERATE_REQUESTS_PER_MINUTE: int = int(os.getenv("GENAI_RATE_LIMIT_RPM", "1000"))
+    GENERATE_TOKENS_PER_MINUTE: int = int(os.getenv("GENAI_RATE_LIMIT_TPM", "2000000"))
+
+    # Quota of the embedding model
+    EMBED_REQUESTS_PER_MINUTE: int = int(os.getenv("EMBED_RATE_LIMIT_RPM", "1500"))
+
+    # Token cost estimates: output of a generation, tokens per screenshot or PDF page, one MCP agent step
+    OUTPUT_TOKENS_ESTIMATE: int = int(os.getenv("GENAI_RATE_LIMIT_OUTPUT_TOKENS", "8192"))
+    IMAGE_TOKENS_ESTIMATE: int = int(os.getenv("GENAI_RATE_LIMIT_IMAGE_TOKENS", "258"))
+    AGENT_CALL_TOKENS_ESTIMATE: int = int(os.getenv("GENAI_RATE_LIMIT_AGENT_CALL_TOKENS", "4000"))
+
+    # Longest wait for interactive requests before answering 429
+    INTERACTIVE_MAX_WAIT_SECONDS: float = float(os.getenv("GENAI_RATE_LIMIT_INTERACTIVE_MAX_WAIT_SECONDS", "30"))
+
+    # How often a request queued behind others checks its place, and when a silent waiter counts as gone
+    RETRY_INTERVAL_SECONDS: float = float(os.getenv("GENAI_RATE_LIMIT_RETRY_INTERVAL_SECONDS", "0.25"))
+    WAITER_STALE_SECONDS: float = float(os.getenv("GENAI_RATE_LIMIT_WAITER_STALE_SECONDS", "10"))
+
+
+class ModelTierConfig:
+    """Configuration settings for routing model calls to a standard or a light model tier."""
+
+    # Off by default: every request uses the standard model until the thresholds are tuned
+    ENABLED: bool = os.getenv("MODEL_TIERING_ENABLED", "false").lower() == "true"
+
+    # Operations that always use the standard model (comma-separated), e.g. user-facing rephrasing
+    STANDARD_ONLY_OPERATIONS: frozenset = frozenset(
+        op.strip() for op in os.getenv("MODEL_TIER_STANDARD_ONLY_OPERATIONS", "rephrase").split(",") if op.strip()
+    )
+
+    # Model of each tier
+    STANDARD_MODEL: str = os.getenv("GENAI_MODEL", "gemini-2.0-flash")
+    LIGHT_MODEL: str = os.getenv("GENAI_LIGHT_MODEL", "gemini-2.0-flash-lite")
+
+    # A request is small (light tier) if it stays within all of these
+    LIGHT_MAX_PROMPT_TOKENS: int = int(os.getenv("MODEL_TIER_LIGHT_MAX_PROMPT_TOKENS", "30000"))
+    LIGHT_MAX_SCREENSHOTS: int = int(os.getenv("MODEL_TIER_LIGHT_MAX_SCREENSHOTS", "15"))
+    LIGHT_MAX_SCHEMA_FIELDS: int = int(os.getenv("MODEL_TIER_LIGHT_MAX_SCHEMA_FIELDS", "60"))
+
+    # Jobs waiting in the queue from which every request goes to the light tier (0 = never)
+    SATURATION_QUEUE_DEPTH: int = int(os.getenv("MODEL_TIER_SATURATION_QUEUE_DEPTH", "20"))
+
+
+class DebugSinkConfig:
+    """Configuration settings for saving debug artifacts (model output, markdown, DOCX downloads)."""
+
+    # Off by default; when off, recording an artifact costs nothing
+    ENABLED: bool = os.getenv("SAVE_DEBUG_OUTPUT", "false").lower() == "true"
+
+    # Directory holding one sub-directory of artifacts per job
+    DIRECTORY: str = os.getenv("DEBUG_OUTPUT_DIR", "debug_output")
+
+    # Share of jobs whose artifacts are kept (decided per job, so a job is kept or dropped as a whole)
+    SAMPLE_RATE: float = float(os.getenv("DEBUG_SAMPLE_RATE", "1.0"))
+
+    # Most recent jobs kept on disk; older job directories are deleted
+    MAX_JOBS: int = int(os.getenv("DEBUG_MAX_JOBS", "100"))
+
+    # Artifacts waiting for the writer; more are dropped rather than slowing requests down
+    QUEUE_SIZE: int = int(os.getenv("DEBUG_QUEUE_SIZE", "64"))
+
+
+class EventLogConfig:
+    """Configuration settings for compacting the recorded event log before it goes into the prompt."""
+
+    # Parse the event log and replace it with its compact form in the prompt
+    COMPACTION_ENABLED: bool = os.getenv("EVENT_LOG_COMPACTION_ENABLED", "true").lower() == "true"
+
+    # Event types dropped as noise
+    NOISE_EVENTS: frozenset = frozenset(
+        name.strip().lower() for name in os.getenv(
+            "EVENT_LOG_NOISE_EVENTS",
+            "mousemove,mouseover,mouseout,mouseenter,mouseleave,pointermove,pointerover,pointerout,scroll,wheel,resize"
+        ).split(",") if name.strip()
+    )
+
+    # Fields removed from every event (page URLs and titles are only emitted when they change)
+    DROP_FIELDS: frozenset = frozenset(
+        name.strip() for name in os.getenv(
+            "EVENT_LOG_DROP_FIELDS", "timestamp,scrollPosition,previousURL,x,y,clientX,clientY"
+        ).split(",") if name.strip()
+    )
+
+    # Longer text and value strings are cut to this many characters
+    MAX_TEXT_CHARS: int = int(os.getenv("EVENT_LOG_MAX_TEXT_CHARS", "200"))
+
+    # classList entries kept per element (generated class names are dropped first)
+    MAX_CLASSES: int = int(os.getenv("EVENT_LOG_MAX_CLASSES", "3"))
+
+
+class PromptBudgetConfig:
+    """Configuration settings for fitting prompt sections into a token budget."""
+
+    # Count prompt sections and truncate them to the budget before generation
+    ENABLED: bool = os.getenv("PROMPT_BUDGET_ENABLED", "true").lower() == "true"
+
+    # Total (estimated) tokens for the text prompt, instructions included
+    TOTAL_TOKENS: int = int(os.getenv("PROMPT_BUDGET_TOTAL_TOKENS", "200000"))
+
+    # Per-section caps applied before the total is shared out (0 = no cap)
+    EVENT_LOG_MAX_TOKENS: int = int(os.getenv("PROMPT_BUDGET_EVENT_LOG_MAX_TOKENS", "0"))
+    CONTENTS_MAX_TOKENS: int = int(os.getenv("PROMPT_BUDGET_CONTENTS_MAX_TOKENS", "50000"))
+    KB_MAX_TOKENS: int = int(os.getenv("PROMPT_BUDGET_KB_MAX_TOKENS", "10000"))
+
+
+class GenaiFileCacheConfig:
+    """Configuration settings for reusing PDFs already uploaded to the GenAI File API."""
+
+    # Reuse the upload of a byte-identical PDF (retries, other templates, duplicate jobs)
+    ENABLED: bool = os.getenv("GENAI_FILE_CACHE_ENABLED", "true").lower() == "true"
+
+    # How long an upload is reused before the reaper deletes it (capped below the File API's 48h lifetime)
+    TTL_SECONDS: float = float(os.getenv("GENAI_FILE_CACHE_TTL_SECONDS", "21600"))
+
+    # A cached upload is only reused if it stays valid at least this long (enough for one generation)
+    MIN_REMAINING_SECONDS: float = float(os.getenv("GENAI_FILE_CACHE_MIN_REMAINING_SECONDS", "900"))
+
+    # How often expired uploads are deleted
+    REAP_INTERVAL_SECONDS: float = float(os.getenv("GENAI_FILE_CACHE_REAP_INTERVAL_SECONDS", "300"))
+
+
+class ContextCacheConfig:
+    """Configuration settings for provider-side caching of the prompt prefix (instructions + schema)."""
+
+    # Cache the prompt prefix per template and reference it from each job's request
+    ENABLED: bool = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+
+    # Lifetime of a cached prefix; the provider bills cache storage for this long
+    TTL_SECONDS: float = float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+
+    # A cached prefix is only used if it stays valid at least this long, else a new one is created
+    MIN_REMAINING_SECONDS: float = float(os.getenv("CONTEXT_CACHE_MIN_REMAINING_SECONDS", "300"))
+
+    # Prefixes estimated below this many tokens are sent uncached (the provider has a minimum size)
+    MIN_TOKENS: int = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+
+    # After a failed cache creation the prefix is sent uncached for this many seconds before trying again
+    FAILURE_TTL_SECONDS: float = float(os.getenv("CONTEXT_CACHE_FAILURE_TTL_SECONDS", "600"))
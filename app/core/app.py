@@ -1,11 +1,61 @@
 """
 FastAPI application factory and configuration.
 """
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router
-from app.core.database import get_supabase_client
+from app.api.routes import router, mark_job_abandoned
+from app.services.pipeline_services.sop_pipeline import process_sop_generation
+from app.core.database import get_supabase_client, get_supabase_manager
+from app.config.http_config import SupabaseClientConfig
 from app.core.initializers import service_manager  # Initialize all services early
+from app.core.job_queue import init_job_worker_pool
+from app.core.http_client import close_http_client
+from app.core.metrics import monitor_event_loop_lag, render_metrics
+from app.config.pipeline_config import GenaiFileCacheConfig
+from app.services.ai_services.genai_file_cache import run_file_reaper
+from app.services.file_services.image_pool import shutdown_image_pool
+from app.utils.debug_sink import get_debug_sink
+from app.services.template_services.template_store import (
+    start_template_invalidation_listener,
+    stop_template_invalidation_listener,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the SOP generation worker pool for this process and stop it on shutdown.
+    On shutdown the pool stops claiming jobs and lets running ones finish within
+    JOB_SHUTDOWN_GRACE_SECONDS; jobs interrupted after that are returned to the persistent queue.
+    The event loop lag is sampled for the lifetime of the app (sop_event_loop_lag_seconds),
+    and Supabase is health-checked periodically (reconnecting after repeated failures).
+    Expired cached GenAI uploads are deleted by a reaper task.
+    Debug artifacts still queued on shutdown are written before the process exits.
+    """
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    supabase_monitor = None
+    if SupabaseClientConfig.HEALTH_CHECK_INTERVAL_SECONDS > 0:
+        supabase_monitor = asyncio.create_task(get_supabase_manager().monitor_health())
+    file_reaper = None
+    if GenaiFileCacheConfig.ENABLED:
+        file_reaper = asyncio.create_task(run_file_reaper())
+    job_worker_pool = init_job_worker_pool(process_sop_generation, on_abandon=mark_job_abandoned)
+    await job_worker_pool.start()
+    await start_template_invalidation_listener()
+    try:
+        yield
+    finally:
+        lag_monitor.cancel()
+        if supabase_monitor is not None:
+            supabase_monitor.cancel()
+        if file_reaper is not None:
+            file_reaper.cancel()
+        await job_worker_pool.stop()
+        await stop_template_invalidation_listener()
+        await close_http_client()
+        shutdown_image_pool()
+        await asyncio.to_thread(get_debug_sink().flush, 5)
 
 def create_app() -> FastAPI:
     """
@@ -14,7 +64,8 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="SOP Generation API",
         description="API for generating Standard Operating Procedures using AI",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
     )
     
     # Define the list of allowed origins
@@ -33,7 +84,7 @@ def create_app() -> FastAPI:
     )
     
     # Services are already initialized by importing service_manager
-    # Just verify Supabase connection
+    # Just verify the Supabase configuration (the client is rebuilt in each forked worker)
     get_supabase_client()
     
     # Include API routes
@@ -45,6 +96,13 @@ def create_app() -> FastAPI:
     
     @app.get("/health")
     async def health_check():
-        return {"status": "healthy", "message": "Service is operational"}
+        if not get_supabase_manager().healthy:
+            return {"status": "degraded", "message": "Supabase health check failing, reconnecting", "supabase": "unavailable"}
+        return {"status": "healthy", "message": "Service is operational", "supabase": "ok"}
+
+    @app.get("/metrics")
+    async def metrics():
+        body, content_type = await asyncio.to_thread(render_metrics)
+        return Response(content=body, media_type=content_type)
     
     return app
@@ -1,15 +1,104 @@
 """
 Database connection and configuration module.
+
+Every Supabase connection of a worker process goes through one
+SupabaseClientManager. The supabase-py client is created lazily and again
+after a fork (gunicorn workers never share the parent's sockets); table and
+RPC calls use the async repositories (app.core.repositories) on the pooled
+shared HTTP client. A periodic health check rebuilds both after repeated
+failures.
 """
+import asyncio
 import os
+import threading
+from typing import Optional
+
 from supabase import create_client, Client
-from app.core.initializers import get_supabase_client as get_initialized_supabase_client
 
-# For backward compatibility, we'll provide the same interface
-# but use the centralized initialization
+from app.config.http_config import SupabaseClientConfig
+from app.config.logging import get_logger
+from app.core.http_client import reset_http_client
+from app.core.metrics import SUPABASE_RECONNECTS
+from app.core.repositories import get_postgrest_client
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+
+class SupabaseClientManager:
+    """Owns the Supabase clients of this process and checks that Supabase is reachable."""
+
+    def __init__(self):
+        self._client: Optional[Client] = None
+        self._client_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._failures = 0
+        self.healthy = True
+
+    @property
+    def client(self) -> Client:
+        """The supabase-py client, created on first use in each process."""
+        with self._lock:
+            if self._client is None or self._client_pid != os.getpid():
+                supabase_url = os.getenv("SUPABASE_URL")
+                supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+                if not supabase_url or not supabase_key:
+                    raise ValueError("Supabase credentials not found in environment variables")
+                self._client = create_client(supabase_url, supabase_key)
+                self._client_pid = os.getpid()
+                logger.info(f"Supabase client initialized for process {self._client_pid}")
+            return self._client
+
+    async def check_health(self) -> bool:
+        """
+        Probe Supabase with a one-row query. After RECONNECT_AFTER_FAILURES consecutive
+        failures the clients are rebuilt.
+
+        Returns:
+            bool: Whether the probe succeeded.
+        """
+        try:
+            await get_postgrest_client().select("generated_docs", "id", {}, limit=1)
+        except Exception as e:
+            self._failures += 1
+            self.healthy = False
+            logger.warning(f"Supabase health check failed ({self._failures} in a row): {e}")
+            if self._failures >= SupabaseClientConfig.RECONNECT_AFTER_FAILURES:
+                await self.reconnect()
+            return False
+        if not self.healthy:
+            logger.info("Supabase is reachable again")
+        self._failures = 0
+        self.healthy = True
+        return True
+
+    async def reconnect(self) -> None:
+        """Drop the supabase-py client and the HTTP connection pool; both are rebuilt on next use."""
+        logger.warning("Reconnecting to Supabase")
+        SUPABASE_RECONNECTS.inc()
+        with self._lock:
+            self._client = None
+        self._failures = 0
+        await reset_http_client()
+
+    async def monitor_health(self, interval: float = SupabaseClientConfig.HEALTH_CHECK_INTERVAL_SECONDS) -> None:
+        """Run check_health every interval seconds until cancelled."""
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval)
+
+
+_manager = SupabaseClientManager()
+
+
+def get_supabase_manager() -> SupabaseClientManager:
+    """Get the process-wide Supabase client manager."""
+    return _manager
+
+
 def get_supabase_client() -> Client:
     """
-    Get or create Supabase client instance.
-    Now uses the centralized initialization system.
+    Get the Supabase client of this process.
+    Prefer the async repositories in app.core.repositories for table and RPC calls.
     """
-    return get_initialized_supabase_client()
+    return _manager.client
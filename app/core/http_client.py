@@ -0,0 +1,73 @@
+"""
+Process-wide async HTTP client shared by every job.
+
+One httpx.AsyncClient per worker process keeps TLS connections alive between
+requests (and multiplexes them over HTTP/2 when available), instead of paying
+a thread pool and a handshake for every storage download.
+"""
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+
+from app.config.http_config import HttpClientConfig
+from app.config.logging import get_logger
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_pid: Optional[int] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])."""
+    return HttpClientConfig.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared async HTTP client, creating it on first use.
+    A client inherited through fork is never reused; the child builds its own pool.
+    """
+    global _client, _client_pid
+    if _client is None or _client.is_closed or _client_pid != os.getpid():
+        http2 = _http2_available()
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HttpClientConfig.MAX_CONNECTIONS,
+                max_keepalive_connections=HttpClientConfig.MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HttpClientConfig.KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                HttpClientConfig.READ_TIMEOUT_SECONDS,
+                connect=HttpClientConfig.CONNECT_TIMEOUT_SECONDS,
+            ),
+        )
+        _client_pid = os.getpid()
+        logger.info(f"Shared HTTP client created (http2={http2}, max_connections={HttpClientConfig.MAX_CONNECTIONS})")
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its connection pool (application shutdown)."""
+    global _client
+    if _client is not None and _client_pid == os.getpid() and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Shared HTTP client closed")
+    _client = None
+
+
+async def reset_http_client() -> None:
+    """
+    Drop the shared client so the next get_http_client() opens a fresh pool, then close
+    the old one. Used to recover when pooled connections are presumed dead.
+    """
+    global _client
+    old = _client if _client_pid == os.getpid() else None
+    _client = None
+    if old is not None and not old.is_closed:
+        await old.aclose()
+        logger.info("Shared HTTP client reset")
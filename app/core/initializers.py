@@ -4,11 +4,15 @@ This module handles the setup and initialization of all third-party services,
 AI models, and other resources that need to be configured once at startup.
 """
 import os
+import threading
 import google.generativeai as genai
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from supabase import create_client, Client
+from supabase import Client
 from app.config.config import load_config, set_env
 from app.config.logging import get_logger
+from app.config.pipeline_config import ModelTierConfig
+from app.core.database import get_supabase_manager
+from app.core.rate_limiter import get_embed_rate_limiter
 
 # Initialize logger for this module
 logger = get_logger(__name__)
@@ -30,7 +34,8 @@ class ServiceManager:
     def __init__(self):
         if not self._initialized:
             self._genai_model = None
-            self._supabase_client = None
+            self._tier_models = {}
+            self._tier_models_lock = threading.Lock()
             self._embedding_model = None
             self._magic_available = None
             self._initialize_all()
@@ -45,7 +50,6 @@ class ServiceManager:
         
         # Initialize services
         self._initialize_genai()
-        self._initialize_supabase()
         self._initialize_embedding_model()
         self._check_magic_availability()
         
@@ -69,7 +73,7 @@ class ServiceManager:
                 raise ValueError("GOOGLE_API_KEY not found in environment variables")
             
             genai.configure(api_key=api_key)
-            model = os.getenv("GENAI_MODEL", "gemini-2.0-flash")
+            model = ModelTierConfig.STANDARD_MODEL
             logger.info(f"Using GenAI model: {model}")
             # Initialize the GenAI model with the specified model name
             self._genai_model = genai.GenerativeModel(model)
@@ -78,21 +82,6 @@ class ServiceManager:
             logger.error(f"Failed to initialize GenAI: {e}")
             raise
     
-    def _initialize_supabase(self):
-        """Initialize Supabase client."""
-        try:
-            supabase_url = os.getenv("SUPABASE_URL")
-            supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-            
-            if not supabase_url or not supabase_key:
-                raise ValueError("Supabase credentials not found in environment variables")
-            
-            self._supabase_client = create_client(supabase_url, supabase_key)
-            logger.info("Supabase client initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize Supabase: {e}")
-            raise
-    
     def _initialize_embedding_model(self):
         """Initialize Gemini embedding model using LangChain."""
         try:
@@ -128,12 +117,27 @@ class ServiceManager:
             raise RuntimeError("GenAI model not initialized")
         return self._genai_model
     
+    def genai_model_for(self, model_name: str):
+        """
+        Get the GenAI model with the given name: the default model, or another
+        model tier created on first use.
+        """
+        default_model = self.genai_model
+        if model_name in (default_model.model_name, default_model.model_name.removeprefix("models/")):
+            return default_model
+        with self._tier_models_lock:
+            if model_name not in self._tier_models:
+                self._tier_models[model_name] = genai.GenerativeModel(model_name)
+                logger.info(f"Initialized GenAI model: {model_name}")
+            return self._tier_models[model_name]
+
     @property
     def supabase_client(self) -> Client:
-        """Get the initialized Supabase client."""
-        if self._supabase_client is None:
-            raise RuntimeError("Supabase client not initialized")
-        return self._supabase_client
+        """
+        Get the Supabase client. It is created lazily (once per process, see
+        app.core.database) so forked workers never share the parent's connections.
+        """
+        return get_supabase_manager().client
     
     @property
     def embedding_model(self):
@@ -165,6 +169,23 @@ class ServiceManager:
         mime_type, _ = mimetypes.guess_type(file_path)
         return mime_type or "application/octet-stream"
     
+    def get_buffer_mime_type(self, data: bytes, file_name: str = "") -> str:
+        """
+        Get MIME type of in-memory content using python-magic if available,
+        otherwise fall back to guessing from the file name.
+        """
+        if self._magic_available:
+            try:
+                import magic
+                return magic.from_buffer(bytes(data[:2048]), mime=True)
+            except Exception as e:
+                logger.warning(f"Magic MIME detection failed: {e}, falling back to mimetypes")
+        
+        # Fallback to mimetypes
+        import mimetypes
+        mime_type, _ = mimetypes.guess_type(file_name)
+        return mime_type or "application/octet-stream"
+    
     def generate_embeddings(self, text: str) -> list:
         """
         Generate embeddings using Gemini's embedding model via LangChain.
@@ -179,6 +200,9 @@ class ServiceManager:
             if self._embedding_model is None:
                 raise RuntimeError("Embedding model not initialized")
             
+            # Wait for the node-wide embedding quota (called on a worker thread)
+            get_embed_rate_limiter().acquire_sync()
+
             # Use LangChain's embed_query method
             embedding_vector = self._embedding_model.embed_query(text)
             return embedding_vector
@@ -195,6 +219,10 @@ def get_genai_model():
     """Get the initialized GenAI model."""
     return service_manager.genai_model
 
+def get_genai_model_for(model_name: str):
+    """Get the GenAI model of a tier by model name."""
+    return service_manager.genai_model_for(model_name)
+
 def get_supabase_client() -> Client:
     """Get the initialized Supabase client."""
     return service_manager.supabase_client
@@ -207,6 +235,10 @@ def get_file_mime_type(file_path: str) -> str:
     """Get MIME type of a file."""
     return service_manager.get_file_mime_type(file_path)
 
+def get_buffer_mime_type(data: bytes, file_name: str = "") -> str:
+    """Get MIME type of in-memory content."""
+    return service_manager.get_buffer_mime_type(data, file_name)
+
 def is_magic_available() -> bool:
     """Check if python-magic is available."""
     return service_manager.magic_available
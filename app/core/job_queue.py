@@ -0,0 +1,768 @@
+"""
+Persistent job queue and worker pool for SOP generation.
+
+Jobs are stored in a SQLite database that every gunicorn worker on the node
+shares, so accepted jobs survive worker recycles and crashes. Each worker
+process runs a bounded number of jobs at a time; running jobs hold a lease
+that is renewed while they execute and is taken over by another worker when
+it expires.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from app.config.job_config import JobQueueConfig
+from app.config.logging import get_logger
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Job queue is full ({depth} jobs waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class JobDeferred(Exception):
+    """Raised by a job handler to return its job to the queue until delay seconds have passed."""
+
+    def __init__(self, delay: float, reason: str):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class JobFailed(Exception):
+    """
+    Raised by a job handler whose job failed after the failure was already reported
+    (e.g. the document marked 'failed'); the job is recorded as failed without a traceback.
+    """
+
+
+@dataclass
+class QueuedJob:
+    """A job claimed from the queue by a worker."""
+    job_id: str
+    payload: dict
+    file_content: Optional[bytes]
+    attempts: int
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    file_content BLOB,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    leased_until REAL,
+    progress TEXT,
+    available_at REAL,
+    deferred_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    fingerprint TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS genai_files (
+    name TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_genai_files_sha256 ON genai_files (sha256, expires_at);
+CREATE TABLE IF NOT EXISTS context_caches (
+    prefix_hash TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_limit_waiters (
+    id TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    enqueued_at REAL NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rate_limit_waiters_scope ON rate_limit_waiters (scope, priority, enqueued_at);
+CREATE TABLE IF NOT EXISTS template_invalidations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    template_id TEXT,
+    user_id TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class JobQueue:
+    """
+    SQLite-backed FIFO queue of SOP generation jobs.
+
+    Job states: 'queued' -> 'running' -> 'done' | 'failed' (or back to 'queued' when deferred).
+    All methods are blocking; async callers should go through asyncio.to_thread.
+    """
+
+    def __init__(self, database_path: str = JobQueueConfig.DATABASE_PATH):
+        self.database_path = database_path
+        if database_path != ":memory:":
+            directory = os.path.dirname(database_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            database_path,
+            timeout=30,
+            isolation_level=None,  # explicit transactions only
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        if database_path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        logger.info(f"Job queue ready at {database_path}")
+
+    def _migrate(self) -> None:
+        """Add columns introduced after the jobs table was first created."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "progress" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+        if "available_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN available_at REAL")
+        if "deferred_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN deferred_at REAL")
+
+    def enqueue(self, job_id: str, payload: dict, file_content: Optional[bytes] = None,
+                max_depth: int = JobQueueConfig.MAX_DEPTH) -> bool:
+        """
+        Add a job to the queue.
+
+        Returns:
+            True if the job was queued, False if a job with the same id is already queued or running.
+
+        Raises:
+            QueueFullError: If max_depth jobs are already waiting.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+                ).fetchone()[0]
+                if depth >= max_depth:
+                    raise QueueFullError(depth, JobQueueConfig.RETRY_AFTER_SECONDS)
+                cursor = self._conn.execute(
+                    """
+                    INSERT INTO jobs (id, status, payload, file_content, attempts, created_at, updated_at)
+                    VALUES (?, 'queued', ?, ?, 0, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        status = 'queued', payload = excluded.payload, file_content = excluded.file_content,
+                        attempts = 0, worker_id = NULL, leased_until = NULL, progress = NULL,
+                        available_at = NULL, deferred_at = NULL, created_at = excluded.created_at, updated_at = excluded.updated_at
+                    WHERE jobs.status IN ('done', 'failed')
+                    """,
+                    (job_id, json.dumps(payload), file_content, now, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount > 0
+
+    def claim(self, worker_id: str, lease_seconds: int = JobQueueConfig.LEASE_SECONDS) -> Optional[QueuedJob]:
+        """Atomically take the oldest queued job that is not deferred and lease it to worker_id."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                UPDATE jobs SET status = 'running', worker_id = ?, leased_until = ?,
+                                attempts = attempts + 1, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs WHERE status = 'queued' AND COALESCE(available_at, 0) <= ?
+                    ORDER BY created_at LIMIT 1
+                )
+                RETURNING id, payload, file_content, attempts
+                """,
+                (worker_id, now + lease_seconds, now, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return QueuedJob(
+            job_id=row["id"],
+            payload=json.loads(row["payload"]),
+            file_content=row["file_content"],
+            attempts=row["attempts"],
+        )
+
+    def renew_lease(self, job_id: str, worker_id: str,
+                    lease_seconds: int = JobQueueConfig.LEASE_SECONDS) -> bool:
+        """Extend the lease of a running job. Returns False if the lease was lost."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET leased_until = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, worker_id: str, succeeded: bool = True) -> None:
+        """Mark a running job as finished and drop its input payload."""
+        status = "done" if succeeded else "failed"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, file_content = NULL, leased_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker_id = ?",
+                (status, time.time(), job_id, worker_id),
+            )
+
+    def release(self, job_id: str, worker_id: str, max_attempts: int = JobQueueConfig.MAX_ATTEMPTS) -> bool:
+        """
+        Put a running job interrupted by shutdown back in the queue. The interrupted run
+        counts as an attempt, so a job that keeps being interrupted (e.g. by worker recycles)
+        is marked 'failed' once it has used max_attempts.
+
+        Returns:
+            True if the job exhausted its attempts and was marked 'failed' instead.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "file_content = CASE WHEN attempts >= ? THEN NULL ELSE file_content END, "
+                "worker_id = NULL, leased_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running' RETURNING status",
+                (max_attempts, max_attempts, time.time(), job_id, worker_id),
+            ).fetchone()
+        return row is not None and row["status"] == "failed"
+
+    def defer(self, job_id: str, worker_id: str, delay: float) -> None:
+        """
+        Put a running job back in the queue, to be claimed again after delay seconds, without
+        counting the attempt (e.g. a job waiting for an identical in-flight job).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, leased_until = NULL, "
+                "attempts = MAX(attempts - 1, 0), available_at = ?, deferred_at = COALESCE(deferred_at, ?), "
+                "updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + delay, now, now, job_id, worker_id),
+            )
+
+    def deferred_since(self, job_id: str) -> Optional[float]:
+        """When the job was first deferred, or None if it never was."""
+        with self._lock:
+            row = self._conn.execute("SELECT deferred_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["deferred_at"] if row else None
+
+    def recover_expired(self, max_attempts: int = JobQueueConfig.MAX_ATTEMPTS) -> list:
+        """
+        Requeue running jobs whose lease expired (their worker died or was recycled).
+
+        Returns:
+            list: Ids of jobs that exhausted max_attempts and were marked 'failed' instead.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                abandoned = [
+                    row["id"] for row in self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', file_content = NULL, worker_id = NULL, "
+                        "leased_until = NULL, updated_at = ? "
+                        "WHERE status = 'running' AND leased_until < ? AND attempts >= ? RETURNING id",
+                        (now, now, max_attempts),
+                    ).fetchall()
+                ]
+                requeued = self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_id = NULL, leased_until = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND leased_until < ?",
+                    (now, now),
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if requeued:
+            logger.warning(f"Requeued {requeued} job(s) with expired leases")
+        for job_id in abandoned:
+            logger.error(f"Job {job_id} abandoned after {max_attempts} attempts")
+        return abandoned
+
+    def purge_finished(self, older_than_seconds: int = JobQueueConfig.RETENTION_SECONDS) -> int:
+        """Delete finished jobs and input fingerprints older than the retention window."""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (cutoff,),
+            )
+            self._conn.execute("DELETE FROM fingerprints WHERE updated_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM template_invalidations WHERE created_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def claim_fingerprint(self, fingerprint: str, job_id: str, reuse_seconds: float) -> Optional[tuple]:
+        """
+        Register job_id as the producer of the result for an input fingerprint, unless
+        another job already produced it within reuse_seconds or is still producing it.
+
+        Returns:
+            None if job_id now owns the fingerprint, otherwise (owner_job_id, 'done' | 'running').
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT f.job_id, f.status, f.updated_at, j.status AS job_status "
+                    "FROM fingerprints f LEFT JOIN jobs j ON j.id = f.job_id WHERE f.fingerprint = ?",
+                    (fingerprint,),
+                ).fetchone()
+                if row is not None and row["job_id"] != job_id:
+                    if row["status"] == "done" and row["updated_at"] >= now - reuse_seconds:
+                        self._conn.execute("COMMIT")
+                        return row["job_id"], "done"
+                    if row["status"] == "running" and row["job_status"] in ("queued", "running"):
+                        self._conn.execute("COMMIT")
+                        return row["job_id"], "running"
+                self._conn.execute(
+                    "INSERT INTO fingerprints (fingerprint, job_id, status, updated_at) VALUES (?, ?, 'running', ?) "
+                    "ON CONFLICT(fingerprint) DO UPDATE SET job_id = excluded.job_id, status = 'running', "
+                    "updated_at = excluded.updated_at",
+                    (fingerprint, job_id, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def finish_fingerprint(self, fingerprint: str, job_id: str, succeeded: bool) -> None:
+        """Mark the owner's result as reusable, or drop the fingerprint so a waiting job can take over."""
+        with self._lock:
+            if succeeded:
+                self._conn.execute(
+                    "UPDATE fingerprints SET status = 'done', updated_at = ? WHERE fingerprint = ? AND job_id = ?",
+                    (time.time(), fingerprint, job_id),
+                )
+            else:
+                self._conn.execute(
+                    "DELETE FROM fingerprints WHERE fingerprint = ? AND job_id = ?",
+                    (fingerprint, job_id),
+                )
+
+    def record_template_invalidation(self, template_id: Optional[str], user_id: Optional[str]) -> int:
+        """Record that a template (or every template, when template_id is None) was edited."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO template_invalidations (template_id, user_id, created_at) VALUES (?, ?, ?)",
+                (template_id, user_id, time.time()),
+            )
+        return cursor.lastrowid
+
+    def template_invalidations_since(self, seq: Optional[int]) -> tuple:
+        """
+        Template invalidations recorded after seq.
+
+        Returns:
+            tuple: (latest seq, [(template_id, user_id), ...]); the list is empty when seq is None.
+        """
+        with self._lock:
+            latest = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM template_invalidations").fetchone()[0]
+            if seq is None or latest <= seq:
+                return latest, []
+            rows = self._conn.execute(
+                "SELECT template_id, user_id FROM template_invalidations WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        return latest, [(row["template_id"], row["user_id"]) for row in rows]
+
+    def get_genai_file(self, sha256: str, valid_until: float) -> Optional[dict]:
+        """The uploaded GenAI file with this content hash that stays valid the longest, if it outlives valid_until."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, uri, mime_type, expires_at FROM genai_files "
+                "WHERE sha256 = ? AND expires_at >= ? ORDER BY expires_at DESC LIMIT 1",
+                (sha256, valid_until),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put_genai_file(self, sha256: str, name: str, uri: str, mime_type: str, expires_at: float) -> None:
+        """Record an uploaded GenAI file so identical content can reuse it until expires_at."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO genai_files (name, sha256, uri, mime_type, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (name, sha256, uri, mime_type, expires_at),
+            )
+
+    def remove_genai_file(self, name: str) -> None:
+        """Forget an uploaded GenAI file (e.g. the provider no longer has it)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM genai_files WHERE name = ?", (name,))
+
+    def pop_expired_genai_files(self, now: Optional[float] = None) -> list:
+        """Remove expired GenAI file records and return their names; the caller deletes the remote files."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                names = [row["name"] for row in self._conn.execute(
+                    "SELECT name FROM genai_files WHERE expires_at < ?", (now,)
+                )]
+                self._conn.execute("DELETE FROM genai_files WHERE expires_at < ?", (now,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return names
+
+    def get_context_cache(self, prefix_hash: str, valid_until: float) -> Optional[str]:
+        """Name of the provider-side cached content for a prompt prefix, if it outlives valid_until."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name FROM context_caches WHERE prefix_hash = ? AND expires_at >= ?",
+                (prefix_hash, valid_until),
+            ).fetchone()
+        return row["name"] if row else None
+
+    def put_context_cache(self, prefix_hash: str, name: str, expires_at: float) -> None:
+        """Record the cached content of a prompt prefix (the provider deletes it at expires_at)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM context_caches WHERE expires_at < ?", (time.time(),))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO context_caches (prefix_hash, name, expires_at) VALUES (?, ?, ?)",
+                (prefix_hash, name, expires_at),
+            )
+
+    def remove_context_cache(self, prefix_hash: str, name: str) -> None:
+        """Forget a cached content that is no longer usable."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM context_caches WHERE prefix_hash = ? AND name = ?", (prefix_hash, name)
+            )
+
+    def try_acquire_rate_limit(self, waiter_id: str, scope: str, priority: int, costs: dict,
+                               stale_after: float, retry_interval: float) -> float:
+        """
+        Take costs from token buckets shared by every process on the node, in priority order.
+
+        Only the first live waiter of the scope (lowest priority value, then earliest) may take
+        tokens. A registered waiter with others ahead of it is answered from a read, without the
+        write lock that job leases also need; it is refreshed with a write every stale_after / 2
+        seconds. Waiters not seen for stale_after seconds (their process died) are dropped.
+
+        Args:
+            costs: {bucket name: (cost, capacity, refill per second)}; buckets start full
+
+        Returns:
+            float: 0 if the tokens were taken (the waiter is removed), otherwise seconds to wait
+            before trying again.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT enqueued_at, seen_at FROM rate_limit_waiters WHERE id = ?", (waiter_id,)
+            ).fetchone()
+            if row is not None and row["seen_at"] >= now - stale_after / 2 \
+                    and self._rate_limit_waiter_ahead(waiter_id, scope, priority, row["enqueued_at"]):
+                return retry_interval
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM rate_limit_waiters WHERE seen_at < ?", (now - stale_after,))
+                self._conn.execute(
+                    "INSERT INTO rate_limit_waiters (id, scope, priority, enqueued_at, seen_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET seen_at = excluded.seen_at",
+                    (waiter_id, scope, priority, now, now),
+                )
+                enqueued_at = self._conn.execute(
+                    "SELECT enqueued_at FROM rate_limit_waiters WHERE id = ?", (waiter_id,)
+                ).fetchone()["enqueued_at"]
+                if self._rate_limit_waiter_ahead(waiter_id, scope, priority, enqueued_at):
+                    self._conn.execute("COMMIT")
+                    return retry_interval
+
+                levels = {}
+                wait = 0.0
+                for name, (cost, capacity, refill) in costs.items():
+                    row = self._conn.execute(
+                        "SELECT tokens, updated_at FROM rate_limit_buckets WHERE name = ?", (name,)
+                    ).fetchone()
+                    tokens = capacity if row is None else min(capacity, row["tokens"] + (now - row["updated_at"]) * refill)
+                    levels[name] = tokens
+                    if tokens < cost:
+                        wait = max(wait, (cost - tokens) / refill)
+                if wait == 0.0:
+                    for name, (cost, _, _) in costs.items():
+                        levels[name] -= cost
+                    self._conn.execute("DELETE FROM rate_limit_waiters WHERE id = ?", (waiter_id,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(name, tokens, now) for name, tokens in levels.items()],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _rate_limit_waiter_ahead(self, waiter_id: str, scope: str, priority: int, enqueued_at: float) -> bool:
+        """Whether another waiter of the scope is served before this one (caller holds the lock)."""
+        return self._conn.execute(
+            "SELECT 1 FROM rate_limit_waiters WHERE scope = ? AND id != ? "
+            "AND (priority < ? OR (priority = ? AND enqueued_at < ?)) LIMIT 1",
+            (scope, waiter_id, priority, priority, enqueued_at),
+        ).fetchone() is not None
+
+    def remove_rate_limit_waiter(self, waiter_id: str) -> None:
+        """Drop a waiter that gave up or was cancelled."""
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limit_waiters WHERE id = ?", (waiter_id,))
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        """Return the queue state of a job, or None if the queue does not know it."""
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def set_progress(self, job_id: str, progress: dict) -> None:
+        """Store the latest status snapshot of a job so every worker process can serve it."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ? WHERE id = ?",
+                (json.dumps(progress), job_id),
+            )
+
+    def get_progress(self, job_id: str) -> Optional[dict]:
+        """Return the latest stored status snapshot of a job, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row["progress"] is None:
+            return None
+        return json.loads(row["progress"])
+
+    def depth(self) -> int:
+        """Number of jobs waiting to be picked up."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def running_count(self) -> int:
+        """Number of jobs currently leased by any worker."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+
+
+JobHandler = Callable[..., Awaitable[None]]
+
+
+class JobWorkerPool:
+    """
+    Runs queued jobs with a fixed number of concurrent slots in this process.
+
+    The handler is called as handler(file_content=..., **payload); a job whose handler
+    raises (JobFailed or any other error) is recorded as failed, and one whose handler
+    raises JobDeferred goes back to the queue without holding a slot.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: JobHandler,
+        concurrency: int = JobQueueConfig.WORKER_CONCURRENCY,
+        on_abandon: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.on_abandon = on_abandon
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._tasks: list = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight = 0
+        self._stopping = False
+
+    @property
+    def in_flight(self) -> int:
+        """Number of jobs this process is executing right now."""
+        return self._in_flight
+
+    async def start(self) -> None:
+        """Start the worker slots and the lease maintenance loop."""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._slot_loop(i)) for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintenance_loop()))
+        logger.info(f"Job worker pool {self.worker_id} started with {self.concurrency} slot(s)")
+
+    async def stop(self, grace_seconds: float = JobQueueConfig.SHUTDOWN_GRACE_SECONDS) -> None:
+        """
+        Stop claiming jobs and give running ones up to grace_seconds to finish, then cancel
+        them; jobs still running are released back to the queue.
+        """
+        if not self._tasks:
+            return
+        self._stopping = True
+        self.notify()
+        slots, others = self._tasks[:self.concurrency], self._tasks[self.concurrency:]
+        if self._in_flight:
+            logger.info(f"Job worker pool {self.worker_id} waiting up to {grace_seconds:.0f}s "
+                        f"for {self._in_flight} running job(s)")
+        _, pending = await asyncio.wait(slots, timeout=max(0.0, grace_seconds))
+        for task in [*pending, *others]:
+            task.cancel()
+        await asyncio.gather(*slots, *others, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Job worker pool {self.worker_id} stopped")
+
+    def notify(self) -> None:
+        """Wake idle slots after a job was enqueued by this process."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _slot_loop(self, slot: int) -> None:
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker slot {slot} failed to claim a job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JobQueueConfig.POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_job(job)
+
+    async def _run_job(self, job: QueuedJob) -> None:
+        logger.info(f"Worker {self.worker_id} running job {job.job_id} (attempt {job.attempts})")
+        self._in_flight += 1
+        heartbeat = asyncio.create_task(self._renew_lease_loop(job.job_id))
+        succeeded = False
+        deferred = None
+        try:
+            await self.handler(file_content=job.file_content, **job.payload)
+            succeeded = True
+        except JobDeferred as e:
+            deferred = e
+        except asyncio.CancelledError:
+            logger.warning(f"Job {job.job_id} interrupted by shutdown, returning it to the queue")
+            abandoned = await asyncio.shield(asyncio.to_thread(self.queue.release, job.job_id, self.worker_id))
+            if abandoned:
+                logger.error(f"Job {job.job_id} abandoned after {job.attempts} attempts")
+                if self.on_abandon is not None:
+                    await asyncio.shield(self.on_abandon(job.job_id))
+            raise
+        except JobFailed as e:
+            logger.warning(f"Job {job.job_id} failed: {e}")
+        except Exception as e:
+            logger.error(f"Job {job.job_id} raised an unhandled error: {e}")
+        finally:
+            heartbeat.cancel()
+            self._in_flight -= 1
+
+        if deferred is not None:
+            logger.info(f"Job {job.job_id} deferred for {deferred.delay:.0f}s: {deferred}")
+            try:
+                await asyncio.to_thread(self.queue.defer, job.job_id, self.worker_id, deferred.delay)
+            except Exception as e:
+                logger.error(f"Failed to defer job {job.job_id}: {e}")
+            return
+
+        try:
+            await asyncio.to_thread(self.queue.complete, job.job_id, self.worker_id, succeeded)
+        except Exception as e:
+            logger.error(f"Failed to mark job {job.job_id} as finished: {e}")
+
+    async def _renew_lease_loop(self, job_id: str) -> None:
+        interval = max(1.0, JobQueueConfig.LEASE_SECONDS / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await asyncio.to_thread(self.queue.renew_lease, job_id, self.worker_id):
+                    logger.warning(f"Lost lease on job {job_id}")
+                    return
+            except Exception as e:
+                logger.warning(f"Failed to renew lease on job {job_id}: {e}")
+
+    async def _maintenance_loop(self) -> None:
+        interval = max(1.0, JobQueueConfig.LEASE_SECONDS / 2)
+        while True:
+            try:
+                abandoned = await asyncio.to_thread(self.queue.recover_expired)
+                await asyncio.to_thread(self.queue.purge_finished)
+                if abandoned and self.on_abandon is not None:
+                    for job_id in abandoned:
+                        await self.on_abandon(job_id)
+                if await asyncio.to_thread(self.queue.depth) > 0:
+                    self.notify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job queue maintenance failed: {e}")
+            await asyncio.sleep(interval)
+
+
+# Process-wide queue and worker pool
+_job_queue: Optional[JobQueue] = None
+_job_worker_pool: Optional[JobWorkerPool] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Get the process-wide job queue, opening the database on first use."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+
+def init_job_worker_pool(handler: JobHandler, on_abandon=None) -> JobWorkerPool:
+    """Create the process-wide worker pool for the given job handler."""
+    global _job_worker_pool
+    _job_worker_pool = JobWorkerPool(get_job_queue(), handler, on_abandon=on_abandon)
+    return _job_worker_pool
+
+
+def get_job_worker_pool() -> Optional[JobWorkerPool]:
+    """Get the process-wide worker pool, if one was started."""
+    return _job_worker_pool
+
+
+async def submit_job(job_id: str, payload: dict, file_content: Optional[bytes] = None) -> bool:
+    """
+    Persist a job and wake a local worker slot.
+
+    Raises:
+        QueueFullError: If the queue is at capacity.
+    """
+    queued = await asyncio.to_thread(get_job_queue().enqueue, job_id, payload, file_content)
+    pool = get_job_worker_pool()
+    if pool is not None:
+        pool.notify()
+    return queued
@@ -0,0 +1,239 @@
+"""
+Prometheus metrics for the SOP generation pipeline.
+
+Metrics are collected per worker process. When PROMETHEUS_MULTIPROC_DIR is
+set (required under gunicorn with several workers), every process writes its
+samples to that directory and /metrics aggregates them, so a scrape of any
+worker reports the whole node.
+"""
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from app.config.logging import get_logger
+from app.core.job_queue import get_job_queue
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Buckets spanning sub-second lookups up to multi-minute generations
+_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300, 600)
+
+STAGE_DURATION = Histogram(
+    "sop_stage_duration_seconds",
+    "Duration of SOP generation stages",
+    ["stage"],
+    buckets=_DURATION_BUCKETS,
+)
+JOB_DURATION = Histogram(
+    "sop_job_duration_seconds",
+    "End-to-end duration of SOP generation jobs",
+    ["outcome"],
+    buckets=_DURATION_BUCKETS,
+)
+JOBS_TOTAL = Counter("sop_jobs_total", "SOP generation jobs by outcome", ["outcome"])
+DOWNLOADED_BYTES = Counter("sop_downloaded_bytes_total", "Bytes downloaded from Supabase Storage")
+PDF_PAGES = Counter("sop_pdf_pages_total", "Pages of screenshot PDFs produced")
+PROMPT_CHARS = Histogram(
+    "sop_prompt_chars",
+    "Size of generation prompts in characters",
+    buckets=(1e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6),
+)
+PROMPT_SECTION_TOKENS = Histogram(
+    "sop_prompt_section_tokens",
+    "Estimated tokens per prompt section after budgeting",
+    ["section"],
+    buckets=(100, 500, 1e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6),
+)
+PROMPT_TRUNCATIONS = Counter(
+    "sop_prompt_truncations_total",
+    "Prompt sections truncated to fit the token budget",
+    ["section"],
+)
+JOBS_IN_FLIGHT = Gauge(
+    "sop_jobs_in_flight",
+    "SOP generation jobs currently executing",
+    multiprocess_mode="livesum",
+)
+GENAI_FILE_CACHE = Counter(
+    "sop_genai_file_cache_total",
+    "Lookups of uploaded GenAI files by PDF content hash",
+    ["result"],
+)
+CONTEXT_CACHE = Counter(
+    "sop_context_cache_total",
+    "Prompt prefix cache lookups (hit, created, skipped, failed)",
+    ["result"],
+)
+GENAI_TOKENS = Counter(
+    "sop_genai_tokens_total",
+    "Tokens reported by the model (prompt, cached part of the prompt, output)",
+    ["kind"],
+)
+GENAI_RETRIES = Counter(
+    "sop_genai_retries_total",
+    "GenAI call attempts retried, by operation and reason",
+    ["operation", "reason"],
+)
+GENAI_HEDGES = Counter(
+    "sop_genai_hedges_total",
+    "Hedged GenAI requests (fired, and whether the hedge won or lost)",
+    ["operation", "result"],
+)
+MODEL_ROUTING = Counter(
+    "sop_model_routing_total",
+    "Model tier chosen per request, by operation and reason",
+    ["operation", "tier", "reason"],
+)
+RATE_LIMIT_WAIT = Histogram(
+    "sop_rate_limit_wait_seconds",
+    "Time Google API calls waited for the node-wide rate limiter",
+    ["scope", "priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+RATE_LIMIT_TIMEOUTS = Counter(
+    "sop_rate_limit_timeouts_total",
+    "Google API calls that gave up waiting for the rate limiter",
+    ["scope", "priority"],
+)
+DEBUG_ARTIFACTS = Counter(
+    "sop_debug_artifacts_total",
+    "Debug artifacts handed to the debug sink (written, dropped when its queue was full, failed)",
+    ["result"],
+)
+SUPABASE_RECONNECTS = Counter(
+    "sop_supabase_reconnects_total",
+    "Supabase clients rebuilt after failed health checks",
+)
+EVENT_LOOP_LAG = Histogram(
+    "sop_event_loop_lag_seconds",
+    "How late the event loop woke up a timer; blocking calls on the loop show up here",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+# How often the event loop lag is sampled, and the lag logged as a warning
+EVENT_LOOP_LAG_INTERVAL = 0.1
+EVENT_LOOP_LAG_WARNING = 0.5
+
+# Largest lag seen since the last peak_event_loop_lag(reset=True)
+_peak_event_loop_lag = 0.0
+
+
+class _JobQueueCollector:
+    """Reads queue depth and running jobs from the shared queue database at scrape time."""
+
+    def describe(self):
+        # Nothing to describe up front; avoids opening the queue database at registration
+        return []
+
+    def collect(self):
+        depth = GaugeMetricFamily("sop_job_queue_depth", "Jobs waiting in the queue")
+        running = GaugeMetricFamily("sop_job_queue_running", "Jobs leased by a worker on this node")
+        try:
+            queue = get_job_queue()
+            depth.add_metric([], queue.depth())
+            running.add_metric([], queue.running_count())
+        except Exception as e:
+            logger.warning(f"Failed to read job queue gauges: {e}")
+            return
+        yield depth
+        yield running
+
+
+_job_queue_collector = _JobQueueCollector()
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    REGISTRY.register(_job_queue_collector)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record the duration of one stage."""
+    STAGE_DURATION.labels(stage=stage).observe(seconds)
+
+
+def observe_stage_timings(timings: Dict[str, float]) -> None:
+    """Record the durations of every stage of a StageGraph run."""
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time the enclosed block as a stage (recorded whether or not it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_token_usage(usage_metadata) -> None:
+    """Count the tokens of a model response (usage_metadata may be missing)."""
+    if usage_metadata is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("cached", "cached_content_token_count"),
+                        ("output", "candidates_token_count")):
+        tokens = getattr(usage_metadata, field, 0) or 0
+        if tokens:
+            GENAI_TOKENS.labels(kind=kind).inc(tokens)
+
+
+def record_job(outcome: str, seconds: float) -> None:
+    """Count a finished job ('success', 'failed' or 'reused') and record its duration."""
+    JOBS_TOTAL.labels(outcome=outcome).inc()
+    JOB_DURATION.labels(outcome=outcome).observe(seconds)
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL) -> None:
+    """
+    Sample the event loop lag until cancelled: sleep for interval and record how much
+    later than requested the loop resumed. Run as a task on the loop being watched.
+    """
+    global _peak_event_loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - start - interval, 0.0)
+        EVENT_LOOP_LAG.observe(lag)
+        _peak_event_loop_lag = max(_peak_event_loop_lag, lag)
+        if lag >= EVENT_LOOP_LAG_WARNING:
+            logger.warning(f"Event loop was blocked for {lag:.3f}s")
+
+
+def peak_event_loop_lag(reset: bool = False) -> float:
+    """Largest event loop lag (seconds) seen in this process; reset starts a new measurement window."""
+    global _peak_event_loop_lag
+    peak = _peak_event_loop_lag
+    if reset:
+        _peak_event_loop_lag = 0.0
+    return peak
+
+
+def render_metrics() -> tuple:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_job_queue_collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
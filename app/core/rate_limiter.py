@@ -0,0 +1,180 @@
+"""
+Node-wide rate limiting of Google API calls.
+
+Every worker process on the node takes from the same token buckets, stored in
+the shared queue database: one bucket per minute-quota (requests, and for the
+generation models also tokens), refilled continuously. Requests are served in
+priority order, then first come first served, so interactive rephrasing gets
+ahead of background generation instead of all workers hitting the quota and
+receiving 429s at the same time.
+
+The first waiter sleeps until its tokens have refilled; the waiters behind it
+check their place with a read of the shared database, which does not compete
+with job lease renewals for the write lock.
+"""
+import asyncio
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import RateLimitConfig
+from app.core.job_queue import get_job_queue
+from app.core.metrics import RATE_LIMIT_TIMEOUTS, RATE_LIMIT_WAIT
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request could not be admitted within its timeout."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit for {scope} calls reached")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token buckets for one quota scope (e.g. 'generate' or 'embed')."""
+
+    def __init__(self, scope: str, requests_per_minute: int, tokens_per_minute: int = 0):
+        self.scope = scope
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+    def _costs(self, tokens: int) -> Dict[str, Tuple[float, float, float]]:
+        """Bucket costs of one request; a request larger than a bucket takes the whole bucket."""
+        costs = {}
+        if self.requests_per_minute > 0:
+            costs[f"{self.scope}:requests"] = (1, self.requests_per_minute, self.requests_per_minute / 60)
+        if self.tokens_per_minute > 0 and tokens > 0:
+            costs[f"{self.scope}:tokens"] = (
+                min(tokens, self.tokens_per_minute), self.tokens_per_minute, self.tokens_per_minute / 60
+            )
+        return costs
+
+    def _try_acquire(self, waiter_id: str, costs: dict, priority: int) -> float:
+        return get_job_queue().try_acquire_rate_limit(
+            waiter_id, self.scope, priority, costs,
+            stale_after=RateLimitConfig.WAITER_STALE_SECONDS,
+            retry_interval=RateLimitConfig.RETRY_INTERVAL_SECONDS,
+        )
+
+    @staticmethod
+    def _sleep_for(wait: float) -> float:
+        """Sleep until the tokens are due, waking in time to refresh the waiter before it counts as gone."""
+        return min(wait, RateLimitConfig.WAITER_STALE_SECONDS / 2)
+
+    def _record(self, priority: int, waited: float, timed_out: bool = False) -> None:
+        labels = {"scope": self.scope, "priority": _PRIORITY_NAMES.get(priority, str(priority))}
+        if timed_out:
+            RATE_LIMIT_TIMEOUTS.labels(**labels).inc()
+            return
+        RATE_LIMIT_WAIT.labels(**labels).observe(waited)
+        if waited >= 1:
+            logger.info(f"Waited {waited:.1f}s for the {self.scope} rate limit ({labels['priority']})")
+
+    async def acquire(self, tokens: int = 0, priority: int = PRIORITY_BACKGROUND,
+                      timeout: Optional[float] = None) -> float:
+        """
+        Wait until a request estimated at tokens may be sent.
+
+        Returns:
+            float: Seconds waited.
+
+        Raises:
+            RateLimitTimeout: If timeout seconds passed first.
+        """
+        costs = self._costs(tokens)
+        if not RateLimitConfig.ENABLED or not costs:
+            return 0.0
+        waiter_id = uuid.uuid4().hex
+        start = time.monotonic()
+        try:
+            while True:
+                wait = await asyncio.to_thread(self._try_acquire, waiter_id, costs, priority)
+                waited = time.monotonic() - start
+                if wait <= 0:
+                    self._record(priority, waited)
+                    return waited
+                if timeout is not None and waited + wait > timeout:
+                    self._record(priority, waited, timed_out=True)
+                    raise RateLimitTimeout(self.scope, wait)
+                await asyncio.sleep(self._sleep_for(wait))
+        except BaseException:
+            await asyncio.to_thread(get_job_queue().remove_rate_limit_waiter, waiter_id)
+            raise
+
+    def acquire_sync(self, tokens: int = 0, priority: int = PRIORITY_BACKGROUND,
+                     timeout: Optional[float] = None) -> float:
+        """Blocking acquire() for code already running on a worker thread."""
+        costs = self._costs(tokens)
+        if not RateLimitConfig.ENABLED or not costs:
+            return 0.0
+        waiter_id = uuid.uuid4().hex
+        start = time.monotonic()
+        try:
+            while True:
+                wait = self._try_acquire(waiter_id, costs, priority)
+                waited = time.monotonic() - start
+                if wait <= 0:
+                    self._record(priority, waited)
+                    return waited
+                if timeout is not None and waited + wait > timeout:
+                    self._record(priority, waited, timed_out=True)
+                    raise RateLimitTimeout(self.scope, wait)
+                time.sleep(self._sleep_for(wait))
+        except BaseException:
+            get_job_queue().remove_rate_limit_waiter(waiter_id)
+            raise
+
+
+class LangChainRateLimiter(BaseRateLimiter):
+    """
+    Adapter for LangChain chat models (rate_limiter=...), which acquire once per model call
+    without knowing its size; each call is charged a fixed token estimate.
+    """
+
+    def __init__(self, limiter: RateLimiter, tokens: int, priority: int = PRIORITY_BACKGROUND):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.priority = priority
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        try:
+            self.limiter.acquire_sync(self.tokens, self.priority, timeout=None if blocking else 0)
+        except RateLimitTimeout:
+            return False
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        try:
+            await self.limiter.acquire(self.tokens, self.priority, timeout=None if blocking else 0)
+        except RateLimitTimeout:
+            return False
+        return True
+
+
+_generate_limiter = RateLimiter(
+    "generate", RateLimitConfig.GENERATE_REQUESTS_PER_MINUTE, RateLimitConfig.GENERATE_TOKENS_PER_MINUTE
+)
+_embed_limiter = RateLimiter("embed", RateLimitConfig.EMBED_REQUESTS_PER_MINUTE)
+
+
+def get_generate_rate_limiter() -> RateLimiter:
+    """Limiter shared by generation, rephrasing and the MCP agent."""
+    return _generate_limiter
+
+
+def get_embed_rate_limiter() -> RateLimiter:
+    """Limiter of the embedding model."""
+    return _embed_limiter
@@ -0,0 +1,176 @@
+"""
+Async Supabase table and RPC access over the shared HTTP client.
+
+Talks to the PostgREST API directly, like app.core.storage does for Storage,
+so database calls made from async code never block the event loop and reuse
+the process-wide keep-alive connection pool. Each repository wraps the
+queries of one table (or RPC) used by the pipeline and the API.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config.logging import get_logger
+from app.core.http_client import get_http_client
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+
+class PostgrestError(Exception):
+    """Raised when a PostgREST request fails."""
+
+
+class AsyncPostgrestClient:
+    """Minimal PostgREST client for the Supabase project, on the shared async HTTP client."""
+
+    def __init__(self, supabase_url: Optional[str] = None, supabase_key: Optional[str] = None):
+        supabase_url = supabase_url or os.getenv("SUPABASE_URL")
+        supabase_key = supabase_key or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not supabase_key:
+            raise ValueError("Supabase credentials not found in environment variables")
+        self._base_url = f"{supabase_url.rstrip('/')}/rest/v1"
+        self._headers = {
+            "Authorization": f"Bearer {supabase_key}",
+            "apikey": supabase_key,
+        }
+
+    async def request(self, method: str, path: str, params: Optional[dict] = None,
+                      json: Any = None, prefer: Optional[str] = None) -> Any:
+        """
+        Send a request to the REST API.
+
+        Returns:
+            The decoded JSON response (None for an empty body).
+
+        Raises:
+            PostgrestError: If the request fails or returns an error status.
+        """
+        headers = dict(self._headers)
+        if prefer:
+            headers["Prefer"] = prefer
+        try:
+            response = await get_http_client().request(
+                method, f"{self._base_url}/{path}", params=params, json=json, headers=headers
+            )
+        except httpx.HTTPError as e:
+            raise PostgrestError(f"{method} {path} failed: {e}") from e
+        if response.status_code >= 400:
+            raise PostgrestError(f"{method} {path} failed with status {response.status_code}: {response.text[:200]}")
+        return response.json() if response.content else None
+
+    @staticmethod
+    def _filters(filters: Dict[str, Any]) -> dict:
+        return {column: f"eq.{value}" for column, value in filters.items()}
+
+    async def select(self, table: str, columns: str, filters: Dict[str, Any], limit: Optional[int] = None) -> List[dict]:
+        """Rows of table matching every column=value filter."""
+        params = {"select": columns, **self._filters(filters)}
+        if limit is not None:
+            params["limit"] = str(limit)
+        return await self.request("GET", table, params=params) or []
+
+    async def select_one(self, table: str, columns: str, filters: Dict[str, Any]) -> Optional[dict]:
+        """The first row matching the filters, or None."""
+        rows = await self.select(table, columns, filters, limit=1)
+        return rows[0] if rows else None
+
+    async def upsert(self, table: str, rows: Any, on_conflict: str) -> List[dict]:
+        """Insert or update rows, returning the stored rows."""
+        return await self.request(
+            "POST", table, params={"on_conflict": on_conflict}, json=rows,
+            prefer="resolution=merge-duplicates,return=representation"
+        ) or []
+
+    async def update(self, table: str, values: dict, filters: Dict[str, Any]) -> List[dict]:
+        """Update the rows matching the filters, returning them."""
+        return await self.request(
+            "PATCH", table, params=self._filters(filters), json=values, prefer="return=representation"
+        ) or []
+
+    async def rpc(self, function: str, params: dict) -> Any:
+        """Call a database function."""
+        return await self.request("POST", f"rpc/{function}", json=params)
+
+
+class GeneratedDocsRepository:
+    """Queries on the generated_docs table."""
+
+    TABLE = "generated_docs"
+
+    def __init__(self, client: AsyncPostgrestClient):
+        self.client = client
+
+    async def upsert(self, record: dict) -> List[dict]:
+        """Insert or update a document by id."""
+        return await self.client.upsert(self.TABLE, record, on_conflict="id")
+
+    async def update_status(self, job_id: str, status: str) -> List[dict]:
+        """Set the status column of a document; returns the updated rows (empty if there is none)."""
+        return await self.client.update(self.TABLE, {"status": status}, {"id": job_id})
+
+    async def get_status(self, job_id: str) -> Optional[str]:
+        """Status of a document, or None if there is no record."""
+        row = await self.client.select_one(self.TABLE, "status", {"id": job_id})
+        if row is None:
+            return None
+        return row.get("status", "not_found")
+
+    async def get_successful(self, job_id: str, columns: str) -> Optional[dict]:
+        """Columns of a successfully generated document, or None."""
+        return await self.client.select_one(self.TABLE, columns, {"id": job_id, "status": "success"})
+
+
+class TemplateRepository:
+    """Queries on the private (templates) and public (publictemplates) template tables."""
+
+    def __init__(self, client: AsyncPostgrestClient):
+        self.client = client
+
+    async def get_private(self, templates_id: str, user_id: str) -> Optional[dict]:
+        """components and name of a user's private template, or None."""
+        return await self.client.select_one("templates", "components,name", {"id": templates_id, "user_id": user_id})
+
+    async def get_public(self, templates_id: str) -> Optional[dict]:
+        """components and name of a public template, or None."""
+        return await self.client.select_one("publictemplates", "components,name", {"id": templates_id})
+
+
+class VectorRepository:
+    """Vector similarity search over integration content."""
+
+    def __init__(self, client: AsyncPostgrestClient):
+        self.client = client
+
+    async def match_jira_vectors(self, query_embedding: list, user_id: str, integration_type: str, top_k: int) -> List[dict]:
+        """Rows returned by the match_jira_vectors function (issue_id, text_data, score)."""
+        return await self.client.rpc("match_jira_vectors", {
+            "query_embedding": query_embedding,
+            "user_id": user_id,
+            "integration_type": integration_type,
+            "top_k": top_k
+        }) or []
+
+
+_postgrest_client: Optional[AsyncPostgrestClient] = None
+
+
+def get_postgrest_client() -> AsyncPostgrestClient:
+    """Get the process-wide PostgREST client (cheap; the HTTP pool is shared)."""
+    global _postgrest_client
+    if _postgrest_client is None:
+        _postgrest_client = AsyncPostgrestClient()
+    return _postgrest_client
+
+
+def get_generated_docs_repository() -> GeneratedDocsRepository:
+    return GeneratedDocsRepository(get_postgrest_client())
+
+
+def get_template_repository() -> TemplateRepository:
+    return TemplateRepository(get_postgrest_client())
+
+
+def get_vector_repository() -> VectorRepository:
+    return VectorRepository(get_postgrest_client())
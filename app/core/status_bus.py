@@ -0,0 +1,211 @@
+"""
+In-process job status bus.
+
+Pipeline stages publish status transitions and progress counters here.
+Subscribers in the same process (server-sent event streams) are notified
+immediately; the latest snapshot of each job is also written, throttled, to
+the shared job queue database so that /status and event streams served by
+another worker process see it too. Neither path touches Supabase.
+"""
+import asyncio
+import functools
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+from app.config.job_config import StatusBusConfig
+from app.config.logging import get_logger
+from app.core.job_queue import get_job_queue
+from app.utils.ttl_cache import TTLCache, MISSING
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Document statuses after which a job's stream ends
+TERMINAL_STATUSES = ("success", "failed")
+
+
+class JobStatusBus:
+    """Latest status snapshot per job plus fan-out to local subscribers."""
+
+    def __init__(self):
+        self._snapshots = TTLCache(maxsize=10000, ttl=StatusBusConfig.SNAPSHOT_TTL_SECONDS)
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._dirty: Dict[str, dict] = {}
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def publish(
+        self,
+        job_id: str,
+        status: Optional[str] = None,
+        stage: Optional[str] = None,
+        message: Optional[str] = None,
+        progress: Optional[dict] = None,
+        partial: Optional[dict] = None,
+    ) -> dict:
+        """
+        Merge an update into the job's snapshot and notify subscribers.
+
+        Args:
+            job_id: Job the update belongs to
+            status: Document status ('pending', 'success', 'failed')
+            stage: Pipeline stage currently running (e.g. 'screenshots', 'generating')
+            message: Human readable progress (e.g. 'screenshots 37/120')
+            progress: Counters to merge into the snapshot (e.g. {'screenshots': {'done': 37, 'total': 120}})
+            partial: Document generated so far ({'sections': [...], 'markdown': ...}); replaces the previous
+                one and is dropped once the job reaches a terminal status
+
+        Returns:
+            dict: The new snapshot, or None if the update was handed over to the event loop thread.
+        """
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is None and self._loop is not None and self._loop.is_running():
+            # Called from a worker thread (e.g. inside asyncio.to_thread); subscribers live on the loop
+            self._loop.call_soon_threadsafe(
+                functools.partial(self.publish, job_id, status=status, stage=stage, message=message,
+                                  progress=progress, partial=partial)
+            )
+            return None
+        if running_loop is not None:
+            self._loop = running_loop
+
+        previous = self._snapshots.get(job_id)
+        snapshot = dict(previous) if previous is not MISSING else {"job_id": job_id, "status": "pending", "progress": {}}
+        if status is not None:
+            snapshot["status"] = status
+        if stage is not None:
+            snapshot["stage"] = stage
+        if message is not None:
+            snapshot["message"] = message
+        if progress:
+            snapshot["progress"] = {**snapshot.get("progress", {}), **progress}
+        if partial is not None:
+            snapshot["partial"] = partial
+        if snapshot["status"] in TERMINAL_STATUSES:
+            snapshot.pop("partial", None)
+        snapshot["updated_at"] = time.time()
+        self._snapshots.set(job_id, snapshot)
+
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()  # drop the oldest update, the newest snapshot supersedes it
+            queue.put_nowait(snapshot)
+
+        self._schedule_persist(job_id, snapshot, urgent=snapshot["status"] in TERMINAL_STATUSES or status is not None)
+        return snapshot
+
+    def get_local(self, job_id: str) -> Optional[dict]:
+        """Latest snapshot published by this process, if any."""
+        snapshot = self._snapshots.get(job_id)
+        return None if snapshot is MISSING else snapshot
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Latest snapshot from this process or, failing that, from the shared queue database."""
+        snapshot = self.get_local(job_id)
+        if snapshot is not None:
+            return snapshot
+        return await self._load_persisted(job_id)
+
+    async def stream(self, job_id: str) -> AsyncIterator[Optional[dict]]:
+        """
+        Yield the job's snapshot whenever it changes, until it reaches a terminal status.
+        Yields None when nothing changed for the keep-alive interval.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            last_sent = None
+            last_activity = time.monotonic()
+            snapshot = await self.get(job_id)
+            while True:
+                if snapshot is not None and snapshot.get("updated_at") != last_sent:
+                    last_sent = snapshot.get("updated_at")
+                    last_activity = time.monotonic()
+                    yield snapshot
+                    if snapshot.get("status") in TERMINAL_STATUSES:
+                        return
+                elif time.monotonic() - last_activity >= StatusBusConfig.STREAM_KEEPALIVE_SECONDS:
+                    last_activity = time.monotonic()
+                    yield None
+
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=StatusBusConfig.STREAM_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    # The job may be running in another worker process
+                    snapshot = self.get_local(job_id) or await self._load_persisted(job_id)
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    async def _load_persisted(self, job_id: str) -> Optional[dict]:
+        try:
+            return await asyncio.to_thread(get_job_queue().get_progress, job_id)
+        except Exception as e:
+            logger.warning(f"Failed to read persisted status for job {job_id}: {e}")
+            return None
+
+    def _schedule_persist(self, job_id: str, snapshot: dict, urgent: bool) -> None:
+        self._dirty[job_id] = snapshot
+        if self._loop is None or not self._loop.is_running():
+            # Published outside the server (scripts, benchmarks); write synchronously
+            self._flush_now()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if urgent:
+            self._flush_wakeup.set()
+
+    def _flush_now(self) -> None:
+        dirty, self._dirty = self._dirty, {}
+        self._write_snapshots(dirty)
+
+    @staticmethod
+    def _write_snapshots(snapshots: Dict[str, dict]) -> None:
+        queue = get_job_queue()
+        for job_id, snapshot in snapshots.items():
+            try:
+                queue.set_progress(job_id, snapshot)
+            except Exception as e:
+                logger.warning(f"Failed to persist status for job {job_id}: {e}")
+
+    async def _flush_loop(self) -> None:
+        """Write dirty snapshots to the shared database, at most once per persist interval."""
+        while self._dirty:
+            # Swap on the event loop thread; only the write happens in the worker thread
+            dirty, self._dirty = self._dirty, {}
+            await asyncio.to_thread(self._write_snapshots, dirty)
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=StatusBusConfig.PERSIST_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+
+
+# Process-wide status bus
+_status_bus: Optional[JobStatusBus] = None
+
+
+def get_status_bus() -> JobStatusBus:
+    """Get the process-wide job status bus."""
+    global _status_bus
+    if _status_bus is None:
+        _status_bus = JobStatusBus()
+    return _status_bus
+
+
+def publish_job_status(job_id: str, status: Optional[str] = None, stage: Optional[str] = None,
+                       message: Optional[str] = None, progress: Optional[dict] = None,
+                       partial: Optional[dict] = None) -> None:
+    """Publish a status update, never letting a bus failure break the caller."""
+    try:
+        get_status_bus().publish(job_id, status=status, stage=stage, message=message, progress=progress, partial=partial)
+    except Exception as e:
+        logger.warning(f"Failed to publish status for job {job_id}: {e}")
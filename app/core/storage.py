@@ -0,0 +1,107 @@
+"""
+Async Supabase Storage access over the shared HTTP client.
+
+Talks to the Storage REST API directly so downloads are streamed into
+in-memory artifacts over pooled keep-alive connections, without blocking
+the event loop.
+"""
+import os
+from typing import Optional
+from urllib.parse import quote
+
+import httpx
+
+from app.config.http_config import HttpClientConfig
+from app.config.logging import get_logger
+from app.core.http_client import get_http_client
+from app.core.metrics import DOWNLOADED_BYTES
+from app.utils.artifacts import Artifact
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Page size used when listing a storage folder
+LIST_PAGE_SIZE = 1000
+
+
+class StorageError(Exception):
+    """Raised when a Storage API request fails."""
+
+
+class AsyncStorageBucket:
+    """A Supabase Storage bucket accessed through the shared async HTTP client."""
+
+    def __init__(self, bucket: str, supabase_url: Optional[str] = None, supabase_key: Optional[str] = None):
+        supabase_url = supabase_url or os.getenv("SUPABASE_URL")
+        supabase_key = supabase_key or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not supabase_key:
+            raise ValueError("Supabase credentials not found in environment variables")
+        self.bucket = bucket
+        self._base_url = f"{supabase_url.rstrip('/')}/storage/v1"
+        self._headers = {
+            "Authorization": f"Bearer {supabase_key}",
+            "apikey": supabase_key,
+        }
+
+    def _object_url(self, path: str) -> str:
+        return f"{self._base_url}/object/{quote(self.bucket)}/{quote(path.lstrip('/'), safe='/')}"
+
+    async def list(self, prefix: str) -> list:
+        """
+        List all objects in a folder, following pagination.
+
+        Returns:
+            list: Object dicts as returned by the Storage API ('name', 'metadata', ...).
+        """
+        client = get_http_client()
+        objects = []
+        offset = 0
+        while True:
+            response = await client.post(
+                f"{self._base_url}/object/list/{quote(self.bucket)}",
+                headers=self._headers,
+                json={
+                    "prefix": prefix,
+                    "limit": LIST_PAGE_SIZE,
+                    "offset": offset,
+                    "sortBy": {"column": "name", "order": "asc"},
+                },
+            )
+            if response.status_code != 200:
+                raise StorageError(f"Listing '{prefix}' failed with status {response.status_code}: {response.text[:200]}")
+            page = response.json()
+            objects.extend(page)
+            if len(page) < LIST_PAGE_SIZE:
+                return objects
+            offset += LIST_PAGE_SIZE
+
+    async def download(self, path: str, name: Optional[str] = None,
+                       mime_type: str = "application/octet-stream") -> Artifact:
+        """
+        Stream an object into an in-memory artifact.
+
+        Raises:
+            StorageError: If the object cannot be downloaded.
+        """
+        client = get_http_client()
+        artifact = Artifact(name or path.rsplit("/", 1)[-1], mime_type)
+        try:
+            async with client.stream("GET", self._object_url(path), headers=self._headers) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise StorageError(f"Download of '{path}' failed with status {response.status_code}: {response.text[:200]}")
+                async for chunk in response.aiter_bytes(HttpClientConfig.STREAM_CHUNK_BYTES):
+                    artifact.write(chunk)
+        except httpx.HTTPError as e:
+            artifact.close()
+            raise StorageError(f"Download of '{path}' failed: {e}") from e
+        except BaseException:
+            artifact.close()
+            raise
+        DOWNLOADED_BYTES.inc(artifact.size)
+        return artifact
+
+
+def get_storage_bucket(bucket: str) -> AsyncStorageBucket:
+    """Get an async handle on a storage bucket (cheap; the HTTP pool is shared)."""
+    return AsyncStorageBucket(bucket)
@@ -1,11 +1,14 @@
 # File: models.py  
 from pydantic import BaseModel, Field
-from typing import List, Optional , Dict
+from typing import Any, List, Optional , Dict
 
 # State class for LangGraph
 class SOPState(BaseModel):
     KB: str = ""
-    file_path: str = ""
+    pdf_artifact: Optional[Any] = None  # app.utils.artifacts.Artifact holding the screenshots PDF
+    genai_file: Optional[Any] = None  # PDF already uploaded to the GenAI File API, if any
+    screenshot_parts: Optional[List[Any]] = None  # Screenshots as model content parts (images input mode)
+    screenshot_count: int = 0  # Screenshots sent to the model (in the PDF or as image parts)
     user_query: str = ""
     event_data:str = ""  # Accept both list and raw string
     user_id: str = ""
@@ -13,6 +16,7 @@ class SOPState(BaseModel):
     components: Optional[Dict] = None 
     category_name: str = ""
     contents:str = ""
+    screenshot_aliases: Dict[str, str] = Field(default_factory=dict)  # dropped duplicate screenshot -> kept screenshot
 
     class Config:
         arbitrary_types_allowed = True
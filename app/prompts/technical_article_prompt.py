@@ -1,12 +1,15 @@
 import json # Import json library if not already imported
 
-def get_prompt(user_query: str, event_text: str, KB: str,contents:str, generation_schema_str: str):
-   
+def get_prompt_prefix(generation_schema_str: str) -> str:
+    """
+    Instructions and response schema. Identical for every job using the same template,
+    so it can be cached on the provider side (see context_cache); nothing job-specific goes here.
+    """
 
     prompt_start = f"""
             You are an expert technical writer creating an **extremely detailed and comprehensive**, customer-facing technical article in response to a specific user query. Your absolute priority is accuracy and including **all relevant details** from the provided application data and the PDF document, while ensuring the output is **general and reusable**, NOT specific to the demo session data.
 
-            **Core Task:** Generate a technical article in JSON format that directly and exhaustively addresses the **User Query** :`{user_query}`. Base the article on synthesizing information from **both** the Event Log and the PDF document according to the priorities below. The final JSON output must strictly adhere to the provided "JSON Output Schema Definition". **You MUST generate a JSON object that includes ALL properties defined in the comprehensive schema provided below (including sections like "Title", "Subtitle", "Introduction", "Features", "Table of Contents", "Paragraph", "Note", "Code Snippet", "Quote", "Checklist", "FAQ", "Steps / How-To", "Callout / Tip", "Conclusion", and "References"). Ensure all string values are properly quoted and escaped.**
+            **Core Task:** Generate a technical article in JSON format that directly and exhaustively addresses the **User Query** given in the Input Data Mapping below. Base the article on synthesizing information from **both** the Event Log and the PDF document according to the priorities below. The final JSON output must strictly adhere to the provided "JSON Output Schema Definition". **You MUST generate a JSON object that includes ALL properties defined in the comprehensive schema provided below (including sections like "Title", "Subtitle", "Introduction", "Features", "Table of Contents", "Paragraph", "Note", "Code Snippet", "Quote", "Checklist", "FAQ", "Steps / How-To", "Callout / Tip", "Conclusion", and "References"). Ensure all string values are properly quoted and escaped.**
 
             **Input Roles & Usage - CRITICAL PRIORITIES & DETAIL LEVEL:**
             *   **User Query:** The driving context. Frame the entire article, including the 'Title' field, to fully answer this query. The 'Title' field (as defined in the schema) should be a concise, human-readable summary of the article's purpose, directly related to the User Query.
@@ -56,6 +59,12 @@ def get_prompt(user_query: str, event_text: str, KB: str,contents:str, generatio
 
     prompt_schema_section = generation_schema_str # This MUST be the string of your FULL DETAILED SCHEMA
 
+    return prompt_start + "\n" + prompt_schema_section + "\n"
+
+
+def get_prompt_suffix(user_query: str, event_text: str, KB: str, contents: str) -> str:
+    """The job's inputs, sent after the (possibly cached) prefix."""
+
     prompt_end = f"""
 
             ---
@@ -69,5 +78,9 @@ def get_prompt(user_query: str, event_text: str, KB: str,contents:str, generatio
             **JSON Output (MUST be a single, syntactically correct, and complete JSON object adhering strictly to the comprehensive schema above. Ensure all string values are properly quoted and escaped.):**
             """
 
-    final_prompt = prompt_start + "\n" + prompt_schema_section + "\n" + prompt_end
+    return prompt_end
+
+
+def get_prompt(user_query: str, event_text: str, KB: str,contents:str, generation_schema_str: str):
+    final_prompt = get_prompt_prefix(generation_schema_str) + get_prompt_suffix(user_query, event_text, KB, contents)
     return final_prompt
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Provider-side caching of the prompt prefix.
+
+The generation prompt is a prefix (instructions + minified response schema)
+that is identical for every job using the same template, followed by the
+job's own inputs. The prefix is stored once per (model, prefix) hash as Gemini
+cached content; jobs then send only their suffix and screenshots and refer to
+the cache, so the prefix is neither re-sent nor processed at the full input
+rate. Cache names are shared by every worker process on the node through the
+queue database, and the provider deletes each cache when its TTL runs out.
+A prefix the provider refused to cache (unsupported model, prefix below its
+minimum size) is sent uncached for a while before creation is tried again.
+"""
+import asyncio
+import datetime
+import hashlib
+import time
+import weakref
+from typing import Optional
+
+import google.generativeai as genai
+from google.generativeai import caching
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import ContextCacheConfig
+from app.core.job_queue import get_job_queue
+from app.core.metrics import CONTEXT_CACHE
+from app.services.ai_services.prompt_budget import count_tokens
+from app.utils.ttl_cache import TTLCache, MISSING
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# One creation at a time per prefix in this process; a lock goes away once no job holds or waits for it
+_creation_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# Prefixes whose cache creation failed recently in this process
+_failed_prefixes = TTLCache(maxsize=256, ttl=ContextCacheConfig.FAILURE_TTL_SECONDS)
+
+
+def prefix_hash(model_name: str, prefix: str) -> str:
+    """Hex SHA-256 identifying a prompt prefix for a model."""
+    return hashlib.sha256(f"{model_name}\n{prefix}".encode("utf-8")).hexdigest()
+
+
+async def get_cached_prefix(model_name: str, prefix: str) -> Optional[str]:
+    """
+    Get the cached content holding prefix, creating it if there is none with enough time left.
+
+    Returns:
+        str: The cached content name, or None if the prefix should be sent uncached
+        (caching disabled, prefix too small, or the cache could not be created).
+    """
+    if not ContextCacheConfig.ENABLED:
+        return None
+    if count_tokens(prefix) < ContextCacheConfig.MIN_TOKENS:
+        CONTEXT_CACHE.labels(result="skipped").inc()
+        return None
+
+    key = prefix_hash(model_name, prefix)
+    if _failed_prefixes.get(key) is not MISSING:
+        CONTEXT_CACHE.labels(result="skipped").inc()
+        return None
+    queue = get_job_queue()
+    lock = _creation_locks.get(key)
+    if lock is None:
+        lock = _creation_locks[key] = asyncio.Lock()
+    async with lock:
+        if _failed_prefixes.get(key) is not MISSING:
+            CONTEXT_CACHE.labels(result="skipped").inc()
+            return None
+        name = await asyncio.to_thread(
+            queue.get_context_cache, key, time.time() + ContextCacheConfig.MIN_REMAINING_SECONDS
+        )
+        if name is not None:
+            CONTEXT_CACHE.labels(result="hit").inc()
+            return name
+
+        try:
+            cached = await asyncio.to_thread(
+                caching.CachedContent.create,
+                model=model_name,
+                display_name=f"sop-prefix-{key[:12]}",
+                contents=[{"role": "user", "parts": [{"text": prefix}]}],
+                ttl=datetime.timedelta(seconds=ContextCacheConfig.TTL_SECONDS),
+            )
+        except Exception as e:
+            _failed_prefixes.set(key, True)
+            CONTEXT_CACHE.labels(result="failed").inc()
+            logger.warning(
+                f"Could not cache the prompt prefix, sending it uncached for "
+                f"{ContextCacheConfig.FAILURE_TTL_SECONDS:.0f}s: {e}"
+            )
+            return None
+        await asyncio.to_thread(queue.put_context_cache, key, cached.name, time.time() + ContextCacheConfig.TTL_SECONDS)
+        CONTEXT_CACHE.labels(result="created").inc()
+        logger.info(f"Cached prompt prefix {key[:12]} as {cached.name}")
+        return cached.name
+
+
+async def forget_cached_prefix(model_name: str, prefix: str, name: str) -> None:
+    """Stop using a cached content (e.g. the provider rejected it); the next job creates a new one."""
+    await asyncio.to_thread(get_job_queue().remove_context_cache, prefix_hash(model_name, prefix), name)
+
+
+def cached_model(name: str, generation_config=None):
+    """A GenerativeModel whose requests are prefixed with the cached content."""
+    return genai.GenerativeModel.from_cached_content(cached_content=name, generation_config=generation_config)
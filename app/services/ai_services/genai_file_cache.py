@@ -0,0 +1,119 @@
+"""
+Reuse of PDFs already uploaded to the GenAI File API.
+
+Retries, regenerations with another template and duplicate jobs build the
+same PDF again (PDFs are written deterministically), so uploads are recorded
+by the SHA-256 of their content in the node's shared queue database. A job
+whose PDF was uploaded recently by any worker process gets that file instead
+of uploading it again. Cached files belong to the cache, not to the job: they
+are deleted by the reaper once their TTL has passed, which is always shorter
+than the File API's own 48 hour lifetime.
+"""
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+from typing import Tuple
+
+import google.generativeai as genai
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import GenaiFileCacheConfig
+from app.core.job_queue import get_job_queue
+from app.core.metrics import GENAI_FILE_CACHE
+from app.services.ai_services.genai_files import upload_pdf, delete_uploaded_file
+from app.utils.artifacts import Artifact
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# The File API deletes uploads this long after they were created
+GENAI_FILE_LIFETIME_SECONDS = 48 * 3600
+
+
+def content_sha256(artifact: Artifact) -> str:
+    """Hex SHA-256 of an artifact's content."""
+    with artifact.view() as view:
+        return hashlib.sha256(view).hexdigest()
+
+
+def _cache_ttl() -> float:
+    """TTL of a new upload, leaving the File API lifetime a margin of at least an hour."""
+    return min(GenaiFileCacheConfig.TTL_SECONDS, GENAI_FILE_LIFETIME_SECONDS - 3600)
+
+
+async def _still_active(name: str) -> bool:
+    """Whether the File API still has the file and it is ready for use."""
+    try:
+        remote = await asyncio.to_thread(genai.get_file, name)
+    except Exception as e:
+        logger.info(f"Cached GenAI file {name} is no longer available: {e}")
+        return False
+    state = getattr(getattr(remote, "state", None), "name", "ACTIVE")
+    return state == "ACTIVE"
+
+
+async def acquire_pdf(pdf_artifact: Artifact, job_id: str) -> Tuple[object, bool]:
+    """
+    Get an uploaded GenAI file for a PDF, reusing the upload of identical content when possible.
+
+    Returns:
+        tuple: (file with .name and .uri, owned). When owned is True the caller must delete
+        the file once done; cached files are left to the reaper.
+
+    Raises:
+        ValueError: If the PDF is invalid or the upload fails.
+    """
+    if not GenaiFileCacheConfig.ENABLED:
+        return await upload_pdf(pdf_artifact, job_id), True
+
+    sha256 = await asyncio.to_thread(content_sha256, pdf_artifact)
+    queue = get_job_queue()
+    cached = await asyncio.to_thread(
+        queue.get_genai_file, sha256, time.time() + GenaiFileCacheConfig.MIN_REMAINING_SECONDS
+    )
+    if cached is not None:
+        if await _still_active(cached["name"]):
+            GENAI_FILE_CACHE.labels(result="hit").inc()
+            logger.info(f"Reusing uploaded GenAI file {cached['name']} for PDF {sha256[:12]} (job {job_id})")
+            return SimpleNamespace(name=cached["name"], uri=cached["uri"], mime_type=cached["mime_type"]), False
+        await asyncio.to_thread(queue.remove_genai_file, cached["name"])
+
+    GENAI_FILE_CACHE.labels(result="miss").inc()
+    uploaded_file = await upload_pdf(pdf_artifact, job_id)
+    try:
+        await asyncio.to_thread(
+            queue.put_genai_file, sha256, uploaded_file.name, uploaded_file.uri,
+            "application/pdf", time.time() + _cache_ttl()
+        )
+    except Exception as e:
+        logger.warning(f"Could not cache GenAI file {uploaded_file.name}, the job will delete it: {e}")
+        return uploaded_file, True
+    return uploaded_file, False
+
+
+async def reap_expired_files() -> int:
+    """
+    Delete cached uploads whose TTL has passed.
+
+    Returns:
+        int: Number of files deleted.
+    """
+    names = await asyncio.to_thread(get_job_queue().pop_expired_genai_files)
+    for name in names:
+        await delete_uploaded_file(SimpleNamespace(name=name))
+    if names:
+        logger.info(f"Reaped {len(names)} expired GenAI files")
+    return len(names)
+
+
+async def run_file_reaper(interval: float = GenaiFileCacheConfig.REAP_INTERVAL_SECONDS) -> None:
+    """Reap expired uploads every interval seconds until cancelled."""
+    while True:
+        try:
+            await reap_expired_files()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"GenAI file reaper failed: {e}")
+        await asyncio.sleep(interval)
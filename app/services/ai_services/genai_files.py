@@ -0,0 +1,97 @@
+"""
+Helpers for moving generated PDFs and screenshots in and out of the GenAI File API.
+Uploads are retried on transient failures (see genai_resilience) but never hedged,
+since a duplicate upload would leave a second file behind. Each attempt reads the
+artifact through its own stream, and an attempt that finishes after it timed out
+has its file deleted.
+"""
+import asyncio
+import google.generativeai as genai
+from app.services.file_services.pdf_validator import validate_pdf_file
+from app.services.ai_services.genai_resilience import call_with_resilience
+from app.config.logging import get_logger
+from app.config.pipeline_config import GenaiResilienceConfig
+from app.core.metrics import PDF_PAGES, stage_timer
+from app.utils.artifacts import Artifact
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+
+def _delete_late_upload(uploaded_file) -> None:
+    """Delete the file of an upload attempt that finished after it was given up (blocking)."""
+    logger.info(f"Deleting late GenAI upload {uploaded_file.name}")
+    genai.delete_file(uploaded_file.name)
+
+
+async def upload_pdf(pdf_artifact: Artifact, job_id: str):
+    """
+    Validate an in-memory PDF and upload it via the GenAI File API.
+
+    Returns:
+        The uploaded genai File (use .uri to reference it in a prompt).
+
+    Raises:
+        ValueError: If the PDF is invalid or the upload fails.
+    """
+    logger.info(f"Validating PDF: {pdf_artifact}")
+    with stage_timer("pdf_validation"):
+        page_count = await asyncio.to_thread(validate_pdf_file, pdf_artifact)
+    PDF_PAGES.inc(page_count)
+
+    logger.info(f"Uploading PDF to GenAI: {pdf_artifact}")
+    try:
+        with stage_timer("genai_upload"):
+            uploaded_file = await call_with_resilience(
+                "upload_file",
+                lambda attempt, cancelled: genai.upload_file(
+                    path=pdf_artifact.reader(), display_name=f"SOP_PDF_{job_id}", mime_type="application/pdf"
+                ),
+                deadline=GenaiResilienceConfig.UPLOAD_DEADLINE_SECONDS,
+                on_abandoned=_delete_late_upload
+            )
+    except Exception as e:
+        logger.error(f"GenAI PDF upload failed: {e}")
+        raise ValueError(f"GenAI PDF upload failed: {e}")
+    logger.info(f"PDF uploaded to GenAI. URI: {uploaded_file.uri}")
+    return uploaded_file
+
+
+async def upload_image(image_artifact: Artifact, job_id: str):
+    """
+    Upload a screenshot via the GenAI File API.
+
+    Returns:
+        The uploaded genai File.
+
+    Raises:
+        ValueError: If the upload fails.
+    """
+    try:
+        uploaded_file = await call_with_resilience(
+            "upload_file",
+            lambda attempt, cancelled: genai.upload_file(
+                path=image_artifact.reader(),
+                display_name=f"SOP_IMG_{job_id}_{image_artifact.name}", mime_type=image_artifact.mime_type
+            ),
+            deadline=GenaiResilienceConfig.UPLOAD_DEADLINE_SECONDS,
+            on_abandoned=_delete_late_upload
+        )
+    except Exception as e:
+        logger.error(f"GenAI image upload failed for {image_artifact.name}: {e}")
+        raise ValueError(f"GenAI image upload failed for {image_artifact.name}: {e}")
+    logger.debug(f"Screenshot {image_artifact.name} uploaded to GenAI. URI: {uploaded_file.uri}")
+    return uploaded_file
+
+
+async def delete_uploaded_file(uploaded_file) -> None:
+    """Delete a file from the GenAI File API, logging (not raising) on failure."""
+    if not uploaded_file or not hasattr(uploaded_file, 'name'):
+        logger.info("No GenAI input file to delete or already cleaned up.")
+        return
+    logger.info(f"Deleting GenAI file {uploaded_file.name}...")
+    try:
+        await asyncio.to_thread(genai.delete_file, uploaded_file.name)
+        logger.info("GenAI file deleted successfully.")
+    except Exception as e:
+        logger.warning(f"Failed to delete GenAI file '{uploaded_file.name}' during cleanup: {e}")
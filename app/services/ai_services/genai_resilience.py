@@ -0,0 +1,214 @@
+"""
+Retries, deadlines and hedging for blocking GenAI SDK calls.
+
+Every attempt runs on a worker thread under its own deadline. Retryable
+failures (timeouts, connection errors, 408/429/5xx) are retried with
+exponential backoff and full jitter; anything else fails at once. Hedging
+starts a second attempt when the first is still running after the observed
+p95 latency of the operation and returns whichever finishes first.
+
+A thread cannot be cancelled, so an attempt that missed its deadline or lost
+the hedge keeps running until the SDK returns. Callers that can stop early
+(e.g. a streamed response) check the attempt's cancelled event, and callers
+whose late results hold resources (e.g. an uploaded file) pass on_abandoned
+to release them once the attempt finishes.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import httpx
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import GenaiResilienceConfig
+from app.core.metrics import GENAI_HEDGES, GENAI_RETRIES
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status codes worth another attempt (google.api_core errors carry theirs in .code)
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Recent successful attempt durations per operation, for the hedge delay
+_latencies: Dict[str, Deque[float]] = {}
+
+
+class AttemptTimeout(TimeoutError):
+    """An attempt did not finish within its deadline."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed GenAI call is worth retrying."""
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    try:
+        return int(status) in RETRYABLE_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+def backoff_delay(retry: int) -> float:
+    """Sleep before the given retry (1-based): full jitter over an exponentially growing cap."""
+    cap = min(GenaiResilienceConfig.BACKOFF_MAX_SECONDS, GenaiResilienceConfig.BACKOFF_BASE_SECONDS * 2 ** (retry - 1))
+    return random.uniform(0, cap)
+
+
+def hedge_delay(operation: str) -> Optional[float]:
+    """
+    How long to wait for an attempt before hedging it: the p95 of recent successful attempts.
+
+    Returns:
+        float: Seconds, or None while too few latencies have been observed.
+    """
+    samples = _latencies.get(operation)
+    if not samples or len(samples) < GenaiResilienceConfig.HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    return max(p95, GenaiResilienceConfig.HEDGE_MIN_DELAY_SECONDS)
+
+
+def _observe_latency(operation: str, seconds: float) -> None:
+    _latencies.setdefault(operation, deque(maxlen=GenaiResilienceConfig.LATENCY_WINDOW)).append(seconds)
+
+
+def _release_abandoned(operation: str, on_abandoned: Callable[[T], None], result: T) -> None:
+    try:
+        on_abandoned(result)
+    except Exception as e:
+        logger.warning(f"Failed to release the result of an abandoned {operation} attempt: {e}")
+
+
+def _abandon(operation: str, worker: asyncio.Future, on_abandoned: Optional[Callable[[T], None]]) -> None:
+    """Hand the result of an attempt nobody waits for any more to on_abandoned once its thread returns."""
+    def finished(future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        if on_abandoned is not None:
+            logger.info(f"Abandoned {operation} attempt finished late, releasing its result")
+            asyncio.get_running_loop().run_in_executor(None, _release_abandoned, operation, on_abandoned, future.result())
+
+    worker.add_done_callback(finished)
+
+
+async def _run_attempt(operation: str, fn: Callable[[int, threading.Event], T], attempt: int,
+                       cancelled: threading.Event, deadline: float,
+                       admit: Optional[Callable[[], Awaitable]] = None,
+                       on_abandoned: Optional[Callable[[T], None]] = None) -> T:
+    if admit is not None:
+        # Waiting for admission (e.g. the rate limiter) does not count against the deadline
+        await admit()
+    start = time.perf_counter()
+    worker = asyncio.ensure_future(asyncio.to_thread(fn, attempt, cancelled))
+    try:
+        result = await asyncio.wait_for(asyncio.shield(worker), timeout=deadline)
+    except asyncio.TimeoutError:
+        cancelled.set()
+        _abandon(operation, worker, on_abandoned)
+        raise AttemptTimeout(f"{operation} attempt {attempt} exceeded its {deadline:.0f}s deadline")
+    except asyncio.CancelledError:
+        # Lost a hedge, or the job was cancelled
+        _abandon(operation, worker, on_abandoned)
+        raise
+    _observe_latency(operation, time.perf_counter() - start)
+    return result
+
+
+async def _run_hedged(operation: str, fn: Callable[[int, threading.Event], T], attempt: int, deadline: float,
+                      admit: Optional[Callable[[], Awaitable]] = None,
+                      on_abandoned: Optional[Callable[[T], None]] = None) -> T:
+    """One attempt, hedged by a second one if it outlives the operation's p95."""
+    delay = hedge_delay(operation)
+    if admit is not None:
+        # Admitted before the hedge timer starts, so waiting for quota never triggers a hedge
+        await admit()
+    primary_cancelled = threading.Event()
+    primary = asyncio.ensure_future(
+        _run_attempt(operation, fn, attempt, primary_cancelled, deadline, on_abandoned=on_abandoned)
+    )
+    if delay is None or delay >= deadline:
+        return await primary
+
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    GENAI_HEDGES.labels(operation=operation, result="fired").inc()
+    logger.info(f"{operation} attempt {attempt} still running after {delay:.1f}s, sending a hedged request")
+    hedge_cancelled = threading.Event()
+    hedge = asyncio.ensure_future(
+        _run_attempt(operation, fn, attempt + 1, hedge_cancelled, deadline, admit, on_abandoned)
+    )
+    attempts = {primary: primary_cancelled, hedge: hedge_cancelled}
+    pending = set(attempts)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    GENAI_HEDGES.labels(operation=operation, result="won" if task is hedge else "lost").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # The loser keeps its thread until the SDK returns; tell it to stop if it can
+        for task, cancelled in attempts.items():
+            if not task.done():
+                cancelled.set()
+                task.cancel()
+
+
+async def call_with_resilience(
+    operation: str,
+    fn: Callable[[int, threading.Event], T],
+    deadline: float,
+    hedge: bool = False,
+    max_attempts: int = GenaiResilienceConfig.MAX_ATTEMPTS,
+    admit: Optional[Callable[[], Awaitable]] = None,
+    on_abandoned: Optional[Callable[[T], None]] = None,
+) -> T:
+    """
+    Run a blocking GenAI call with per-attempt deadlines, retries and optional hedging.
+
+    Args:
+        operation: Name of the call, used for metrics and the hedge latency window
+        fn: Blocking callable taking (attempt number, cancelled event); runs on a worker thread
+        deadline: Seconds each attempt may take
+        hedge: Whether a slow attempt may be hedged by a second request (only for idempotent calls)
+        max_attempts: Attempts in total, hedged requests not included
+        admit: Awaited before every attempt and hedged request, outside its deadline (e.g. rate limiting)
+        on_abandoned: Called on a worker thread with the result of an attempt that finished after it
+            timed out or lost the hedge (e.g. to delete a late upload)
+
+    Returns:
+        The result of the first successful attempt.
+
+    Raises:
+        The last error once the attempts are used up, or the first non-retryable one.
+    """
+    hedge = hedge and GenaiResilienceConfig.HEDGE_ENABLED
+    attempt = 1
+    for retry in range(max_attempts):
+        try:
+            if hedge:
+                return await _run_hedged(operation, fn, attempt, deadline, admit, on_abandoned)
+            return await _run_attempt(operation, fn, attempt, threading.Event(), deadline, admit, on_abandoned)
+        except Exception as e:
+            if retry + 1 >= max_attempts or not is_retryable(e):
+                raise
+            reason = "timeout" if isinstance(e, TimeoutError) else type(e).__name__
+            GENAI_RETRIES.labels(operation=operation, reason=reason).inc()
+            delay = backoff_delay(retry + 1)
+            logger.warning(f"{operation} attempt failed ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        # Hedged requests use attempt numbers too, so they stay unique per call
+        attempt += 2 if hedge else 1
@@ -0,0 +1,101 @@
+"""
+Choice of the model tier for each model call.
+
+Requests go to the standard model unless they are small - few prompt tokens,
+few screenshots and a simple template - or the node is saturated (many jobs
+waiting in the queue), in which case the light model serves them faster and
+drains the queue. Tiering is off unless MODEL_TIERING_ENABLED is set, and
+operations in MODEL_TIER_STANDARD_ONLY_OPERATIONS (rephrase by default)
+always use the standard model. Every decision is logged and counted by
+operation, tier and reason so the thresholds can be tuned against output
+quality.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import ModelTierConfig
+from app.core.job_queue import get_job_queue
+from app.core.metrics import MODEL_ROUTING
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+TIER_STANDARD = "standard"
+TIER_LIGHT = "light"
+
+
+@dataclass
+class RoutingDecision:
+    """The tier chosen for a request and why."""
+    tier: str
+    model_name: str
+    reason: str
+
+
+def count_schema_fields(schema) -> int:
+    """Number of properties in a JSON response schema, nested ones included (template complexity)."""
+    if isinstance(schema, dict):
+        properties = schema.get("properties")
+        own = len(properties) if isinstance(properties, dict) else 0
+        return own + sum(count_schema_fields(value) for value in schema.values())
+    if isinstance(schema, list):
+        return sum(count_schema_fields(item) for item in schema)
+    return 0
+
+
+def _size_reason(prompt_tokens: Optional[int], screenshots: int, schema_fields: int) -> Optional[str]:
+    """Why a request is too large for the light tier, or None if it is small."""
+    if prompt_tokens is None:
+        return "unknown_size"
+    if prompt_tokens > ModelTierConfig.LIGHT_MAX_PROMPT_TOKENS:
+        return "large_prompt"
+    if screenshots > ModelTierConfig.LIGHT_MAX_SCREENSHOTS:
+        return "many_screenshots"
+    if schema_fields > ModelTierConfig.LIGHT_MAX_SCHEMA_FIELDS:
+        return "complex_template"
+    return None
+
+
+async def route_model(operation: str, prompt_tokens: Optional[int], screenshots: int = 0,
+                      schema_fields: int = 0, job_id: Optional[str] = None) -> RoutingDecision:
+    """
+    Choose the model tier of a request.
+
+    Args:
+        operation: Kind of call ('generate_content', 'rephrase', 'mcp_agent'), for logs and metrics
+        prompt_tokens: Estimated prompt tokens, or None if the size is not known up front
+        screenshots: Screenshots sent with the prompt (in a PDF or as image parts)
+        schema_fields: Fields of the response schema (see count_schema_fields)
+        job_id: Job the request belongs to, for the log
+
+    Returns:
+        RoutingDecision: The tier, its model name and the reason.
+    """
+    if not ModelTierConfig.ENABLED:
+        decision = RoutingDecision(TIER_STANDARD, ModelTierConfig.STANDARD_MODEL, "disabled")
+    elif operation in ModelTierConfig.STANDARD_ONLY_OPERATIONS:
+        decision = RoutingDecision(TIER_STANDARD, ModelTierConfig.STANDARD_MODEL, "pinned")
+    else:
+        depth = 0
+        if ModelTierConfig.SATURATION_QUEUE_DEPTH > 0:
+            try:
+                depth = await asyncio.to_thread(get_job_queue().depth)
+            except Exception as e:
+                logger.warning(f"Could not read the queue depth for model routing: {e}")
+        too_large = _size_reason(prompt_tokens, screenshots, schema_fields)
+        if ModelTierConfig.SATURATION_QUEUE_DEPTH > 0 and depth >= ModelTierConfig.SATURATION_QUEUE_DEPTH:
+            decision = RoutingDecision(TIER_LIGHT, ModelTierConfig.LIGHT_MODEL, "saturated")
+        elif too_large is None:
+            decision = RoutingDecision(TIER_LIGHT, ModelTierConfig.LIGHT_MODEL, "small")
+        else:
+            decision = RoutingDecision(TIER_STANDARD, ModelTierConfig.STANDARD_MODEL, too_large)
+
+    MODEL_ROUTING.labels(operation=operation, tier=decision.tier, reason=decision.reason).inc()
+    logger.info(
+        f"Routing {operation}{f' for job {job_id}' if job_id else ''} to {decision.model_name} "
+        f"({decision.tier}, {decision.reason}; prompt_tokens={prompt_tokens}, screenshots={screenshots}, "
+        f"schema_fields={schema_fields})"
+    )
+    return decision
@@ -0,0 +1,145 @@
+"""
+Token budget for the generation prompt.
+
+Each prompt section is counted with a local, conservative token estimate
+(no tokenizer download or API call) and the configured total is handed out
+in priority order: schema > event log > contents > KB. A section that does
+not fit is truncated deterministically at line boundaries - the event log
+keeps its first and last whole events (always at least one), contents and KB
+keep their beginning - and a marker says how much was left out.
+"""
+import re
+from typing import Dict, Optional, Tuple
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import PromptBudgetConfig
+from app.core.metrics import PROMPT_SECTION_TOKENS, PROMPT_TRUNCATIONS
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Sections in the order they are given budget; the schema is never truncated
+SECTION_PRIORITY = ("schema", "event_log", "contents", "kb")
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the tokens of text: one per punctuation mark and one per started
+    four characters of a word. Errs on the high side for prose and JSON.
+    """
+    return sum(1 + (len(piece) - 1) // 4 for piece in _TOKEN_PIECES.findall(text))
+
+
+def _section_caps() -> Dict[str, int]:
+    return {
+        "event_log": PromptBudgetConfig.EVENT_LOG_MAX_TOKENS,
+        "contents": PromptBudgetConfig.CONTENTS_MAX_TOKENS,
+        "kb": PromptBudgetConfig.KB_MAX_TOKENS,
+    }
+
+
+def _cut_line(line: str, line_tokens: int, budget: int) -> str:
+    """Cut a single over-long line to roughly budget tokens."""
+    if budget <= 0 or line_tokens <= 0:
+        return ""
+    return line[:len(line) * budget // line_tokens]
+
+
+def _take_lines(lines: list, budget: int, cut_first: bool = True) -> Tuple[list, int]:
+    """
+    Longest prefix of lines within budget tokens. If the first line alone is too long
+    it is cut when cut_first is set, and left out otherwise.
+    """
+    kept, used = [], 0
+    for line in lines:
+        line_tokens = count_tokens(line) + 1
+        if used + line_tokens > budget:
+            if not kept and cut_first:
+                kept.append(_cut_line(line, line_tokens, budget - used))
+            break
+        kept.append(line)
+        used += line_tokens
+    return kept, used
+
+
+def truncate_head(text: str, budget: int) -> str:
+    """Keep the beginning of text within budget tokens, ending with a marker."""
+    lines = text.split("\n")
+    marker_budget = 20
+    kept, _ = _take_lines(lines, max(budget - marker_budget, 0))
+    omitted = len(lines) - len(kept)
+    return "\n".join(kept) + f"\n[... {omitted} more lines left out to fit the prompt budget]"
+
+
+def truncate_event_log(text: str, budget: int) -> str:
+    """
+    Keep the first and last events of a compact event log (one event per line) within
+    budget tokens, replacing the middle with an {"omitted_events": n} line. Events are
+    never cut, and the first event is kept even if it alone exceeds the budget.
+    """
+    lines = text.split("\n")
+    if len(lines) < 3 or lines[0] != "[" or lines[-1] != "]":
+        return truncate_head(text, budget)
+
+    events = lines[1:-1]
+    events_budget = max(budget - 20, 0)
+    head, head_tokens = _take_lines(events, events_budget // 2, cut_first=False)
+    if not head:
+        head, head_tokens = events[:1], count_tokens(events[0]) + 1
+    tail_reversed, _ = _take_lines(events[len(head):][::-1], events_budget - head_tokens, cut_first=False)
+    tail = tail_reversed[::-1]
+    omitted = len(events) - len(head) - len(tail)
+    middle = [f'{{"omitted_events":{omitted}}}'] if omitted else []
+    kept = [line.rstrip(",") for line in head + middle + tail]
+    return "[\n" + ",\n".join(kept) + "\n]"
+
+
+_TRUNCATORS = {
+    "event_log": truncate_event_log,
+    "contents": truncate_head,
+    "kb": truncate_head,
+}
+
+
+def fit_prompt_sections(sections: Dict[str, str], fixed_tokens: int,
+                        total_tokens: Optional[int] = None) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    Fit the prompt sections into the token budget.
+
+    Args:
+        sections: Text of each section in SECTION_PRIORITY.
+        fixed_tokens: Tokens of the prompt's own instructions (the prompt with empty sections).
+        total_tokens: Budget for the whole prompt; defaults to PROMPT_BUDGET_TOTAL_TOKENS.
+
+    Returns:
+        tuple: (sections as they should go into the prompt, estimated tokens per section
+        including "instructions").
+    """
+    remaining = (total_tokens or PromptBudgetConfig.TOTAL_TOKENS) - fixed_tokens
+    caps = _section_caps()
+    fitted, counts = {}, {"instructions": fixed_tokens}
+
+    for section in SECTION_PRIORITY:
+        text = sections.get(section) or ""
+        tokens = count_tokens(text)
+        budget = max(remaining, 0)
+        if caps.get(section):
+            budget = min(budget, caps[section])
+        if section != "schema" and tokens > budget:
+            # The event log always keeps one whole event; other sections may be dropped entirely
+            text = _TRUNCATORS[section](text, budget) if budget > 0 or section == "event_log" else ""
+            logger.warning(f"Prompt section '{section}' truncated from {tokens} to ~{budget} tokens")
+            PROMPT_TRUNCATIONS.labels(section=section).inc()
+            tokens = count_tokens(text)
+        elif section == "schema" and tokens > budget:
+            logger.warning(f"Response schema alone ({tokens} tokens) exceeds the prompt budget")
+        fitted[section] = text
+        counts[section] = tokens
+        remaining -= tokens
+
+    for section, tokens in counts.items():
+        PROMPT_SECTION_TOKENS.labels(section=section).observe(tokens)
+    logger.info(f"Prompt tokens (estimated): {counts}, total {sum(counts.values())}")
+    return fitted, counts
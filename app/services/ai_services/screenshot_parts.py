@@ -0,0 +1,92 @@
+"""
+Screenshots as model input without a PDF.
+
+In images mode the (normalised) screenshots are given to the model as image
+parts, each preceded by a "page_name: <file>" text part - the caption the
+PDF would have carried - so screenshotRef values resolve the same way. This
+skips PDF assembly, validation and the PDF upload. Small sessions are sent
+inline in the generateContent request; larger ones are uploaded to the File
+API in parallel and referenced by URI.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import GenerationInputConfig
+from app.core.metrics import stage_timer
+from app.services.ai_services.genai_files import upload_image, delete_uploaded_file
+from app.utils.artifacts import Artifact
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+INPUT_MODES = ("pdf", "images", "auto")
+
+SCREENSHOTS_INTRO = (
+    "The session screenshots follow in order. Each image is preceded by its caption "
+    "'page_name: <image filename>'; use that filename for screenshotRef."
+)
+
+
+def choose_input_mode(requested: Optional[str], screenshot_count: int) -> str:
+    """
+    Resolve the input mode of a job: the one requested with the job, else GENERATION_INPUT_MODE.
+    auto sends sessions of at most AUTO_MAX_SCREENSHOTS screenshots as images.
+
+    Returns:
+        str: "pdf" or "images".
+    """
+    mode = (requested or GenerationInputConfig.MODE).lower()
+    if mode not in INPUT_MODES:
+        logger.warning(f"Unsupported input mode {mode!r}, using pdf")
+        return "pdf"
+    if mode == "auto":
+        return "images" if screenshot_count <= GenerationInputConfig.AUTO_MAX_SCREENSHOTS else "pdf"
+    return mode
+
+
+async def build_image_parts(screenshots: List[Artifact], job_id: str) -> Tuple[list, list]:
+    """
+    Build the content parts for screenshots sent as images.
+
+    Returns:
+        tuple: (content parts, uploaded genai Files). The caller deletes the uploaded files
+        (see delete_uploaded_file) once generation is done.
+
+    Raises:
+        ValueError: If an upload fails; files uploaded so far are deleted.
+    """
+    total_bytes = sum(screenshot.size for screenshot in screenshots)
+    if total_bytes <= GenerationInputConfig.INLINE_MAX_BYTES:
+        logger.info(f"Sending {len(screenshots)} screenshots inline ({total_bytes} bytes)")
+        image_parts = [
+            {"inline_data": {"mime_type": screenshot.mime_type, "data": screenshot.getvalue()}}
+            for screenshot in screenshots
+        ]
+        uploaded_files = []
+    else:
+        logger.info(f"Uploading {len(screenshots)} screenshots ({total_bytes} bytes) to GenAI")
+        semaphore = asyncio.Semaphore(GenerationInputConfig.UPLOAD_CONCURRENCY)
+
+        async def bounded_upload(screenshot):
+            async with semaphore:
+                return await upload_image(screenshot, job_id)
+
+        with stage_timer("genai_upload"):
+            results = await asyncio.gather(*[bounded_upload(screenshot) for screenshot in screenshots], return_exceptions=True)
+        uploaded_files = [result for result in results if not isinstance(result, BaseException)]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            for uploaded_file in uploaded_files:
+                await delete_uploaded_file(uploaded_file)
+            raise errors[0]
+        image_parts = [
+            {"file_data": {"file_uri": uploaded_file.uri, "mime_type": screenshot.mime_type}}
+            for screenshot, uploaded_file in zip(screenshots, uploaded_files)
+        ]
+
+    parts = [{"text": SCREENSHOTS_INTRO}]
+    for screenshot, image_part in zip(screenshots, image_parts):
+        parts.append({"text": f"page_name: {screenshot.name}"})
+        parts.append(image_part)
+    return parts, uploaded_files
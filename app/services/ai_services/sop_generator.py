@@ -1,66 +1,108 @@
-import google.generativeai as genai
-from app.prompts.technical_article_prompt import get_prompt
-import os
-import asyncio
+from app.prompts.technical_article_prompt import get_prompt, get_prompt_prefix, get_prompt_suffix
 import json
-from supabase import create_client, Client
-from io import BytesIO
+import threading
+import time
+from typing import Callable, Optional
 from datetime import datetime, timezone
-import mimetypes
-from PyPDF2 import PdfReader
 from google.generativeai.types import GenerationConfig
 from app.services.file_services.markdownit import create_markdown
-from app.services.file_services.pdf_validator import validate_pdf_file
-from app.core.initializers import get_genai_model, get_supabase_client, get_file_mime_type, is_magic_available
+from app.services.ai_services.genai_files import delete_uploaded_file
+from app.services.ai_services.genai_file_cache import acquire_pdf
+from app.services.ai_services.prompt_budget import count_tokens, fit_prompt_sections
+from app.services.ai_services.context_cache import get_cached_prefix, forget_cached_prefix, cached_model
+from app.services.ai_services.genai_resilience import call_with_resilience
+from app.services.ai_services.model_router import count_schema_fields, route_model
+from app.config.pipeline_config import (
+    GenaiResilienceConfig, GenerationStreamingConfig, PromptBudgetConfig, RateLimitConfig
+)
+from app.core.initializers import get_genai_model_for
 from app.config.logging import get_logger
 from app.utils.update_status import update_document_status
+from app.core.status_bus import publish_job_status
+from app.core.metrics import PROMPT_CHARS, observe_stage, record_token_usage, stage_timer
+from app.core.rate_limiter import PRIORITY_BACKGROUND, get_generate_rate_limiter
+from app.core.repositories import get_generated_docs_repository
+from app.utils.artifacts import Artifact
+from app.utils.debug_sink import get_debug_sink
+from app.utils.json_stream import JsonMemberStream
 # Initialize logger for this module
 logger = get_logger(__name__)
 
-# Get initialized services from the centralized manager
-model = get_genai_model()
-MAGIC_AVAILABLE = is_magic_available()
+
+def _generate_text(generative_model, parts: list, generation_config,
+                   on_member: Optional[Callable[[str, object], None]] = None,
+                   cancelled: Optional[threading.Event] = None) -> tuple:
+    """
+    Blocking generation call (generative_model may be built on a cached prompt prefix).
+    With on_member the response is streamed and on_member(key, value) is called for each
+    top-level member of the JSON response as soon as it is complete. A streamed response
+    is abandoned once cancelled is set (the attempt timed out or lost a hedge).
+
+    Returns:
+        tuple: (response text, usage metadata or None)
+    """
+    contents = [{"role": "user", "parts": parts}]
+    if on_member is None:
+        response = generative_model.generate_content(contents=contents, generation_config=generation_config)
+        return response.text, getattr(response, "usage_metadata", None)
+
+    members = JsonMemberStream()
+    text_chunks = []
+    usage_metadata = None
+    for chunk in generative_model.generate_content(contents=contents, generation_config=generation_config, stream=True):
+        if cancelled is not None and cancelled.is_set():
+            break
+        usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. only finish_reason or usage)
+            continue
+        text_chunks.append(text)
+        for key, value in members.feed(text):
+            try:
+                on_member(key, value)
+            except Exception as e:
+                logger.warning(f"Failed to publish streamed section '{key}': {e}")
+    return "".join(text_chunks), usage_metadata
 
 async def generate_sop_docx(
     KB: str,
-    file_path: str,
+    pdf_artifact: Artifact,
     event_data: str,
     user_query: str,
     user_id: str,
     job_id: str,
     components: dict,
     category_name: str = "",
-    contents: str = ""
+    contents: str = "",
+    genai_file=None,
+    screenshot_aliases: Optional[dict] = None,
+    screenshot_parts: Optional[list] = None,
+    screenshot_count: int = 0
 ) -> dict:
     """
     Generates an SOP, stores the Markdown output in a Supabase table.
-    Saves model's raw JSON output and generated Markdown locally if SAVE_DEBUG_OUTPUT=true.
+    The response is streamed (GENERATION_STREAMING_ENABLED) and every top-level section is
+    published on the job status as partial markdown as soon as it is complete.
+    The model tier is chosen per job by model_router.route_model.
+    The model's raw JSON output and the generated Markdown go to the debug sink (SAVE_DEBUG_OUTPUT=true).
     Updates the status column to 'success' or 'failed' based on the outcome.
+    If genai_file is given (the PDF was already uploaded by the pipeline) it is used as-is
+    and left for the caller to delete; otherwise pdf_artifact is validated and uploaded here
+    (or an earlier upload of the same PDF is reused, see genai_file_cache).
+    screenshot_aliases maps screenshots dropped as near-duplicates to the screenshot kept in the PDF.
+    If screenshot_parts is given (images input mode) the screenshots are sent as those content
+    parts and no PDF is used.
+    screenshot_count is the number of screenshots sent either way (a PDF page can hold several),
+    which the model routing and the rate limiter's token estimate are based on.
     """
     
     # Initialize variables
     article_dict = None
     genai_uploaded_file = None
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    debug_dir = "debug_output"
-    save_debug = os.environ.get("SAVE_DEBUG_OUTPUT", "false").lower() == "true"
-
-    if save_debug:
-        logger.info(f"Debug output saving is ENABLED. Files will be saved to '{debug_dir}'.")
-        try:
-            os.makedirs(debug_dir, exist_ok=True)
-        except Exception as e:
-            logger.warning(f"Could not create debug directory '{debug_dir}': {e}")
-            save_debug = False
-
-    # Initialize Supabase client
-    logger.info("Initializing Supabase client...")
-    supabase_url = os.getenv("SUPABASE_URL")
-    supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not supabase_url or not supabase_key:
-        raise ValueError("[ERROR] SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set in environment.")
-    supabase: Client = create_client(supabase_url, supabase_key)
-    logger.info("Supabase client initialized.")
+    debug_sink = get_debug_sink()
 
     try:
         components_schema = components
@@ -82,68 +124,134 @@ async def generate_sop_docx(
             logger.debug(f"Schema used was: {components_schema}")
             raise ValueError(f"Invalid components_schema structure for GenerationConfig: {e}")
 
-        # Step 3: Validate the PDF file
-        logger.info(f"Validating PDF file: {file_path}")
-        validate_pdf_file(file_path)
-
-        # Step 4: Upload the PDF file via GenAI File API
-        logger.info(f"Uploading PDF to GenAI: {file_path}")
-        try:
-            genai_uploaded_file = await asyncio.to_thread(
-                genai.upload_file, path=file_path, display_name=f"SOP_PDF_{job_id}", mime_type="application/pdf"
-            )
-            file_uri = genai_uploaded_file.uri
-            logger.info(f"PDF uploaded to GenAI. URI: {file_uri}")
-        except Exception as e:
-            logger.error(f"GenAI PDF upload failed: {e}")
-            update_document_status(supabase, job_id, "failed")
-            raise ValueError(f"GenAI PDF upload failed: {e}")
+        # Step 3-4: Validate and upload the PDF via GenAI File API (unless the pipeline already did)
+        if screenshot_parts is not None:
+            visual_parts = screenshot_parts
+            logger.info(f"Sending screenshots as {len(screenshot_parts)} content parts instead of a PDF")
+        else:
+            if genai_file is not None:
+                file_uri = genai_file.uri
+                logger.info(f"Using PDF already uploaded to GenAI. URI: {file_uri}")
+            else:
+                try:
+                    uploaded_file, owned = await acquire_pdf(pdf_artifact, job_id)
+                    if owned:
+                        genai_uploaded_file = uploaded_file
+                    file_uri = uploaded_file.uri
+                except Exception:
+                    await update_document_status(job_id, "failed")
+                    raise
+            visual_parts = [{"file_data": {"file_uri": file_uri, "mime_type": "application/pdf"}}]
 
-        # Step 5: Prepare prompt
+        # Step 5: Prepare prompt (a per-template prefix that can be cached, and the job's inputs)
         logger.info("Generating prompt...")
-        schema_json_str = json.dumps(components_schema, indent=2)
-        prompt = get_prompt(
-            KB=KB,
-            event_text=event_data,
+        schema_json_str = json.dumps(components_schema, separators=(",", ":"))
+        if PromptBudgetConfig.ENABLED:
+            instructions = get_prompt(KB="", event_text="", user_query=user_query, contents="", generation_schema_str="")
+            sections, _ = fit_prompt_sections(
+                {"schema": schema_json_str, "event_log": event_data, "contents": contents, "kb": KB},
+                fixed_tokens=count_tokens(instructions)
+            )
+            event_data, contents, KB = sections["event_log"], sections["contents"], sections["kb"]
+        prompt_prefix = get_prompt_prefix(schema_json_str)
+        prompt_suffix = get_prompt_suffix(
             user_query=user_query,
-            contents=contents,
-            generation_schema_str=schema_json_str 
+            event_text=event_data,
+            KB=KB,
+            contents=contents
+        )
+        PROMPT_CHARS.observe(len(prompt_prefix) + len(prompt_suffix))
+        prompt_tokens = count_tokens(prompt_prefix + prompt_suffix)
+
+        # Pick the model tier from the job's size and the queue pressure
+        routing = await route_model(
+            "generate_content", prompt_tokens, screenshot_count, count_schema_fields(components_schema), job_id
         )
+        model = get_genai_model_for(routing.model_name)
+        with stage_timer("context_cache"):
+            cache_name = await get_cached_prefix(model.model_name, prompt_prefix)
 
-        # Step 6: Generate content
+        # Step 6: Generate content (streamed: each finished section is published as partial markdown)
         logger.info("Generating content with JSON schema enforcement...")
         response_text = None
-        try:
-            response = await asyncio.to_thread(
-                model.generate_content,
-                contents=[{
-                    "role": "user",
-                    "parts": [
-                        {"text": prompt},
-                        {"file_data": {"file_uri": file_uri, "mime_type": "application/pdf"}}
-                    ]
-                }],
-                generation_config=generation_config
+        # Sections streamed so far by each attempt; retries and hedged requests stream in parallel
+        # or after one another, and the attempt furthest along is the one published
+        partial_articles = {}
+        partial_lock = threading.Lock()
+        first_section = threading.Event()
+        generation_start = time.perf_counter()
+
+        def publish_section(attempt: int, key: str, value) -> None:
+            # Runs on the generation thread; the status bus accepts publishes from threads
+            with partial_lock:
+                if not first_section.is_set():
+                    first_section.set()
+                    observe_stage("first_section", time.perf_counter() - generation_start)
+                article = partial_articles.setdefault(attempt, {})
+                article[key] = value
+                if any(len(other) > len(article) for other in partial_articles.values()):
+                    return
+                markdown_partial = create_markdown(article, user_id, job_id, screenshot_aliases)
+                publish_job_status(job_id, partial={
+                    "sections": list(article),
+                    "markdown": markdown_partial.getvalue().decode("utf-8")
+                })
+
+        estimated_tokens = (
+            prompt_tokens
+            + screenshot_count * RateLimitConfig.IMAGE_TOKENS_ESTIMATE
+            + RateLimitConfig.OUTPUT_TOKENS_ESTIMATE
+        )
+
+        async def admit() -> None:
+            await get_generate_rate_limiter().acquire(estimated_tokens, PRIORITY_BACKGROUND)
+
+        async def generate(cache: Optional[str], parts: list) -> tuple:
+            def attempt_generation(attempt: int, cancelled: threading.Event) -> tuple:
+                on_member = None
+                if GenerationStreamingConfig.ENABLED:
+                    on_member = lambda key, value: publish_section(attempt, key, value)
+                generative_model = cached_model(cache) if cache is not None else model
+                try:
+                    return _generate_text(generative_model, parts, generation_config, on_member, cancelled)
+                except Exception:
+                    # A failed attempt's sections are not the document any more
+                    with partial_lock:
+                        partial_articles.pop(attempt, None)
+                    raise
+
+            return await call_with_resilience(
+                "generate_content", attempt_generation,
+                deadline=GenaiResilienceConfig.GENERATE_DEADLINE_SECONDS, hedge=True, admit=admit
             )
-            response_text = response.text
-            with open("output.json", "w", encoding="utf-8") as f:
-                f.write(response_text)
+
+        try:
+            with stage_timer("generate_content"):
+                usage_metadata = None
+                if cache_name is not None:
+                    try:
+                        response_text, usage_metadata = await generate(
+                            cache_name, [{"text": prompt_suffix}, *visual_parts]
+                        )
+                    except Exception as e:
+                        logger.warning(f"Generation with cached prompt prefix {cache_name} failed, retrying uncached: {e}")
+                        await forget_cached_prefix(model.model_name, prompt_prefix, cache_name)
+                        # The retry streams the document again from its first section
+                        with partial_lock:
+                            partial_articles.clear()
+                if response_text is None:
+                    response_text, usage_metadata = await generate(
+                        None, [{"text": prompt_prefix + prompt_suffix}, *visual_parts]
+                    )
+            record_token_usage(usage_metadata)
+            debug_sink.record(job_id, "model_output.json", response_text or "")
             logger.info(f"Content generation successful. JSON response received: {response_text[:100]}")
             if not response_text:
                 raise ValueError("Model response text is empty. Cannot parse.")
-            if save_debug:
-                try:
-                    json_filename_debug = f"job_{job_id}_{timestamp}_model_output.json"
-                    json_filepath_debug = os.path.join(debug_dir, json_filename_debug)
-                    with open(json_filepath_debug, "w", encoding="utf-8") as f:
-                        f.write(response_text)
-                    logger.info(f"Saved raw model JSON output to {json_filepath_debug}")
-                except Exception as debug_e:
-                    logger.warning(f"Failed to save raw model output for debugging: {debug_e}")
 
         except Exception as e:
             logger.error(f"Content generation failed: {e}")
-            update_document_status(supabase, job_id, "failed")
+            await update_document_status(job_id, "failed")
             raise ValueError(f"Content generation failed: {e}")
 
         # Step 7: Parse/Validate the JSON output
@@ -157,32 +265,25 @@ async def generate_sop_docx(
             logger.info("Successfully parsed and validated JSON response structure.")
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode JSON response: {e}. Response text was: {response_text[:500]}...")
-            update_document_status(supabase, job_id, "failed")
+            await update_document_status(job_id, "failed")
             raise ValueError(f"Model did not return valid JSON: {e}")
         except Exception as e:
             logger.error(f"Error processing/validating JSON response: {e}")
-            update_document_status(supabase, job_id, "failed")
+            await update_document_status(job_id, "failed")
             raise ValueError(f"Error processing/validating JSON response: {e}")
 
         # Step 8: Generate Markdown
         logger.info("Generating Markdown document from JSON...")
         try:
-            markdown_buffer = create_markdown(article_dict, user_id, job_id)
+            with stage_timer("markdown_render"):
+                markdown_buffer = create_markdown(article_dict, user_id, job_id, screenshot_aliases)
             markdown_content = markdown_buffer.getvalue().decode('utf-8')
             logger.info("Markdown generation successful.")
             logger.debug(f"Generated Markdown content: {markdown_content[:500]}...")
-            if save_debug:
-                try:
-                    md_filename_debug = f"job_{job_id}_{timestamp}_output.md"
-                    md_filepath_debug = os.path.join(debug_dir, md_filename_debug)
-                    with open(md_filepath_debug, "w", encoding="utf-8") as f:
-                        f.write(markdown_content)
-                    logger.info(f"Saved Markdown output to {md_filepath_debug}")
-                except Exception as debug_e:
-                    logger.warning(f"Failed to save Markdown output for debugging: {debug_e}")
+            debug_sink.record(job_id, "output.md", markdown_content)
         except Exception as e:
             logger.error(f"Markdown generation failed: {e}")
-            update_document_status(supabase, job_id, "failed")
+            await update_document_status(job_id, "failed")
             raise ValueError(f"Markdown generation failed: {e}")
 
         # Step 9: Extract title and prepare data for database
@@ -204,11 +305,12 @@ async def generate_sop_docx(
             }
         except Exception as e:
             logger.error(f"Failed to prepare data for database: {e}")
-            update_document_status(supabase, job_id, "failed")
+            await update_document_status(job_id, "failed")
             raise ValueError(f"Failed to prepare data for database: {e}")
 
         # Step 10: Insert/Update data into Supabase table
         logger.info("Inserting/updating document into Supabase table 'generated_docs'...")
+        publish_job_status(job_id, stage="saving", message="saving document")
         try:
             current_timestamp = datetime.now(timezone.utc).isoformat()
             upsert_data = {
@@ -217,34 +319,23 @@ async def generate_sop_docx(
             }
             
             logger.info(f"Performing upsert for record with ID {job_id}...")
-            insert_response = supabase.table("generated_docs").upsert(
-                upsert_data,
-                on_conflict="id"
-            ).execute()
+            with stage_timer("db_upsert"):
+                inserted_rows = await get_generated_docs_repository().upsert(upsert_data)
 
-            if not insert_response.data or len(insert_response.data) == 0:
-                error_message = "Unknown error during Supabase operation."
-                if hasattr(insert_response, 'error') and insert_response.error:
-                    error_message = f"Supabase error: {insert_response.error.message if hasattr(insert_response.error, 'message') else insert_response.error}"
-                elif hasattr(insert_response, 'status_code') and insert_response.status_code not in [200, 201]:
-                    error_message = f"Supabase operation failed with status {insert_response.status_code}."
-                    try:
-                        error_details = insert_response.json()
-                        error_message += f" Details: {error_details}"
-                    except:
-                        error_message += " Could not parse error response body."
-                
+            if not inserted_rows:
+                error_message = "Supabase returned no rows for the upsert."
                 logger.error(error_message)
-                update_document_status(supabase, job_id, "failed")
+                await update_document_status(job_id, "failed")
                 raise ValueError(f"Failed to save document to Supabase table. {error_message}")
 
-            inserted_doc = insert_response.data[0]
+            inserted_doc = inserted_rows[0]
             inserted_doc_id = inserted_doc.get('id', job_id)
             logger.info(f"Document successfully saved to 'generated_docs'. ID: {inserted_doc_id}")
+            publish_job_status(job_id, status="success", stage="done", message="completed")
 
         except Exception as e:
             logger.error(f"Supabase table operation failed: {e}")
-            update_document_status(supabase, job_id, "failed")
+            await update_document_status(job_id, "failed")
             raise ValueError(f"Supabase table operation failed: {e}")
 
         # Step 11: Return success response
@@ -260,20 +351,12 @@ async def generate_sop_docx(
 
     except ValueError as e:
         logger.error(f"Value error during SOP generation: {e}")
-        update_document_status(supabase, job_id, "failed")
+        await update_document_status(job_id, "failed")
         raise
     except Exception as e:
         logger.error(f"General unexpected error in SOP generation: {e}")
-        update_document_status(supabase, job_id, "failed")
+        await update_document_status(job_id, "failed")
         raise
     finally:
-        # Step 12: Clean up GenAI uploaded file
-        if genai_uploaded_file and hasattr(genai_uploaded_file, 'name'):
-            logger.info(f"Final cleanup: Deleting GenAI file {genai_uploaded_file.name}...")
-            try:
-                await asyncio.to_thread(genai.delete_file, genai_uploaded_file.name)
-                logger.info("GenAI file deleted successfully.")
-            except Exception as e:
-                logger.warning(f"Failed to delete GenAI file '{genai_uploaded_file.name}' during cleanup: {e}")
-        else:
-            logger.info("Final cleanup: No GenAI input file to delete or already cleaned up.")
\ No newline at end of file
+        # Step 12: Clean up the GenAI file uploaded by this function
+        await delete_uploaded_file(genai_uploaded_file)
\ No newline at end of file
@@ -1,34 +1,265 @@
-
-
+import asyncio
+import queue
+from PIL import Image
 from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
-from PIL import Image
-from typing import List
-import os 
+from typing import Dict, List, Optional, Tuple
 from app.config.logging import get_logger
+from app.config.pipeline_config import ImageNormalizationConfig, PdfLayoutConfig
+from app.utils.artifacts import Artifact
 
 # Initialize logger for this module
 logger = get_logger(__name__)
 
-# Function to create PDF with original names (define this in utils/create_pdf.py or here)
-def create_pdf_from_screenshots(screenshot_info, output_path):
-    """Create a PDF from screenshots, including original names as captions."""
-    c = canvas.Canvas(output_path, pagesize=letter)
+# Screenshots per page -> (columns, rows) of the contact-sheet grid
+SHEET_GRIDS = {1: (1, 1), 2: (1, 2), 4: (2, 2), 6: (2, 3)}
+
+PAGE_MARGIN = 20
+CAPTION_HEIGHT = 20
+CELL_PADDING = 4  # Space around each screenshot when several share a page
+
+# Marks the end of the page queue for the writer thread
+_FINISHED = object()
+
+
+def _cell_boxes(per_page: int) -> List[Tuple[float, float, float, float]]:
+    """Image areas (x, y, width, height) of the cells on a page, top row first."""
+    columns, rows = SHEET_GRIDS[per_page]
     width, height = letter
-    for temp_path, original_name in screenshot_info:
+    cell_width = (width - 2 * PAGE_MARGIN) / columns
+    cell_height = (height - 2 * PAGE_MARGIN) / rows
+    padding = CELL_PADDING if per_page > 1 else 0
+    boxes = []
+    for row in range(rows):
+        for column in range(columns):
+            x = PAGE_MARGIN + column * cell_width + padding
+            y = height - PAGE_MARGIN - (row + 1) * cell_height + padding + CAPTION_HEIGHT
+            boxes.append((x, y, cell_width - 2 * padding, cell_height - 2 * padding - CAPTION_HEIGHT))
+    return boxes
+
+
+def sheet_image_area(per_page: int = 1) -> Tuple[float, float]:
+    """Area (in points) a screenshot may cover when per_page screenshots share a page."""
+    _, _, width, height = _cell_boxes(per_page)[0]
+    return width, height
+
+
+def choose_screenshots_per_page(count: int, image_size: Tuple[int, int]) -> int:
+    """
+    Pick the page layout from configuration. In auto mode, the densest contact sheet that
+    still shows screenshots of image_size at AUTO_MIN_SCALE of their resolution is used,
+    for sessions of at least AUTO_MIN_SCREENSHOTS screenshots.
+
+    Returns:
+        int: Screenshots per page (a key of SHEET_GRIDS).
+    """
+    mode = PdfLayoutConfig.SCREENSHOTS_PER_PAGE
+    if mode != "auto":
+        per_page = int(mode) if mode.isdigit() else 0
+        if per_page not in SHEET_GRIDS:
+            logger.warning(f"Unsupported PDF_SCREENSHOTS_PER_PAGE={mode!r}, using 1")
+            return 1
+        return per_page
+
+    if count < PdfLayoutConfig.AUTO_MIN_SCREENSHOTS:
+        return 1
+    image_width, image_height = image_size
+    for per_page in (6, 4, 2):
+        area_width, area_height = sheet_image_area(per_page)
+        # Pixels the screenshot keeps per source pixel when its cell is rendered at the target DPI
+        scale = min(area_width / image_width, area_height / image_height) * ImageNormalizationConfig.TARGET_DPI / 72
+        if scale >= PdfLayoutConfig.AUTO_MIN_SCALE:
+            return per_page
+    return 1
+
+
+def _image_size(screenshot: Artifact) -> Tuple[int, int]:
+    """Pixel size of a screenshot, read from its header."""
+    with Image.open(screenshot.open()) as image:
+        return image.size
+
+
+class _SheetWriter:
+    """Draws screenshots into the cells of successive pages, per_page at a time."""
+
+    def __init__(self, c: canvas.Canvas, per_page: int):
+        self.c = c
+        self.per_page = per_page
+        self.pages = 0
+        self._boxes = _cell_boxes(per_page)
+        self._next_cell = 0
+
+    def draw(self, screenshot: Artifact) -> bool:
+        """Draw a screenshot with its caption in the next free cell. Returns False if it could not be drawn."""
+        original_name = screenshot.name
+        box_x, box_y, box_width, box_height = self._boxes[self._next_cell]
         try:
-            img = Image.open(temp_path)
-            img_width, img_height = img.size
-            # Scale image to fit page, leaving space for caption
-            scale = min((width - 40) / img_width, (height - 60) / img_height)
+            img = ImageReader(screenshot.open())
+            img_width, img_height = img.getSize()
+            # Scale image to fit its cell, leaving space for caption
+            scale = min(box_width / img_width, box_height / img_height)
             scaled_width = img_width * scale
             scaled_height = img_height * scale
-            x = (width - scaled_width) / 2  # Center horizontally
-            y = (height - scaled_height) / 2  # Center vertically
-            c.drawImage(temp_path, x, y, scaled_width, scaled_height)
+            x = box_x + (box_width - scaled_width) / 2  # Center horizontally
+            y = box_y + (box_height - scaled_height) / 2  # Center vertically
+            self.c.drawImage(img, x, y, scaled_width, scaled_height)
             # Add caption below image
-            c.drawString(x, y - 20, f"page_name: {original_name}")
-            c.showPage()
+            self.c.setFont("Helvetica", 12 if self.per_page == 1 else 8)
+            self.c.drawString(x, y - 14, f"page_name: {original_name}")
         except Exception as e:
             logger.error(f"Failed to add screenshot {original_name} to PDF: {str(e)}")
+            return False
+        self._next_cell += 1
+        if self._next_cell == len(self._boxes):
+            self.close_page()
+        return True
+
+    def close_page(self) -> None:
+        """Finish the current page if anything was drawn on it."""
+        if self._next_cell:
+            self.c.showPage()
+            self.pages += 1
+            self._next_cell = 0
+
+
+def create_pdf_from_screenshots(screenshots: List[Artifact], output: Artifact, per_page: int = 1) -> Artifact:
+    """
+    Create a PDF from screenshot artifacts, including original names as captions.
+    The PDF is written into the output artifact; nothing touches the working directory.
+    JPEG screenshots are embedded as-is; other formats are decoded and recompressed by reportlab.
+    With per_page > 1 the screenshots are tiled in a grid (see SHEET_GRIDS).
+    """
+    # invariant: no timestamp or random document id, so identical input gives an identical PDF
+    c = canvas.Canvas(output, pagesize=letter, invariant=1)
+    sheet = _SheetWriter(c, per_page)
+    for screenshot in screenshots:
+        sheet.draw(screenshot)
+    sheet.close_page()
     c.save()
+    return output
+
+
+class StreamingPdfBuilder:
+    """
+    Builds the screenshots PDF while the screenshots are still downloading.
+
+    Pages are handed over with their index in the session manifest, in any order.
+    A writer thread draws each page as soon as every earlier page has arrived (or
+    been skipped), so the PDF is complete shortly after the last download. Each
+    screenshot is closed once drawn.
+
+    If a deduplicator (see screenshot_dedup) is given, pages are checked against it
+    in manifest order and near-duplicates are left out of the PDF.
+    """
+
+    def __init__(self, output: Artifact, expected_screenshots: int = 0, deduplicator=None):
+        self.output = output
+        self.expected_screenshots = expected_screenshots
+        self.deduplicator = deduplicator
+        self.placed = 0
+        self._per_page: Optional[int] = None
+        self._sheet: Optional[_SheetWriter] = None
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[asyncio.Task] = None
+        self._aborted = False
+
+    @property
+    def pages(self) -> int:
+        """Number of PDF pages written so far."""
+        return self._sheet.pages if self._sheet is not None else 0
+
+    def screenshots_per_page(self, screenshot: Artifact) -> int:
+        """
+        Layout of the PDF, decided from the first screenshot seen (sessions are recorded on one
+        screen, so the rest share its resolution). Later calls return the same value.
+        """
+        if self._per_page is None:
+            try:
+                image_size = _image_size(screenshot)
+            except Exception as e:
+                logger.warning(f"Could not read size of {screenshot.name}, using one screenshot per page: {e}")
+                self._per_page = 1
+            else:
+                self._per_page = choose_screenshots_per_page(self.expected_screenshots, image_size)
+                logger.info(f"PDF layout: {self._per_page} screenshot(s) per page for {self.expected_screenshots} screenshots of {image_size[0]}x{image_size[1]}")
+        return self._per_page
+
+    def start(self) -> None:
+        """Start the writer thread. Must be called from the event loop."""
+        self._writer = asyncio.ensure_future(asyncio.to_thread(self._write))
+
+    def add_page(self, index: int, screenshot: Artifact, page_hash: Optional[bytes] = None) -> None:
+        """Hand over the screenshot at manifest position index."""
+        self._queue.put((index, screenshot, page_hash))
+
+    def skip_page(self, index: int) -> None:
+        """Mark manifest position index as missing (e.g. its download failed)."""
+        self._queue.put((index, None, None))
+
+    async def finish(self) -> Artifact:
+        """
+        Wait for the writer to draw every page handed over and save the PDF.
+
+        Returns:
+            Artifact: The output artifact holding the PDF.
+        """
+        self._queue.put(_FINISHED)
+        await self._writer
+        logger.debug(f"Streamed {self.placed} screenshots on {self.pages} pages into {self.output.name}")
+        return self.output
+
+    async def abort(self) -> None:
+        """Stop the writer without saving the PDF and close any screenshots it still holds."""
+        self._aborted = True
+        self._queue.put(_FINISHED)
+        if self._writer is not None:
+            try:
+                await self._writer
+            except Exception as e:
+                logger.warning(f"PDF writer stopped with error: {str(e)}")
+
+    def _write(self) -> None:
+        # invariant: identical input gives a byte-identical PDF (see genai_file_cache)
+        c = canvas.Canvas(self.output, pagesize=letter, invariant=1)
+        pending: Dict[int, tuple] = {}
+        next_index = 0
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _FINISHED:
+                    break
+                pending[item[0]] = item[1:]
+                while next_index in pending and not self._aborted:
+                    screenshot, page_hash = pending.pop(next_index)
+                    next_index += 1
+                    if screenshot is not None:
+                        self._draw(c, screenshot, page_hash)
+            if self._aborted:
+                return
+            # Pages after a gap that was never filled are still placed, in order
+            for index in sorted(pending):
+                screenshot, page_hash = pending.pop(index)
+                if screenshot is not None:
+                    self._draw(c, screenshot, page_hash)
+            if self._sheet is not None:
+                self._sheet.close_page()
+            c.save()
+        finally:
+            for screenshot, _ in pending.values():
+                if screenshot is not None:
+                    screenshot.close()
+
+    def _draw(self, c: canvas.Canvas, screenshot: Artifact, page_hash: Optional[bytes]) -> None:
+        try:
+            if self.deduplicator is not None:
+                kept = self.deduplicator.check(screenshot.name, page_hash)
+                if kept is not None:
+                    logger.debug(f"Dropped screenshot {screenshot.name} as a duplicate of {kept}")
+                    return
+            if self._sheet is None:
+                self._sheet = _SheetWriter(c, self.screenshots_per_page(screenshot))
+            if self._sheet.draw(screenshot):
+                self.placed += 1
+        finally:
+            screenshot.close()
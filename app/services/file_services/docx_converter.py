@@ -1,7 +1,9 @@
 import pypandoc
 import tempfile
 import os
+import uuid
 from app.config.logging import get_logger
+from app.utils.debug_sink import get_debug_sink
 
 # Initialize logger for this module
 logger = get_logger(__name__)
@@ -37,14 +39,8 @@ def convert_to_docx(markdown_text: str) -> bytes:
         with open(temp_docx_path, 'rb') as docx_file:
             docx_bytes = docx_file.read()
         
-        # Save a debug copy in the current working directory
-        debug_path = os.path.join(os.getcwd(), "debug_output.docx")
-        try:
-            with open(debug_path, "wb") as debug_file:
-                debug_file.write(docx_bytes)  # Use the bytes we already read
-            logger.debug(f"Debug DOCX saved at: {debug_path}")
-        except Exception as e:
-            logger.warning(f"Failed to save debug DOCX: {str(e)}")
+        # Keep a debug copy (written in the background, only if the debug sink is enabled)
+        get_debug_sink().record(f"download_{uuid.uuid4().hex}", "output.docx", docx_bytes)
 
         return docx_bytes
 
@@ -0,0 +1,59 @@
+"""
+Screenshot normalisation before PDF assembly.
+
+Screenshots are downsampled to the target DPI for the area they cover on the
+letter page (a contact-sheet cell when several share a page), and opaque images are re-encoded as JPEG, which reportlab embeds
+without decoding. JPEGs that are already small enough pass through unchanged.
+The functions here run in image pool worker processes (see image_pool).
+"""
+import io
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from app.config.pipeline_config import ImageNormalizationConfig
+from app.services.file_services.create_pdf import sheet_image_area
+
+
+def target_size(per_page: int = 1, dpi: int = ImageNormalizationConfig.TARGET_DPI) -> Tuple[int, int]:
+    """Largest pixel size a screenshot needs to be for its area on the page at dpi."""
+    area_width, area_height = sheet_image_area(per_page)
+    return int(area_width / 72 * dpi), int(area_height / 72 * dpi)
+
+
+def _is_opaque(image: Image.Image) -> bool:
+    if image.mode in ("RGBA", "LA"):
+        return image.getchannel("A").getextrema()[0] == 255
+    if image.mode == "P" and "transparency" in image.info:
+        return image.convert("RGBA").getchannel("A").getextrema()[0] == 255
+    return True
+
+
+def normalize_image(data: bytes, max_size: Tuple[int, int], jpeg_quality: int) -> Optional[Tuple[bytes, str]]:
+    """
+    Downsample an encoded image to fit max_size and re-encode it (JPEG when opaque).
+    Runs in a pool worker process.
+
+    Returns:
+        tuple: (encoded bytes, mime type), or None if the image is a JPEG that can be used as-is.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        scale = min(1.0, max_size[0] / image.width, max_size[1] / image.height)
+        if image.format == "JPEG" and scale >= 1.0 and image.mode in ("RGB", "L"):
+            return None
+
+        new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        if image.format == "JPEG":
+            # Let the decoder skip resolution we are about to throw away
+            image.draft(image.mode, new_size)
+        opaque = _is_opaque(image)
+        image = image.convert("RGB" if opaque else "RGBA")
+        if image.size != new_size:
+            image = image.resize(new_size, Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        if opaque:
+            image.save(output, format="JPEG", quality=jpeg_quality)
+            return output.getvalue(), "image/jpeg"
+        image.save(output, format="PNG")
+        return output.getvalue(), "image/png"
@@ -0,0 +1,94 @@
+"""
+Process pool for screenshot image work (perceptual hashing and normalisation).
+
+Decoding and encoding screenshots is CPU-bound; running it on worker
+processes keeps it off the event loop and out of the GIL. Each screenshot
+is sent to a worker once, which returns both its hash and its normalised
+encoding.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import ImageNormalizationConfig, ScreenshotDedupConfig
+from app.services.file_services.image_normalizer import normalize_image, target_size
+from app.services.file_services.screenshot_dedup import difference_hash
+from app.utils.artifacts import Artifact
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Process pool owned by this server process (never one inherited through fork)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=max(1, ImageNormalizationConfig.MAX_WORKERS),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        _pool_pid = os.getpid()
+        logger.info(f"Image pool started with {ImageNormalizationConfig.MAX_WORKERS} worker(s)")
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    """Stop the pool's worker processes (application shutdown)."""
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("Image pool stopped")
+    _pool = None
+
+
+def _prepare_image(data: bytes, hash_size: Optional[int], max_size: Optional[Tuple[int, int]],
+                   jpeg_quality: int) -> tuple:
+    """Pool worker: (hash or None, (normalised bytes, mime type) or None)."""
+    page_hash = difference_hash(data, hash_size) if hash_size else None
+    normalized = normalize_image(data, max_size, jpeg_quality) if max_size else None
+    return page_hash, normalized
+
+
+async def prepare_screenshot(screenshot: Artifact, per_page: int = 1) -> Tuple[Optional[bytes], Artifact]:
+    """
+    Hash and normalise one screenshot on the pool, as enabled by configuration.
+    per_page is the PDF layout the screenshot is normalised for.
+    A screenshot that cannot be processed is returned unchanged, without a hash.
+
+    Returns:
+        tuple: (perceptual hash or None, screenshot to place in the PDF). When a new artifact
+        is returned the original is closed.
+    """
+    hash_size = ScreenshotDedupConfig.HASH_SIZE if ScreenshotDedupConfig.ENABLED else None
+    max_size = target_size(per_page) if ImageNormalizationConfig.ENABLED else None
+    if hash_size is None and max_size is None:
+        return None, screenshot
+
+    loop = asyncio.get_running_loop()
+    try:
+        page_hash, normalized = await loop.run_in_executor(
+            get_image_pool(), _prepare_image, screenshot.getvalue(),
+            hash_size, max_size, ImageNormalizationConfig.JPEG_QUALITY
+        )
+    except BrokenProcessPool as e:
+        logger.error(f"Image pool broke, restarting it: {e}")
+        shutdown_image_pool()
+        return None, screenshot
+    except Exception as e:
+        logger.warning(f"Could not process screenshot {screenshot.name}, using it as is: {e}")
+        return None, screenshot
+
+    if normalized is None:
+        return page_hash, screenshot
+    data, mime_type = normalized
+    prepared = Artifact.from_bytes(screenshot.name, data, mime_type)
+    screenshot.close()
+    return page_hash, prepared
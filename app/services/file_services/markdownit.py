@@ -1,11 +1,15 @@
 from io import BytesIO
 import datetime
+from typing import Optional
 
-def create_markdown(article_dict: dict, user_id: str, job_id: str):
+def create_markdown(article_dict: dict, user_id: str, job_id: str, screenshot_aliases: Optional[dict] = None):
     """
     Convert a dictionary conforming to the updated SaaS User Documentation schema
     into a Markdown document in memory.
+    screenshotRef values naming a screenshot dropped as a near-duplicate are
+    pointed at the screenshot that was kept (screenshot_aliases).
     """
+    screenshot_aliases = screenshot_aliases or {}
     markdown_lines = []
 
     # Helper function to add empty line if needed
@@ -116,6 +120,7 @@ def create_markdown(article_dict: dict, user_id: str, job_id: str):
                 step_text = step_item.get('step', '').strip()
                 explanation = step_item.get('explanation', '').strip()
                 image_name = step_item.get('screenshotRef', '').strip()
+                image_name = screenshot_aliases.get(image_name, image_name)
 
                 if step_text:
                     markdown_lines.append(f"**Step {i}:** {step_text}")
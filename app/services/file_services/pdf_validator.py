@@ -2,33 +2,46 @@
 PDF file validation utilities.
 """
 import os
+from typing import Union
 from PyPDF2 import PdfReader
-from app.core.initializers import get_file_mime_type
+from app.core.initializers import get_file_mime_type, get_buffer_mime_type
 from app.config.logging import get_logger
+from app.utils.artifacts import Artifact
 
 # Initialize logger for this module
 logger = get_logger(__name__)
 
 
-def validate_pdf_file(file_path: str) -> None:
+def validate_pdf_file(pdf: Union[str, Artifact]) -> int:
     """
-    Validate that a file is a proper PDF file.
+    Validate that a file or in-memory artifact is a proper PDF.
     
     Args:
-        file_path (str): Path to the PDF file to validate
+        pdf: Path to the PDF file, or an Artifact holding the PDF bytes
+        
+    Returns:
+        int: Number of pages in the PDF
         
     Raises:
         ValueError: If the PDF file is invalid, missing, or empty
     """
-    if not os.path.exists(file_path):
-        raise ValueError(f"PDF not found: {file_path}")
-    
-    if os.path.getsize(file_path) == 0:
-        raise ValueError(f"PDF empty: {file_path}")
+    if isinstance(pdf, Artifact):
+        if pdf.size == 0:
+            raise ValueError(f"PDF empty: {pdf.name}")
+    else:
+        if not os.path.exists(pdf):
+            raise ValueError(f"PDF not found: {pdf}")
+        
+        if os.path.getsize(pdf) == 0:
+            raise ValueError(f"PDF empty: {pdf}")
     
     # Check MIME type
     try:
-        detected_mime = get_file_mime_type(file_path)
+        if isinstance(pdf, Artifact):
+            with pdf.view() as view:
+                detected_mime = get_buffer_mime_type(bytes(view[:2048]), pdf.name)
+        else:
+            detected_mime = get_file_mime_type(pdf)
         if detected_mime != "application/pdf":
             logger.warning(f"Unexpected MIME type for PDF: {detected_mime} (continuing anyway)")
     except Exception as e:
@@ -36,7 +49,9 @@ def validate_pdf_file(file_path: str) -> None:
     
     # Validate PDF structure with PyPDF2
     try:
-        reader = PdfReader(file_path)
-        logger.info(f"PDF valid ({len(reader.pages)} pages)")
+        reader = PdfReader(pdf.reader() if isinstance(pdf, Artifact) else pdf)
+        page_count = len(reader.pages)
+        logger.info(f"PDF valid ({page_count} pages)")
+        return page_count
     except Exception as e:
         raise ValueError(f"Invalid PDF: {e}")
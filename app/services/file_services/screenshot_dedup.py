@@ -0,0 +1,63 @@
+"""
+Collapse runs of near-identical screenshots before PDF assembly.
+
+Recorded sessions contain many captures of the same screen (before and after
+a hover, repeated captures). Each screenshot gets a difference hash computed
+on the image process pool; a screenshot whose hash is within MAX_DISTANCE
+bits of the last kept screenshot is dropped, and its name is mapped to the
+kept one so screenshotRef values in the generated article still resolve.
+"""
+import io
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config.pipeline_config import ScreenshotDedupConfig
+
+
+def difference_hash(data: bytes, hash_size: int) -> bytes:
+    """
+    Difference hash of an encoded image: one bit per horizontally adjacent pixel pair
+    of a (hash_size + 1) x hash_size grayscale thumbnail. Runs in a pool worker process.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes()
+
+
+class ScreenshotDeduplicator:
+    """
+    Decides, for screenshots fed in session order, whether each one duplicates the last kept screenshot.
+    """
+
+    def __init__(self, max_distance: int = ScreenshotDedupConfig.MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.aliases: Dict[str, str] = {}
+        self._kept_name: Optional[str] = None
+        self._kept_hash: Optional[np.ndarray] = None
+
+    def check(self, name: str, page_hash: Optional[bytes]) -> Optional[str]:
+        """
+        Returns:
+            str: Name of the kept screenshot this one duplicates (it should be dropped),
+            or None if it is kept. Screenshots without a hash are always kept.
+        """
+        if page_hash is None:
+            self._kept_name, self._kept_hash = name, None
+            return None
+        bits = np.frombuffer(page_hash, dtype=np.uint8)
+        if self._kept_hash is not None and self._kept_hash.shape == bits.shape:
+            distance = int(np.bitwise_count(bits ^ self._kept_hash).sum())
+            if distance <= self.max_distance:
+                self.aliases[name] = self._kept_name
+                return self._kept_name
+        self._kept_name, self._kept_hash = name, bits
+        return None
+
+    @property
+    def dropped(self) -> int:
+        """Number of screenshots found to be duplicates so far."""
+        return len(self.aliases)
@@ -16,6 +16,10 @@ from mcp.client.stdio import stdio_client
 
 from app.config.logging import get_logger
 from app.config.mcp_config import AtlassianMCPConfig
+from app.config.pipeline_config import RateLimitConfig
+from app.config.pipeline_config import ModelTierConfig
+from app.core.rate_limiter import LangChainRateLimiter, PRIORITY_BACKGROUND, get_generate_rate_limiter
+from app.services.ai_services.model_router import route_model
 
 # Initialize logger
 logger = get_logger(__name__)
@@ -28,6 +32,7 @@ class AtlassianMCPAgent:
     
     def __init__(self):
         self.llm = None
+        self._llms = {}
         self.tools = None
         self.agent = None
         self.server_params = None
@@ -41,17 +46,25 @@ class AtlassianMCPAgent:
             env=self._get_mcp_environment()
         )
         
-        # Initialize LLM
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        # Initialize LLM (standard tier; see _llm_for for the others)
+        if not os.getenv("GOOGLE_API_KEY"):
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0.1,
-            google_api_key=api_key
-        )
+        self.llm = self._llm_for(ModelTierConfig.STANDARD_MODEL)
         logger.info("Setup MCP agent parameters and LLM")
+
+    def _llm_for(self, model_name: str) -> ChatGoogleGenerativeAI:
+        """The agent's LLM for a model tier, created on first use."""
+        if model_name not in self._llms:
+            # Every model call of the agent waits for the node-wide quota
+            self._llms[model_name] = ChatGoogleGenerativeAI(
+                model=model_name,
+                temperature=0.1,
+                google_api_key=os.getenv("GOOGLE_API_KEY"),
+                rate_limiter=LangChainRateLimiter(
+                    get_generate_rate_limiter(), RateLimitConfig.AGENT_CALL_TOKENS_ESTIMATE, PRIORITY_BACKGROUND
+                )
+            )
+        return self._llms[model_name]
     
     def _get_mcp_environment(self) -> Dict[str, str]:
         """Get environment variables for MCP server."""
@@ -106,9 +119,11 @@ class AtlassianMCPAgent:
                     # Get tools from MCP session
                     tools = await load_mcp_tools(session)
                     
-                    # Create ReAct agent
+                    # Create ReAct agent; its size depends on the tool results, so only queue pressure
+                    # moves it to the light tier
+                    routing = await route_model("mcp_agent", prompt_tokens=None)
                     agent = create_react_agent(
-                        model=self.llm,
+                        model=self._llm_for(routing.model_name),
                         tools=tools
                     )
                     
@@ -0,0 +1,155 @@
+"""
+Deduplication of SOP generation jobs with identical inputs.
+
+A double-clicked or retried /generate creates a new job_id whose inputs are
+the same as an earlier job's. Each job gets a fingerprint of its content
+(template schema, query, storage manifests of the event JSON and screenshots,
+and uploaded file), taken from the storage listings so nothing is downloaded
+first. A job whose fingerprint is being produced by an in-flight job goes back
+to the queue until that job finishes, and one whose fingerprint was produced
+recently copies that job's document instead of running the pipeline again.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.config.job_config import JobDedupConfig
+from app.config.logging import get_logger
+from app.core.job_queue import JobDeferred, get_job_queue
+from app.core.repositories import get_generated_docs_repository
+from app.core.status_bus import publish_job_status
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Columns of a generated_docs record that make up the generated document
+_DOCUMENT_COLUMNS = "category,title,content,desc"
+
+
+class DuplicateJobResult(Exception):
+    """Raised to stop the pipeline once a job's document was copied from an identical job."""
+
+    def __init__(self, source_job_id: str):
+        super().__init__(f"Reused the result of identical job {source_job_id}")
+        self.source_job_id = source_job_id
+
+
+def _listing_manifest(listing: List[dict], suffixes: tuple) -> Optional[list]:
+    """(name, eTag, size) of every listed file with one of suffixes, or None if the listing lacks content hashes."""
+    manifest = []
+    for file in listing:
+        name = file.get('name')
+        if not name or name == '.emptyFolderPlaceholder' or not name.lower().endswith(suffixes):
+            continue
+        metadata = file.get('metadata') or {}
+        etag = metadata.get('eTag')
+        if not etag:
+            return None
+        manifest.append((name, etag.strip('"'), metadata.get('size')))
+    return sorted(manifest)
+
+
+def compute_job_fingerprint(
+    user_id: str,
+    query: str,
+    integration_type: str,
+    template: tuple,
+    json_listing: List[dict],
+    screenshot_listing: List[dict],
+    file_content: Optional[bytes],
+    file_filename: Optional[str],
+) -> Optional[str]:
+    """
+    Hash everything a job's document is generated from.
+
+    Returns:
+        str: Hex SHA-256 fingerprint, or None if the inputs cannot be fingerprinted reliably.
+    """
+    events = _listing_manifest(json_listing, ('.json',))
+    screenshots = _listing_manifest(screenshot_listing, ('.png', '.jpg', '.jpeg'))
+    if events is None or screenshots is None:
+        logger.debug("Storage listing has no eTags, skipping job fingerprint")
+        return None
+
+    components, category_name = template
+    parts = {
+        "user_id": user_id,
+        "query": query,
+        "integration_type": integration_type,
+        "template": hashlib.sha256(
+            json.dumps([components, category_name], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest(),
+        "event_json": events,
+        "screenshots": screenshots,
+        "uploaded_file": [file_filename, hashlib.sha256(file_content).hexdigest()] if file_content else None,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def _copy_document(source_job_id: str, job_id: str, user_id: str) -> bool:
+    """Copy the generated document of source_job_id to job_id. Returns False if the source is gone."""
+    generated_docs = get_generated_docs_repository()
+    document = await generated_docs.get_successful(source_job_id, _DOCUMENT_COLUMNS)
+    if not document:
+        return False
+    await generated_docs.upsert({
+        **document,
+        "id": job_id,
+        "user_id": user_id,
+        "status": "success",
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    return True
+
+
+async def claim_or_reuse(fingerprint: str, job_id: str, user_id: str) -> bool:
+    """
+    Make job_id the producer of fingerprint's result, or reuse the result of an identical job.
+    While an identical job is in flight, this job is deferred (returned to the queue without
+    holding a worker slot) and checks again when it is next claimed; if the identical job fails,
+    or is still running after JOIN_TIMEOUT_SECONDS, this job runs the pipeline itself.
+
+    Returns:
+        True if job_id owns the fingerprint and must run the pipeline.
+
+    Raises:
+        DuplicateJobResult: If the document was copied from an identical job.
+        JobDeferred: If an identical job is still in flight.
+    """
+    queue = get_job_queue()
+
+    while True:
+        owner = await asyncio.to_thread(queue.claim_fingerprint, fingerprint, job_id, JobDedupConfig.REUSE_SECONDS)
+        if owner is None:
+            return True
+
+        source_job_id, state = owner
+        if state == "done":
+            if await _copy_document(source_job_id, job_id, user_id):
+                logger.info(f"Job {job_id} reused the document of identical job {source_job_id}")
+                publish_job_status(job_id, status="success", stage="done", message=f"reused result of job {source_job_id}")
+                raise DuplicateJobResult(source_job_id)
+            # The source document was deleted; forget it and produce the result ourselves
+            logger.warning(f"Document of identical job {source_job_id} is gone, running job {job_id}")
+            await asyncio.to_thread(queue.finish_fingerprint, fingerprint, source_job_id, False)
+            continue
+
+        waiting_since = await asyncio.to_thread(queue.deferred_since, job_id)
+        if waiting_since is not None and time.time() - waiting_since >= JobDedupConfig.JOIN_TIMEOUT_SECONDS:
+            logger.warning(f"Gave up waiting for identical job {source_job_id}, running job {job_id} itself")
+            return False
+        if waiting_since is None:
+            logger.info(f"Job {job_id} has the same inputs as in-flight job {source_job_id}, waiting for it")
+        publish_job_status(job_id, stage="joined", message=f"waiting for identical job {source_job_id}")
+        raise JobDeferred(JobDedupConfig.JOIN_POLL_INTERVAL_SECONDS, f"waiting for identical job {source_job_id}")
+
+
+async def release_fingerprint(fingerprint: str, job_id: str, succeeded: bool) -> None:
+    """Publish (on success) or drop (on failure) the fingerprint owned by job_id."""
+    try:
+        await asyncio.to_thread(get_job_queue().finish_fingerprint, fingerprint, job_id, succeeded)
+    except Exception as e:
+        logger.warning(f"Failed to update fingerprint of job {job_id}: {e}")
@@ -0,0 +1,407 @@
+"""
+SOP generation pipeline run by the job worker pool for each /generate request.
+
+The pipeline is a dependency graph of stages (see app.utils.stage_graph):
+
+    template, uploaded_file ──────────────────────────────────────┐
+    json_listing → event_json ────────────────────────────────────┤
+    template, json_listing, screenshot_listing → dedup → rag ─────┼→ generate
+    screenshot_listing, dedup → screenshots → model_input ────────┘
+
+Independent stages run concurrently, and the GenAI upload starts as soon as
+the screenshots are ready, so a job takes as long as its critical path.
+Within the screenshots stage each screenshot is hashed and normalised on the
+image pool as soon as it downloads. In pdf input mode it is handed to a
+streaming PDF writer, so downloads and PDF assembly overlap; in images mode
+the screenshots are given to the model directly (see screenshot_parts). The dedup
+stage fingerprints the storage listings, so it does not wait for the event JSON,
+and stops the graph before any screenshot download or model call when an
+identical job already produced the document or is still producing it (see job_dedup).
+"""
+import asyncio
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.models.state_schema import SOPState
+from app.utils.json_parser import parse_json_bytes
+from app.utils.event_compactor import compact_event_log
+from app.workflow import create_workflow
+from app.services.rag_services.rag import fetch_relevant_issues
+from app.services.file_services.create_pdf import StreamingPdfBuilder
+from app.services.file_services.image_pool import prepare_screenshot
+from app.services.file_services.screenshot_dedup import ScreenshotDeduplicator
+from app.services.file_services.file_readers import read_excel_file, read_pdf_file, read_docx_file
+from app.services.ai_services.genai_files import delete_uploaded_file
+from app.services.ai_services.genai_file_cache import acquire_pdf
+from app.services.ai_services.screenshot_parts import choose_input_mode, build_image_parts
+from app.services.template_services.template_store import fetch_template_schema
+from app.services.pipeline_services.job_dedup import (
+    DuplicateJobResult, compute_job_fingerprint, claim_or_reuse, release_fingerprint
+)
+from app.config.job_config import JobDedupConfig
+from app.config.pipeline_config import EventLogConfig, ScreenshotDedupConfig
+from app.core.job_queue import JobDeferred, JobFailed
+from app.core.repositories import get_generated_docs_repository
+from app.core.storage import get_storage_bucket, StorageError
+from app.core.status_bus import publish_job_status
+from app.core.metrics import JOBS_IN_FLIGHT, observe_stage, observe_stage_timings, record_job, stage_timer
+from app.config.logging import get_logger
+from app.utils.download_screenshot import download_screenshot
+from app.utils.update_status import update_document_status
+from app.utils.artifacts import Artifact
+from app.utils.stage_graph import StageGraph, StageError
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Initialize workflow
+workflow = create_workflow()
+
+# Maximum number of screenshot downloads in flight per job
+MAX_CONCURRENT_DOWNLOADS = 10
+
+
+def extract_uploaded_file(file_content: Optional[bytes], file_filename: Optional[str]) -> str:
+    """Extract text from the optional file uploaded with the request."""
+    if file_content is None or file_filename is None:
+        return ""
+    file_extension = Path(file_filename).suffix.lower()
+    if file_extension in ['.xlsx', '.xls']:
+        return read_excel_file(file_content)
+    elif file_extension == '.pdf':
+        return read_pdf_file(file_content)
+    elif file_extension == '.docx':
+        return read_docx_file(file_content)
+    return ""
+
+
+async def build_knowledge_base(user_id: str, query: str, integration_type: str) -> str:
+    """Fetch RAG context for the integration and format it as the knowledge base section."""
+    rag_context = f"{integration_type.capitalize()} context unavailable."
+    try:
+        logger.debug(f"Fetching relevant issues for query: {query}, integration_type: {integration_type}")
+        if integration_type:
+            relevant_issues = await fetch_relevant_issues(user_id, query, integration_type, top_k=5)
+            if relevant_issues:
+                rag_context = "\n".join([
+                    f"{integration_type.capitalize()} Item: {issue.get('issue_id', 'N/A')}\nDetails: {issue.get('text_data', 'N/A')}"
+                    for issue in relevant_issues
+                ])
+            else:
+                rag_context = f"No relevant {integration_type} items found."
+        logger.debug("Fetched RAG context")
+    except Exception as e:
+        logger.warning(f"Error fetching {integration_type} issues: {str(e)}")
+        rag_context = f"Error fetching {integration_type} issues: {str(e)}"
+    return f"### Relevant {integration_type.capitalize()} Content:\n{rag_context}\n"
+
+
+async def process_sop_generation(
+    file_content: Optional[bytes],
+    file_filename: Optional[str],
+    user_id: str,
+    job_id: str,
+    query: str,
+    templates_id: str,
+    integration_type: str,
+    input_mode: Optional[str] = None
+):
+    """
+    Job handler for SOP generation, run by the job worker pool.
+    input_mode ("pdf", "images" or "auto") overrides GENERATION_INPUT_MODE for this job.
+    A failed job marks its document 'failed' and re-raises, so the queue records it as failed too.
+    """
+    requested_input_mode = input_mode
+    artifacts = []
+    genai_files = []
+    input_mode = None
+    screenshot_aliases = {}
+    screenshot_count = 0
+    owned_fingerprint = None
+    succeeded = False
+    outcome = "failed"
+    graph = None
+    job_start = time.perf_counter()
+    JOBS_IN_FLIGHT.inc()
+    generated_docs = get_generated_docs_repository()
+
+    try:
+        logger.debug(f"Starting background SOP generation for user_id={user_id}, job_id={job_id}, template_id='{templates_id}', integration_type='{integration_type}'")
+        publish_job_status(job_id, status="pending", stage="preparing", message="preparing inputs")
+
+        # --- Initialize Record with 'pending' Status ---
+        # Done before the stage graph so a fast-failing stage cannot be overwritten by 'pending'
+        logger.info(f"Initializing generated_docs record with status='pending' for job_id={job_id}")
+        try:
+            await generated_docs.upsert({"id": job_id, "user_id": user_id, "status": "pending"})
+            logger.info(f"Initialized generated_docs record for job_id={job_id}")
+        except Exception as e:
+            logger.error(f"Failed to initialize generated_docs record: {str(e)}")
+            await update_document_status(job_id, "failed")
+            raise JobFailed(f"generated_docs record could not be initialized: {e}") from e
+
+        storage = get_storage_bucket('log_dataa')
+        json_directory = f"{user_id}/{job_id}/json"
+        screenshots_directory = f"{user_id}/{job_id}/screenshots"
+        logger.debug(f"JSON Directory: {json_directory}")
+        logger.debug(f"Screenshot Directory: {screenshots_directory}")
+
+        # --- Stage: Template Components Schema ---
+        async def template_stage():
+            template = await fetch_template_schema(templates_id, user_id)
+            if template is None:
+                raise ValueError(f"No components found for template_id={templates_id} in both private and public tables")
+            return template
+
+        # --- Stages: Storage Listings ---
+        async def json_listing_stage():
+            json_files = await storage.list(json_directory)
+            logger.debug(f"Found JSON files: {len(json_files) if json_files else 0}")
+            return json_files or []
+
+        async def screenshot_listing_stage():
+            screenshot_files = await storage.list(screenshots_directory)
+            logger.debug(f"Found screenshot files: {len(screenshot_files) if screenshot_files else 0}")
+            return screenshot_files or []
+
+        # --- Stage: Uploaded File Extraction ---
+        async def uploaded_file_stage():
+            return await asyncio.to_thread(extract_uploaded_file, file_content, file_filename)
+
+        # --- Stage: RAG Context ---
+        async def rag_stage(dedup):
+            return await build_knowledge_base(user_id, query, integration_type)
+
+        # --- Stage: Event JSON Download ---
+        async def event_json_stage(json_listing):
+            json_file_name = None
+            for file in json_listing:
+                file_name = file.get('name')
+                if file_name and file_name.lower().endswith('.json') and file_name != '.emptyFolderPlaceholder':
+                    json_file_name = file_name
+                    break
+            if not json_file_name:
+                raise ValueError("No event JSON file found")
+
+            json_path = f"{json_directory}/{json_file_name}"
+            logger.debug(f"Downloading event JSON: {json_path}")
+            try:
+                with await storage.download(json_path, json_file_name, "application/json") as json_artifact:
+                    event_data = await parse_json_bytes(json_artifact.getvalue())
+            except StorageError as e:
+                raise ValueError(f"Failed download event JSON: {json_file_name}: {e}")
+            if not event_data:
+                raise ValueError(f"Event JSON is empty: {json_file_name}")
+            if EventLogConfig.COMPACTION_ENABLED:
+                with stage_timer("event_compaction"):
+                    event_data = await asyncio.to_thread(compact_event_log, event_data)
+            return event_data
+
+        # --- Stage: Duplicate Detection (before any download or model call) ---
+        async def dedup_stage(template, json_listing, screenshot_listing):
+            nonlocal owned_fingerprint
+            if not JobDedupConfig.ENABLED:
+                return None
+            fingerprint = compute_job_fingerprint(
+                user_id, query, integration_type, template, json_listing,
+                screenshot_listing, file_content, file_filename
+            )
+            if fingerprint is None:
+                return None
+            if await claim_or_reuse(fingerprint, job_id, user_id):
+                owned_fingerprint = fingerprint
+            return fingerprint
+
+        # --- Stage: Screenshot Downloads (streamed into the PDF writer, or kept as images) ---
+        async def screenshots_stage(screenshot_listing, dedup):
+            nonlocal screenshot_aliases, screenshot_count, input_mode
+            file_names = [
+                file.get('name') for file in screenshot_listing
+                if file.get('name') and file.get('name').lower().endswith(('.png', '.jpg', '.jpeg'))
+                and file.get('name') != '.emptyFolderPlaceholder'
+            ]
+            input_mode = choose_input_mode(requested_input_mode, len(file_names))
+            logger.info(f"Starting parallel download of {len(file_names)} screenshots ({input_mode} mode)...")
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+            completed = 0
+
+            deduplicator = ScreenshotDeduplicator() if ScreenshotDedupConfig.ENABLED else None
+            if input_mode == "pdf":
+                pdf_artifact = Artifact(f"{job_id}_generated.pdf", "application/pdf")
+                artifacts.append(pdf_artifact)
+                builder = StreamingPdfBuilder(pdf_artifact, len(file_names), deduplicator)
+            else:
+                builder = None
+                images = {}
+
+            def report_progress():
+                publish_job_status(
+                    job_id, stage="screenshots", message=f"screenshots {completed}/{len(file_names)}",
+                    progress={"screenshots": {"done": completed, "total": len(file_names)}}
+                )
+
+            async def download_page(index, file_name):
+                nonlocal completed
+                try:
+                    async with semaphore:
+                        artifact = await download_screenshot(storage, f"{screenshots_directory}/{file_name}", file_name)
+                except Exception as e:
+                    logger.error(f"Download task failed with exception: {str(e)}")
+                    artifact = None
+                completed += 1
+                report_progress()
+                if builder is None:
+                    if artifact is not None:
+                        artifacts.append(artifact)
+                        page_hash, prepared = await prepare_screenshot(artifact)
+                        if prepared is not artifact:
+                            artifacts.append(prepared)
+                        images[index] = (prepared, page_hash)
+                    return
+                if artifact is None:
+                    builder.skip_page(index)
+                    return
+                per_page = builder.screenshots_per_page(artifact)
+                page_hash, artifact = await prepare_screenshot(artifact, per_page)
+                builder.add_page(index, artifact, page_hash)
+
+            report_progress()
+            if builder is not None:
+                builder.start()
+            downloads_start = time.perf_counter()
+            try:
+                await asyncio.gather(*[download_page(index, name) for index, name in enumerate(file_names)])
+            except BaseException:
+                if builder is not None:
+                    await builder.abort()
+                raise
+            observe_stage("screenshot_downloads", time.perf_counter() - downloads_start)
+
+            if builder is None:
+                screenshots = []
+                for index in sorted(images):
+                    screenshot, page_hash = images[index]
+                    if deduplicator is None or deduplicator.check(screenshot.name, page_hash) is None:
+                        screenshots.append(screenshot)
+                if deduplicator is not None:
+                    screenshot_aliases = dict(deduplicator.aliases)
+                    logger.info(f"Dropped {deduplicator.dropped} near-duplicate screenshots")
+                logger.info(f"Prepared {len(screenshots)}/{len(file_names)} screenshots as images")
+                if not screenshots:
+                    raise ValueError("No screenshots for generation")
+                screenshot_count = len(screenshots)
+                return screenshots
+
+            publish_job_status(job_id, stage="pdf", message="finishing PDF")
+            await builder.finish()
+            if deduplicator is not None:
+                screenshot_aliases = dict(deduplicator.aliases)
+                logger.info(f"Dropped {deduplicator.dropped} near-duplicate screenshots")
+            logger.info(f"PDF built with {builder.placed}/{len(file_names)} screenshots on {builder.pages} pages")
+            if builder.placed == 0:
+                raise ValueError("No screenshots for PDF")
+            screenshot_count = builder.placed
+            logger.debug(f"PDF created: {pdf_artifact}")
+            return pdf_artifact
+
+        # --- Stage: GenAI Input Upload (starts as soon as the screenshots are ready) ---
+        async def model_input_stage(screenshots):
+            if input_mode == "images":
+                publish_job_status(job_id, stage="image_upload", message="preparing screenshots for the model")
+                parts, uploaded_files = await build_image_parts(screenshots, job_id)
+                genai_files.extend(uploaded_files)
+                return None, parts
+            publish_job_status(job_id, stage="pdf_upload", message="uploading PDF")
+            genai_file, owned = await acquire_pdf(screenshots, job_id)
+            if owned:
+                genai_files.append(genai_file)
+            return genai_file, None
+
+        # --- Stage: Workflow Invocation ---
+        async def generate_stage(template, uploaded_file, rag, event_json, screenshots, model_input):
+            full_component_schema, category_name = template
+            genai_file, screenshot_parts = model_input
+            publish_job_status(job_id, stage="generating", message="generating")
+            logger.debug("Invoking workflow with component schema...")
+            initial_state = SOPState(
+                KB=rag,
+                pdf_artifact=screenshots if input_mode == "pdf" else None,
+                genai_file=genai_file,
+                screenshot_parts=screenshot_parts,
+                screenshot_count=screenshot_count,
+                user_id=user_id,
+                job_id=job_id,
+                event_data=event_json,
+                user_query=query,
+                components=full_component_schema,
+                category_name=category_name,
+                contents=uploaded_file,
+                screenshot_aliases=screenshot_aliases
+            )
+            result = await workflow.ainvoke(initial_state)
+            logger.debug("SOP workflow completed")
+            logger.debug(f"SOP result type: {type(result)}")
+            return result
+
+        graph = StageGraph(f"job {job_id}")
+        graph.add_stage("template", template_stage)
+        graph.add_stage("json_listing", json_listing_stage)
+        graph.add_stage("screenshot_listing", screenshot_listing_stage)
+        graph.add_stage("uploaded_file", uploaded_file_stage)
+        graph.add_stage("event_json", event_json_stage, depends_on=["json_listing"])
+        graph.add_stage("dedup", dedup_stage, depends_on=["template", "json_listing", "screenshot_listing"])
+        graph.add_stage("rag", rag_stage, depends_on=["dedup"])
+        graph.add_stage("screenshots", screenshots_stage, depends_on=["screenshot_listing", "dedup"])
+        graph.add_stage("model_input", model_input_stage, depends_on=["screenshots"])
+        graph.add_stage(
+            "generate", generate_stage,
+            depends_on=["template", "uploaded_file", "rag", "event_json", "screenshots", "model_input"]
+        )
+
+        try:
+            await graph.run()
+        except StageError as e:
+            if isinstance(e.error, DuplicateJobResult):
+                logger.info(f"Job {job_id} completed from identical job {e.error.source_job_id}")
+                outcome = "reused"
+                return
+            if isinstance(e.error, JobDeferred):
+                outcome = None
+                raise e.error
+            logger.error(f"SOP generation failed in stage '{e.stage}': {str(e.error)}")
+            await update_document_status(job_id, "failed")
+            raise JobFailed(f"stage '{e.stage}' failed: {e.error}") from e
+
+        # --- Verify Status After Workflow ---
+        status = await generated_docs.get_status(job_id)
+        if status and status != 'success':
+            logger.warning(f"Workflow completed but status is {status} for job_id={job_id}")
+            await update_document_status(job_id, "success")
+        succeeded = True
+        outcome = "success"
+
+    except (JobFailed, JobDeferred):
+        raise
+    except Exception as e:
+        logger.error(f"Fatal unexpected error in background task: {str(e)}")
+        await update_document_status(job_id, "failed")
+        raise JobFailed(f"unexpected error: {e}") from e
+    finally:
+        JOBS_IN_FLIGHT.dec()
+        if outcome is not None:
+            record_job(outcome, time.perf_counter() - job_start)
+        if graph is not None:
+            observe_stage_timings(graph.timings)
+        if owned_fingerprint is not None:
+            await release_fingerprint(owned_fingerprint, job_id, succeeded)
+
+        # --- Release GenAI File and In-Memory Artifacts ---
+        for genai_file in genai_files:
+            await delete_uploaded_file(genai_file)
+        logger.debug(f"Releasing {len(artifacts)} artifacts...")
+        for artifact in artifacts:
+            try:
+                artifact.close()
+            except Exception as e:
+                logger.warning(f"Artifact cleanup failed for {artifact.name}: {str(e)}")
@@ -2,9 +2,10 @@
 #rag
 
 import os
-from supabase import create_client
+import asyncio
 from dotenv import load_dotenv
-from app.core.initializers import get_supabase_client, generate_embeddings
+from app.core.initializers import generate_embeddings
+from app.core.repositories import get_vector_repository
 from app.config.logging import get_logger
 
 # Initialize logger for this module
@@ -13,16 +14,13 @@ logger = get_logger(__name__)
 # Load environment variables (still needed for other configs)
 load_dotenv()
 
-# Use centralized services
-supabase = get_supabase_client()
-
 def get_free_embedding(text: str):
     """
     Generate embeddings using Gemini embedding model.
     """
     return generate_embeddings(text)
 
-def fetch_relevant_issues(user_id: str, query: str, integration_type: str, top_k: int = 2):
+async def fetch_relevant_issues(user_id: str, query: str, integration_type: str, top_k: int = 2):
     """
     Fetch relevant issues for a user by first filtering on `user_id` and `integration_type`,
     then performing a vector similarity search on the `embedding` column.
@@ -38,18 +36,13 @@ def fetch_relevant_issues(user_id: str, query: str, integration_type: str, top_k
     """
     try:
         # ✅ Generate embedding for the query (NOT stored in Supabase)
-        query_embedding = get_free_embedding(query)
+        query_embedding = await asyncio.to_thread(get_free_embedding, query)
 
-        # ✅ Run vector similarity search in Supabase
-        response = supabase.rpc("match_jira_vectors", {
-            "query_embedding": query_embedding,  # ✅ Used in SQL function, NOT a table column
-            "user_id": user_id,
-            "integration_type": integration_type,
-            "top_k": top_k
-        }).execute()
+        # ✅ Run vector similarity search in Supabase (query_embedding is used in the SQL function, NOT a table column)
+        rows = await get_vector_repository().match_jira_vectors(query_embedding, user_id, integration_type, top_k)
 
         # ✅ Check for errors
-        if not response.data:
+        if not rows:
             raise Exception(f"No matching {integration_type} issues found.")
 
         # ✅ Extract relevant results
@@ -59,7 +52,7 @@ def fetch_relevant_issues(user_id: str, query: str, integration_type: str, top_k
                 "text_data": row["text_data"],  
                 "score": row["score"]  # ✅ Higher means more relevant
             }
-            for row in response.data
+            for row in rows
         ]
         
         
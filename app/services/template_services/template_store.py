@@ -0,0 +1,185 @@
+"""
+Template schema lookup with an in-process LRU+TTL cache.
+
+Every job needs the `components` schema and `name` of its template. Private
+templates are looked up per (template_id, user_id) and public templates per
+template_id; a private miss is cached too, so jobs using a public template
+go straight to the shared public entry. Entries are invalidated through the
+/templates/{template_id}/invalidate endpoint or, when enabled, a Supabase
+realtime subscription on the template tables. The endpoint records the
+invalidation in the shared queue database, and every worker on the node
+applies the invalidations recorded since its last lookup before reading
+its cache.
+"""
+import asyncio
+import copy
+import os
+from typing import Optional
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import TemplateCacheConfig
+from app.core.job_queue import get_job_queue
+from app.core.repositories import get_template_repository
+from app.utils.ttl_cache import TTLCache, MISSING
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Cached value for "this user has no private template with this id"
+_NOT_FOUND = object()
+
+_template_cache = TTLCache(maxsize=TemplateCacheConfig.MAX_ENTRIES, ttl=TemplateCacheConfig.TTL_SECONDS)
+
+# Realtime client and channel, when the invalidation listener is running
+_realtime_client = None
+
+# Last shared invalidation applied to this process's cache (None until the first lookup)
+_invalidation_seq: Optional[int] = None
+
+
+def _template_entry(row: Optional[dict]) -> Optional[tuple]:
+    if row and 'components' in row:
+        return row['components'], row.get('name', 'SOP')
+    return None
+
+
+async def _query_private_template(templates_id: str, user_id: str) -> Optional[tuple]:
+    row = await get_template_repository().get_private(templates_id, user_id)
+    logger.debug(f"Supabase template query response data: {row}")
+    return _template_entry(row)
+
+
+async def _query_public_template(templates_id: str) -> Optional[tuple]:
+    row = await get_template_repository().get_public(templates_id)
+    logger.debug(f"Supabase public template query response data: {row}")
+    return _template_entry(row)
+
+
+async def fetch_template_schema(templates_id: str, user_id: str) -> Optional[tuple]:
+    """
+    Fetch a template's components schema, trying the user's private templates first
+    and then the public ones. Results are served from the cache when possible.
+
+    Returns:
+        tuple: (components_schema, category_name), or None if the template does not exist.
+        The schema is a copy and may be modified by the caller.
+    """
+    await _apply_shared_invalidations()
+    private_key = ("private", templates_id, user_id)
+    public_key = ("public", templates_id, None)
+
+    private = _template_cache.get(private_key)
+    if private is MISSING:
+        logger.debug(f"Fetching template components schema for template_id={templates_id}, user_id={user_id}")
+        private = await _query_private_template(templates_id, user_id)
+        if private is None:
+            _template_cache.set(private_key, _NOT_FOUND, ttl=TemplateCacheConfig.NEGATIVE_TTL_SECONDS)
+        else:
+            _template_cache.set(private_key, private)
+    else:
+        logger.debug(f"Template cache hit for template_id={templates_id}, user_id={user_id}")
+
+    if private is not None and private is not _NOT_FOUND:
+        return copy.deepcopy(private)
+
+    public = _template_cache.get(public_key)
+    if public is MISSING:
+        logger.info(f"Template not found in private table. Checking 'publictemplates' table.")
+        public = await _query_public_template(templates_id)
+        if public is None:
+            return None
+        logger.info(f"Template found in publictemplates table for template_id={templates_id}")
+        _template_cache.set(public_key, public)
+    else:
+        logger.debug(f"Public template cache hit for template_id={templates_id}")
+
+    return copy.deepcopy(public)
+
+
+def invalidate_template(templates_id: Optional[str] = None, user_id: Optional[str] = None) -> int:
+    """
+    Drop cached entries for a template (all users unless user_id is given),
+    or the whole cache when templates_id is None.
+
+    Returns:
+        int: Number of entries removed.
+    """
+    if templates_id is None:
+        removed = len(_template_cache)
+        _template_cache.clear()
+    else:
+        removed = _template_cache.invalidate_where(
+            lambda key: key[1] == templates_id and (user_id is None or key[2] in (user_id, None))
+        )
+    logger.info(f"Invalidated {removed} template cache entries (template_id={templates_id}, user_id={user_id})")
+    return removed
+
+
+async def _apply_shared_invalidations() -> None:
+    """Apply invalidations other workers on the node recorded since this process last checked."""
+    global _invalidation_seq
+    try:
+        latest, changes = await asyncio.to_thread(get_job_queue().template_invalidations_since, _invalidation_seq)
+    except Exception as e:
+        logger.warning(f"Could not read shared template invalidations (relying on TTL): {e}")
+        return
+    for templates_id, user_id in changes:
+        invalidate_template(templates_id, user_id)
+    if _invalidation_seq is None or latest > _invalidation_seq:
+        _invalidation_seq = latest
+
+
+async def broadcast_template_invalidation(templates_id: Optional[str] = None, user_id: Optional[str] = None) -> int:
+    """
+    Invalidate a template in this process and record the invalidation in the shared
+    queue database, so every other worker on the node drops it before its next lookup.
+
+    Returns:
+        int: Number of entries removed from this process's cache.
+    """
+    removed = invalidate_template(templates_id, user_id)
+    await asyncio.to_thread(get_job_queue().record_template_invalidation, templates_id, user_id)
+    return removed
+
+
+def _on_template_change(payload: dict) -> None:
+    """Realtime callback for INSERT/UPDATE/DELETE on the template tables."""
+    try:
+        data = payload.get("data", payload)
+        record = data.get("record") or data.get("old_record") or {}
+        templates_id = record.get("id")
+        invalidate_template(str(templates_id) if templates_id is not None else None)
+    except Exception as e:
+        logger.warning(f"Could not process template change event, clearing template cache: {e}")
+        invalidate_template()
+
+
+async def start_template_invalidation_listener() -> None:
+    """Subscribe to changes on the template tables (no-op unless TEMPLATE_CACHE_REALTIME=true)."""
+    global _realtime_client
+    if not TemplateCacheConfig.REALTIME_INVALIDATION or _realtime_client is not None:
+        return
+    try:
+        from supabase import acreate_client
+
+        client = await acreate_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+        channel = client.channel("template-cache-invalidation")
+        for table in ("templates", "publictemplates"):
+            channel.on_postgres_changes("*", schema="public", table=table, callback=_on_template_change)
+        await channel.subscribe()
+        _realtime_client = client
+        logger.info("Template cache realtime invalidation listener subscribed")
+    except Exception as e:
+        logger.error(f"Failed to start template cache invalidation listener (relying on TTL): {e}")
+
+
+async def stop_template_invalidation_listener() -> None:
+    """Unsubscribe the realtime listener, if running."""
+    global _realtime_client
+    if _realtime_client is None:
+        return
+    try:
+        await _realtime_client.remove_all_channels()
+    except Exception as e:
+        logger.warning(f"Failed to stop template cache invalidation listener: {e}")
+    _realtime_client = None
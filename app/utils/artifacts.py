@@ -0,0 +1,186 @@
+"""
+In-memory artifacts passed between SOP pipeline stages.
+
+Screenshots, the event JSON and the generated PDF are kept as byte buffers
+instead of temp files in the working directory. An artifact that grows past
+the spill threshold is moved to an anonymous temporary file (unlinked on
+creation), so nothing is left behind on disk if the worker dies.
+"""
+import io
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Union
+
+from app.config.pipeline_config import ArtifactConfig
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class Artifact:
+    """A named, append-only byte buffer that spills to disk above a size threshold."""
+
+    def __init__(
+        self,
+        name: str,
+        mime_type: str = "application/octet-stream",
+        spill_threshold: int = ArtifactConfig.SPILL_THRESHOLD_BYTES,
+        spill_dir: Optional[str] = ArtifactConfig.SPILL_DIR,
+    ):
+        self.name = name
+        self.mime_type = mime_type
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self._buffer: BinaryIO = io.BytesIO()
+        self._spilled = False
+        self._size = 0
+
+    @classmethod
+    def from_bytes(cls, name: str, data: BytesLike, mime_type: str = "application/octet-stream") -> "Artifact":
+        """Create an artifact holding a copy of data."""
+        artifact = cls(name, mime_type)
+        artifact.write(data)
+        return artifact
+
+    @property
+    def size(self) -> int:
+        """Number of bytes written so far."""
+        return self._size
+
+    @property
+    def spilled(self) -> bool:
+        """True if the content lives in a temp file instead of memory."""
+        return self._spilled
+
+    def write(self, data: BytesLike) -> int:
+        """Append data, spilling to disk first if the threshold would be exceeded."""
+        if not self._spilled and self._size + len(data) > self.spill_threshold:
+            self._spill()
+        self._buffer.seek(0, io.SEEK_END)
+        written = self._buffer.write(data)
+        self._size += written
+        return written
+
+    def flush(self) -> None:
+        """Flush buffered writes (file-like compatibility for writers such as reportlab)."""
+        self._buffer.flush()
+
+    def _spill(self) -> None:
+        spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+        spill_file.write(self._buffer.getbuffer())
+        self._buffer.close()
+        self._buffer = spill_file
+        self._spilled = True
+
+    def open(self) -> BinaryIO:
+        """
+        Return a readable binary stream positioned at the start of the content.
+        The stream is shared by all readers of this artifact: read it sequentially and do not close it.
+        """
+        self._buffer.flush()
+        self._buffer.seek(0)
+        return self._buffer
+
+    def reader(self) -> BinaryIO:
+        """
+        Return a new read-only stream over the content with its own position, for readers that
+        may run at the same time (e.g. an upload retried while the timed-out attempt still reads).
+        The content is not copied; do not write to the artifact while readers are in use.
+        """
+        self._buffer.flush()
+        return io.BufferedReader(_ArtifactReader(self))
+
+    def _read_at(self, position: int, target: memoryview) -> int:
+        """Copy content from position into target without moving the shared stream."""
+        if self._spilled:
+            data = os.pread(self._buffer.fileno(), len(target), position)
+            target[:len(data)] = data
+            return len(data)
+        with self._buffer.getbuffer() as view, view[position:position + len(target)] as chunk:
+            target[:len(chunk)] = chunk
+            return len(chunk)
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        """
+        Read-only memoryview of the content without copying it, valid inside the with block.
+        A spilled artifact is memory-mapped, and the mapping is closed on exit.
+        """
+        if not self._spilled:
+            view = self._buffer.getbuffer().toreadonly()
+            try:
+                yield view
+            finally:
+                view.release()
+            return
+        self._buffer.flush()
+        if self._size == 0:
+            yield memoryview(b"")
+            return
+        mapping = mmap.mmap(self._buffer.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapping)
+        try:
+            yield view
+        finally:
+            view.release()
+            try:
+                mapping.close()
+            except BufferError:
+                # The caller kept a slice of the view; the mapping is closed when that is dropped
+                pass
+
+    def getvalue(self) -> bytes:
+        """Return a copy of the content as bytes."""
+        with self.view() as view:
+            return bytes(view)
+
+    def close(self) -> None:
+        """Release the buffer (and delete the spill file, if any)."""
+        try:
+            self._buffer.close()
+        except BufferError:
+            # A memoryview from view() is still alive; let it keep the memory until it is dropped
+            pass
+
+    def __enter__(self) -> "Artifact":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        location = "disk" if self._spilled else "memory"
+        return f"Artifact(name={self.name!r}, size={self._size}, {location})"
+
+
+class _ArtifactReader(io.RawIOBase):
+    """Read-only stream over an artifact's content with a position of its own (see Artifact.reader)."""
+
+    def __init__(self, artifact: Artifact):
+        super().__init__()
+        self._artifact = artifact
+        self._size = artifact.size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def readinto(self, target) -> int:
+        if self._position >= self._size:
+            return 0
+        with memoryview(target).cast("B") as view:
+            read = self._artifact._read_at(self._position, view[:self._size - self._position])
+        self._position += read
+        return read
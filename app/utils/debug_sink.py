@@ -0,0 +1,138 @@
+"""
+Sampled, asynchronous sink for debug artifacts.
+
+Artifacts (the model's raw output, the rendered markdown, downloaded DOCX
+files) are written to one directory per job by a background writer thread,
+never on the caller's thread or the event loop. Jobs are sampled as a whole,
+only the most recent MAX_JOBS job directories are kept, and artifacts are
+dropped rather than queued without bound. When disabled (the default),
+record() returns at once.
+"""
+import hashlib
+import os
+import queue
+import re
+import shutil
+import threading
+from typing import Optional, Union
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import DebugSinkConfig
+from app.core.metrics import DEBUG_ARTIFACTS
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class DebugSink:
+    """Writes debug artifacts per job from a background thread."""
+
+    def __init__(self, enabled: bool = DebugSinkConfig.ENABLED, directory: str = DebugSinkConfig.DIRECTORY,
+                 sample_rate: float = DebugSinkConfig.SAMPLE_RATE, max_jobs: int = DebugSinkConfig.MAX_JOBS,
+                 queue_size: int = DebugSinkConfig.QUEUE_SIZE):
+        self.enabled = enabled and sample_rate > 0
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_jobs = max_jobs
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def sampled(self, key: str) -> bool:
+        """Whether artifacts of this job are kept (the same answer in every process)."""
+        if self.sample_rate >= 1:
+            return True
+        bucket = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:8], 16) / 0x100000000
+        return bucket < self.sample_rate
+
+    def record(self, key: str, name: str, data: Union[str, bytes]) -> None:
+        """
+        Queue an artifact for writing as <directory>/<key>/<name>.
+
+        Args:
+            key: Job the artifact belongs to (e.g. the job_id)
+            name: File name within the job's directory
+            data: Text (written as UTF-8) or bytes
+        """
+        if not self.enabled or not self.sampled(key):
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((key, name, data))
+        except queue.Full:
+            DEBUG_ARTIFACTS.labels(result="dropped").inc()
+            logger.debug(f"Debug sink queue full, dropped {key}/{name}")
+
+    def _ensure_writer(self) -> None:
+        with self._lock:
+            if self._writer is not None and self._writer_pid == os.getpid() and self._writer.is_alive():
+                return
+            if self._writer_pid != os.getpid():
+                # A forked worker does not inherit the parent's writer thread or its pending artifacts
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._writer = threading.Thread(target=self._run, name="debug-sink", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+            logger.info(f"Debug sink writing to '{self.directory}' (sample rate {self.sample_rate})")
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, key: str, name: str, data: Union[str, bytes]) -> None:
+        job_dir = os.path.join(self.directory, _UNSAFE_NAME.sub("_", key))
+        path = os.path.join(job_dir, _UNSAFE_NAME.sub("_", name))
+        try:
+            new_job = not os.path.isdir(job_dir)
+            os.makedirs(job_dir, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        except Exception as e:
+            DEBUG_ARTIFACTS.labels(result="failed").inc()
+            logger.warning(f"Failed to save debug artifact {path}: {e}")
+            return
+        DEBUG_ARTIFACTS.labels(result="written").inc()
+        logger.debug(f"Saved debug artifact {path}")
+        if new_job:
+            try:
+                self._evict()
+            except OSError as e:
+                # Another process may be evicting the same directories
+                logger.debug(f"Debug sink eviction skipped: {e}")
+
+    def _evict(self) -> None:
+        """Delete the oldest job directories beyond max_jobs (shared by every process using the directory)."""
+        with os.scandir(self.directory) as entries:
+            job_dirs = [entry for entry in entries if entry.is_dir()]
+        if len(job_dirs) <= self.max_jobs:
+            return
+        job_dirs.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in job_dirs[:len(job_dirs) - self.max_jobs]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Stop the writer after the queued artifacts are written (application shutdown)."""
+        with self._lock:
+            writer = self._writer
+            if writer is None or self._writer_pid != os.getpid() or not writer.is_alive():
+                return
+            self._writer = None
+        self._queue.put(None)
+        writer.join(timeout)
+
+
+_sink = DebugSink()
+
+
+def get_debug_sink() -> DebugSink:
+    """Get the process-wide debug sink."""
+    return _sink
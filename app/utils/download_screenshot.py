@@ -1,35 +1,21 @@
-import asyncio
-import concurrent.futures
-import os
+import mimetypes
+from typing import Optional
 
 from app.config.logging import get_logger
+from app.core.storage import AsyncStorageBucket
+from app.utils.artifacts import Artifact
 # Initialize logger for this module
 logger = get_logger(__name__)
 
 
-async def download_screenshot(storage, full_path: str, temp_path: str, file_name: str) -> tuple:
-    """Download a single screenshot file and return the result."""
+async def download_screenshot(storage: AsyncStorageBucket, full_path: str, file_name: str) -> Optional[Artifact]:
+    """Stream a single screenshot over the shared HTTP client into an in-memory artifact."""
     try:
         logger.debug(f"Downloading screenshot: {full_path}")
-        # Use executor to run blocking operation in thread pool
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            response_content = await loop.run_in_executor(executor, storage.download, full_path)
-        
-        if not isinstance(response_content, bytes):
-            logger.error(f"Failed download: {file_name}")
-            return None
-        
-        with open(temp_path, "wb") as f: 
-            f.write(response_content)
-        
-        logger.debug(f"Saved temp screenshot: {temp_path}")
-        return (temp_path, file_name)
+        mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        artifact = await storage.download(full_path, file_name, mime_type)
+        logger.debug(f"Downloaded screenshot {file_name} ({artifact.size} bytes)")
+        return artifact
     except Exception as e:
         logger.error(f"Failed processing screenshot {file_name}: {str(e)}")
-        if os.path.exists(temp_path):
-            try: 
-                os.remove(temp_path)
-            except OSError: 
-                pass
-        return None
\ No newline at end of file
+        return None
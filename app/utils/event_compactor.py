@@ -0,0 +1,166 @@
+"""
+Compaction of the recorded user event log before it goes into the prompt.
+
+The recorder writes one JSON object per DOM event, with trailing commas, and
+fires an `input` event for every keystroke. The log is decoded one event at a
+time; noise events (mouse moves, scrolls, ...) are dropped, consecutive
+inputs and keystrokes on the same element are merged into the last one,
+fields the prompt does not use are removed, and page URL/title are only
+emitted when they change. The result is a JSON array with one compact event
+per line.
+"""
+import json
+import re
+from typing import Iterable, Iterator, Optional
+
+from app.config.logging import get_logger
+from app.config.pipeline_config import EventLogConfig
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Events where only the last of a run on the same element matters
+MERGED_EVENTS = frozenset({"input", "change", "keydown", "keyup", "keypress"})
+
+# Fields describing the page an event happened on, emitted only when they change
+PAGE_FIELDS = ("pageTitle", "pageURL")
+
+# Order of known fields in the compact form; other fields follow in recorded order
+FIELD_ORDER = ("event", "tag", "id", "classList", "text", "placeholder", "value")
+
+_STRING_OR_TRAILING_COMMA = re.compile(r'"(?:[^"\\]|\\.)*"|,(?=\s*[}\]])', re.DOTALL)
+_SEPARATORS = re.compile(r"[\s,\[\]]*")
+_GENERATED_CLASS = re.compile(r"^(?:css|sc|jss|emotion)-|_[A-Za-z0-9]{5}_\d+$")
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing brace or bracket (outside strings)."""
+    return _STRING_OR_TRAILING_COMMA.sub(lambda m: "" if m.group(0) == "," else m.group(0), text)
+
+
+def iter_events(text: str) -> Iterator[dict]:
+    """
+    Decode the event log one event at a time. Accepts a JSON array (trailing commas allowed),
+    concatenated or newline-delimited objects, or an object with an "events" array.
+
+    Raises:
+        ValueError: If the log is not valid JSON even after removing trailing commas.
+    """
+    text = _strip_trailing_commas(text)
+    decoder = json.JSONDecoder()
+    index = 0
+    while True:
+        index = _SEPARATORS.match(text, index).end()
+        if index >= len(text):
+            return
+        value, index = decoder.raw_decode(text, index)
+        if isinstance(value, dict) and isinstance(value.get("events"), list):
+            value = value["events"]
+        if isinstance(value, dict):
+            yield value
+        elif isinstance(value, list):
+            yield from (event for event in value if isinstance(event, dict))
+
+
+def _event_type(event: dict) -> str:
+    return str(event.get("event") or event.get("type") or "").lower()
+
+
+def _element_key(event: dict) -> tuple:
+    return (
+        event.get("tag"), event.get("id"), tuple(event.get("classList") or ()),
+        event.get("placeholder"), event.get("name"), event.get("pageURL"),
+    )
+
+
+def merge_events(events: Iterable[dict], noise_events: frozenset = EventLogConfig.NOISE_EVENTS) -> Iterator[dict]:
+    """Drop noise events and collapse runs of inputs/keystrokes on the same element into the last one."""
+    pending: Optional[dict] = None
+    for event in events:
+        event_type = _event_type(event)
+        if event_type in noise_events:
+            continue
+        if event_type in MERGED_EVENTS:
+            if pending is not None and _event_type(pending) in MERGED_EVENTS and _element_key(pending) == _element_key(event):
+                pending = event
+                continue
+        if pending is not None:
+            yield pending
+        pending = event
+    if pending is not None:
+        yield pending
+
+
+def _shorten(value, max_chars: int):
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        if len(value) > max_chars:
+            return value[:max_chars] + "…"
+    return value
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+class _Canonicalizer:
+    """Turns merged events into their compact form, tracking the current page."""
+
+    def __init__(self):
+        self.page = {}
+
+    def __call__(self, event: dict) -> dict:
+        compact = {}
+        event_type = event.get("event") or event.get("type")
+        if event_type:
+            compact["event"] = event_type
+
+        page = {field: event.get(field) for field in PAGE_FIELDS if not _is_empty(event.get(field))}
+        if _event_type(event) == "pagechange" and event.get("newURL"):
+            page["pageURL"] = event["newURL"]
+        changed = {field: value for field, value in page.items() if self.page.get(field) != value}
+        self.page.update(page)
+
+        for field in FIELD_ORDER[1:] + tuple(event):
+            if field in compact or field in ("event", "type", "newURL") or field in PAGE_FIELDS:
+                continue
+            if field in EventLogConfig.DROP_FIELDS:
+                continue
+            value = event.get(field)
+            if field == "classList" and isinstance(value, list):
+                value = [name for name in value if not _GENERATED_CLASS.search(str(name))][:EventLogConfig.MAX_CLASSES]
+            value = _shorten(value, EventLogConfig.MAX_TEXT_CHARS)
+            if not _is_empty(value):
+                compact[field] = value
+        compact.update(changed)
+        return compact
+
+
+def compact_event_log(raw: str) -> str:
+    """
+    Compact a recorded event log for the prompt.
+
+    Returns:
+        str: The compact event log, or raw unchanged if it cannot be decoded.
+    """
+    try:
+        recorded = 0
+
+        def counted(events):
+            nonlocal recorded
+            for event in events:
+                recorded += 1
+                yield event
+
+        canonicalize = _Canonicalizer()
+        lines = [
+            json.dumps(canonicalize(event), ensure_ascii=False, separators=(",", ":"))
+            for event in merge_events(counted(iter_events(raw)))
+        ]
+    except ValueError as e:
+        logger.warning(f"Event log could not be decoded, using it verbatim: {e}")
+        return raw
+
+    compact = "[\n" + ",\n".join(lines) + "\n]"
+    logger.info(f"Compacted event log: {recorded} -> {len(lines)} events, {len(raw)} -> {len(compact)} chars")
+    return compact
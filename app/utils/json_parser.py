@@ -20,4 +20,12 @@ async def parse_json(file_path: str) -> str:
             return f.read()
     except Exception as e:
         logger.error(f"Error reading JSON file: {str(e)}")
-        return ""
\ No newline at end of file
+        return ""
+
+async def parse_json_bytes(content: bytes) -> str:
+    """Decode downloaded JSON content as raw string without parsing"""
+    try:
+        return bytes(content).decode("utf-8")
+    except Exception as e:
+        logger.error(f"Error decoding JSON content: {str(e)}")
+        return ""
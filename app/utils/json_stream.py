@@ -0,0 +1,90 @@
+"""
+Incremental parsing of a JSON object that arrives in chunks.
+
+Used while the model streams its JSON response: every top-level member
+("key": value) is decoded as soon as its value is complete, so a section of
+the article can be rendered before the rest of the response has arrived.
+"""
+import json
+import re
+from typing import Any, List, Tuple
+
+from app.config.logging import get_logger
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+# Characters that can change the nesting or string state
+_SIGNIFICANT = re.compile(r'[\\"{}\[\],]')
+
+
+class JsonMemberStream:
+    """
+    Feed chunks of a JSON object with feed(); each call returns the top-level members
+    completed by that chunk, in order. Only the text of the member being received is kept.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._scanned = 0
+        self._member_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        members = []
+        if self.done:
+            return members
+        text = self._text + chunk
+        pos = self._scanned
+        while pos < len(text):
+            if self._escaped:
+                self._escaped = False
+                pos += 1
+                continue
+            match = _SIGNIFICANT.search(text, pos)
+            if match is None:
+                pos = len(text)
+                break
+            char, pos = match.group(), match.end()
+
+            if self._in_string:
+                if char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = pos
+            elif char == "," and self._depth == 1:
+                members.extend(self._decode(text[self._member_start:match.start()]))
+                self._member_start = pos
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    members.extend(self._decode(text[self._member_start:match.start()]))
+                    self.done = True
+                    break
+
+        # Keep only the member still being received
+        self._text = text[self._member_start:]
+        self._scanned = pos - self._member_start
+        self._member_start = 0
+        return members
+
+    @staticmethod
+    def _decode(member: str) -> List[Tuple[str, Any]]:
+        if not member.strip():
+            return []
+        try:
+            return list(json.loads("{" + member + "}").items())
+        except ValueError as e:
+            # The complete response is parsed again at the end; that reports the error
+            logger.debug(f"Could not decode streamed JSON member: {e}")
+            return []
@@ -0,0 +1,100 @@
+"""
+Minimal async dependency graph for running pipeline stages concurrently.
+
+Each stage is an async function that receives the results of the stages it
+depends on as keyword arguments (named after those stages). A stage starts
+as soon as all of its dependencies have finished, so the graph's wall-clock
+time is its critical path rather than the sum of all stages.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from app.config.logging import get_logger
+
+# Initialize logger for this module
+logger = get_logger(__name__)
+
+
+class StageError(Exception):
+    """Raised by StageGraph.run when a stage fails; wraps the original exception."""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class StageGraph:
+    """A set of named async stages with dependencies between them."""
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self._stages: Dict[str, tuple] = {}
+        self.timings: Dict[str, float] = {}
+        self.started_at: Dict[str, float] = {}
+        self.wall_time: Optional[float] = None
+
+    def add_stage(self, name: str, func: Callable[..., Awaitable], depends_on: Iterable[str] = ()) -> "StageGraph":
+        """Register a stage; dependencies must be registered before it."""
+        depends_on = tuple(depends_on)
+        for dependency in depends_on:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+        self._stages[name] = (func, depends_on)
+        return self
+
+    async def run(self) -> Dict[str, object]:
+        """
+        Run all stages and return their results keyed by stage name.
+
+        Raises:
+            StageError: For the first stage that fails; all unfinished stages are cancelled.
+        """
+        graph_start = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str, func, depends_on: tuple):
+            inputs = {}
+            for dependency in depends_on:
+                inputs[dependency] = await tasks[dependency]
+            start = time.perf_counter()
+            self.started_at[name] = start - graph_start
+            try:
+                return await func(**inputs)
+            except asyncio.CancelledError:
+                raise
+            except StageError:
+                raise
+            except Exception as e:
+                raise StageError(name, e) from e
+            finally:
+                self.timings[name] = time.perf_counter() - start
+
+        for name, (func, depends_on) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, func, depends_on), name=f"{self.name}:{name}")
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.wall_time = time.perf_counter() - graph_start
+            self._log_timings()
+
+        return {name: task.result() for name, task in tasks.items()}
+
+    def _log_timings(self) -> None:
+        if not self.timings:
+            return
+        summary = ", ".join(
+            f"{name}={self.timings[name]:.2f}s@{self.started_at[name]:.2f}s"
+            for name in sorted(self.timings, key=lambda n: self.started_at.get(n, 0))
+        )
+        total = sum(self.timings.values())
+        logger.info(f"{self.name} stage timings (duration@start): {summary} | wall={self.wall_time:.2f}s, sum={total:.2f}s")
@@ -1,26 +1,26 @@
 # app/utils/database.py
-from supabase import Client
 from app.config.logging import get_logger
+from app.core.repositories import get_generated_docs_repository
+from app.core.status_bus import publish_job_status
 
 logger = get_logger(__name__)
 
-def update_document_status(supabase: Client, job_id: str, status: str) -> None:
+async def update_document_status(job_id: str, status: str) -> None:
     """
     Helper function to update the status column in the generated_docs table.
+    The new status is also published on the job status bus for /status and event streams.
     
     Args:
-        supabase: Supabase client instance
         job_id: The ID of the document to update
         status: The new status ('success' or 'failed')
     """
+    publish_job_status(job_id, status=status, stage="done" if status in ("success", "failed") else None)
     try:
         logger.info(f"Updating status to '{status}' for document ID {job_id}")
-        response = supabase.table("generated_docs").update(
-            {"status": status}
-        ).eq("id", job_id).execute()
+        updated = await get_generated_docs_repository().update_status(job_id, status)
 
-        if not response.data or len(response.data) == 0:
+        if not updated:
             logger.warning(f"No record found to update status for ID {job_id}")
     except Exception as e:
         logger.error(f"Failed to update status for document ID {job_id}: {e}")
-        raise ValueError(f"Failed to update document status: {e}")
\ No newline at end of file
+        raise ValueError(f"Failed to update document status: {e}")
@@ -0,0 +1,329 @@
+"""
+Offline end-to-end benchmark of SOP generation.
+
+Runs the real /api/v1/generate -> job queue -> process_sop_generation ->
+workflow path in-process against local Supabase and Gemini stand-ins
+(benchmarks/fakes), and reports throughput, job latency percentiles and
+peak RSS per synthetic session size.
+
+Usage:
+    python -m benchmarks.e2e --sizes 10 100 500 --jobs 5 --concurrency 2
+    python -m benchmarks.e2e --sizes 10 50 --input-modes pdf images
+
+Peak RSS is that of the whole benchmark process (app, fakes and client),
+sampled every 50 ms; compare runs of the same harness, not absolute values.
+
+Peak loop lag is the longest the app's event loop was blocked during a
+scenario (see sop_event_loop_lag_seconds). With --max-loop-lag-ms the run
+exits with status 1 if any scenario exceeds it, which catches blocking I/O
+creeping back onto the loop:
+
+    python -m benchmarks.e2e --sizes 10 100 --max-loop-lag-ms 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes.gemini import FakeGeminiSettings, create_fake_gemini_app
+from benchmarks.fakes.supabase import FakeSupabaseState, create_fake_supabase_app
+from benchmarks.synthetic import build_session, template_row
+
+BUCKET = "log_dataa"
+USER_ID = "bench-user"
+TEMPLATE_ID = "bench-template"
+
+# JWT-shaped placeholder; supabase-py validates the key format
+FAKE_SERVICE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.benchmark"
+
+TERMINAL_STATUSES = ("success", "failed")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    """Serve an ASGI app on a background thread and wait until it accepts connections."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError(f"Server on port {port} did not start")
+        time.sleep(0.05)
+    return server
+
+
+class RssSampler:
+    """Tracks the peak resident set size of this process between reset() calls."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def current_bytes() -> int:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        # Not Linux: fall back to the lifetime maximum
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+    def reset(self) -> None:
+        self.peak_bytes = self.current_bytes()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+async def run_job(client: httpx.AsyncClient, job_id: str, input_mode: Optional[str],
+                  poll_interval: float, timeout: float) -> tuple:
+    """
+    Submit one job and wait for its terminal status.
+    Returns (latency seconds, status, seconds until the first partial section or None).
+    """
+    start = time.perf_counter()
+    form = {
+        "user_id": USER_ID,
+        "job_id": job_id,
+        "query": "Create a step by step guide for this session",
+        "templates_id": TEMPLATE_ID,
+        "integration_type": "jira",
+    }
+    if input_mode:
+        form["input_mode"] = input_mode
+    while True:
+        response = await client.post("/api/v1/generate", data=form)
+        if response.status_code != 429:
+            response.raise_for_status()
+            break
+        await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+
+    deadline = start + timeout
+    first_section = None
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(poll_interval)
+        response = await client.get(f"/api/v1/status/{job_id}")
+        if response.status_code != 200:
+            continue
+        body = response.json()
+        if first_section is None and body.get("partial"):
+            first_section = time.perf_counter() - start
+        if body.get("status") in TERMINAL_STATUSES:
+            return time.perf_counter() - start, body["status"], first_section
+    return time.perf_counter() - start, "timeout", first_section
+
+
+async def run_scenario(base_url: str, state: FakeSupabaseState, screenshot_count: int, input_mode: Optional[str],
+                       jobs: int, concurrency: int, poll_interval: float, timeout: float, sampler: RssSampler) -> dict:
+    print(f"Preparing session with {screenshot_count} screenshots ({input_mode or 'default'} input)...", flush=True)
+    screenshots, event_log = build_session(screenshot_count)
+
+    job_ids = [f"bench-{screenshot_count}-{uuid.uuid4().hex[:8]}" for _ in range(jobs)]
+    for job_id in job_ids:
+        state.add_object(BUCKET, f"{USER_ID}/{job_id}/json/events.json", event_log, "application/json")
+        for name, data in screenshots:
+            state.add_object(BUCKET, f"{USER_ID}/{job_id}/screenshots/{name}", data, "image/png")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    sampler.reset()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def bounded(job_id):
+            async with semaphore:
+                return await run_job(client, job_id, input_mode, poll_interval, timeout)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[bounded(job_id) for job_id in job_ids])
+        wall = time.perf_counter() - start
+
+    for job_id in job_ids:
+        state.remove_prefix(BUCKET, f"{USER_ID}/{job_id}/")
+
+    latencies = [latency for latency, status, _ in results if status == "success"]
+    first_sections = [first for _, status, first in results if status == "success" and first is not None]
+    return {
+        "screenshots": screenshot_count,
+        "input_mode": input_mode or "default",
+        "jobs": jobs,
+        "succeeded": len(latencies),
+        "failed": sum(1 for _, status, _ in results if status != "success"),
+        "wall_seconds": round(wall, 3),
+        "throughput_jobs_per_min": round(len(latencies) / wall * 60, 3) if wall else 0.0,
+        "p50_seconds": round(percentile(latencies, 50), 3),
+        "p95_seconds": round(percentile(latencies, 95), 3),
+        "p99_seconds": round(percentile(latencies, 99), 3),
+        "mean_seconds": round(statistics.fmean(latencies), 3) if latencies else float("nan"),
+        "p50_first_section_seconds": round(percentile(first_sections, 50), 3),
+        "peak_rss_mb": round(sampler.peak_bytes / (1024 * 1024), 1),
+    }
+
+
+def print_report(results: List[dict]) -> None:
+    header = (f"{'shots':>6} {'input':>8} {'jobs':>5} {'ok':>4} {'jobs/min':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} "
+              f"{'1st sect s':>10} {'peak RSS MB':>12} {'loop lag ms':>12}")
+    print()
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['screenshots']:>6} {r['input_mode']:>8} {r['jobs']:>5} {r['succeeded']:>4} {r['throughput_jobs_per_min']:>9} "
+              f"{r['p50_seconds']:>8} {r['p95_seconds']:>8} {r['p99_seconds']:>8} {r['p50_first_section_seconds']:>10} "
+              f"{r['peak_rss_mb']:>12} "
+              f"{r['peak_loop_lag_ms']:>12}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="Screenshots per session")
+    parser.add_argument("--jobs", type=int, default=5, help="Jobs per session size")
+    parser.add_argument("--input-modes", nargs="+", choices=["pdf", "images", "auto"],
+                        help="Run every size once per input mode (default: the app's GENERATION_INPUT_MODE)")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs submitted at the same time")
+    parser.add_argument("--workers", type=int, default=2, help="JOB_WORKER_CONCURRENCY of the app")
+    parser.add_argument("--generate-latency", type=float, default=2.0, help="Fake generateContent latency (s)")
+    parser.add_argument("--generate-jitter", type=float, default=0.5, help="Extra random generateContent latency (s)")
+    parser.add_argument("--generate-failure-rate", type=float, default=0.0,
+                        help="Share of generateContent calls failing with 503 (exercises retries)")
+    parser.add_argument("--generate-stall-rate", type=float, default=0.0,
+                        help="Share of generateContent calls stalling for --stall-seconds (exercises hedging)")
+    parser.add_argument("--stall-seconds", type=float, default=60.0, help="Length of a stalled generateContent call")
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged generate requests in the app")
+    parser.add_argument("--tiering", action="store_true",
+                        help="Route small jobs and all jobs under queue pressure to the light model tier")
+    parser.add_argument("--upload-latency", type=float, default=0.3, help="Fake file upload latency (s)")
+    parser.add_argument("--response-steps", type=int, default=20, help="Steps in the fake generated article")
+    parser.add_argument("--step-chars", type=int, default=300, help="Characters per generated step")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Status polling interval (s)")
+    parser.add_argument("--timeout", type=float, default=900, help="Per-job timeout (s)")
+    parser.add_argument("--dedup", action="store_true", help="Leave job deduplication enabled")
+    parser.add_argument("--file-cache", action="store_true",
+                        help="Leave the GenAI upload cache enabled (jobs of a scenario have identical PDFs)")
+    parser.add_argument("--max-loop-lag-ms", type=float,
+                        help="Fail (exit status 1) if the app's event loop is blocked longer than this")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="sop-bench-")
+
+    supabase_state = FakeSupabaseState()
+    supabase_state.add_row("templates", template_row(TEMPLATE_ID, USER_ID))
+    supabase_state.rpc_rows["match_jira_vectors"] = [
+        {"issue_id": f"BENCH-{i}", "text_data": "Benchmark issue text " * 20, "score": 0.9 - i / 10}
+        for i in range(5)
+    ]
+    gemini_settings = FakeGeminiSettings(
+        generate_latency_seconds=args.generate_latency,
+        generate_jitter_seconds=args.generate_jitter,
+        failure_rate=args.generate_failure_rate,
+        stall_rate=args.generate_stall_rate,
+        stall_seconds=args.stall_seconds,
+        upload_latency_seconds=args.upload_latency,
+        response_steps=args.response_steps,
+        step_text_chars=args.step_chars,
+    )
+
+    supabase_port, gemini_port, app_port = _free_port(), _free_port(), _free_port()
+    start_server(create_fake_supabase_app(supabase_state), supabase_port)
+    start_server(create_fake_gemini_app(gemini_settings), gemini_port)
+
+    # The app reads its configuration at import time
+    os.environ.update({
+        "SUPABASE_URL": f"http://127.0.0.1:{supabase_port}",
+        "SUPABASE_SERVICE_ROLE_KEY": FAKE_SERVICE_KEY,
+        "GOOGLE_API_KEY": "benchmark",
+        "JOB_QUEUE_DB_PATH": os.path.join(workdir, "job_queue.sqlite3"),
+        "JOB_WORKER_CONCURRENCY": str(args.workers),
+        "JOB_QUEUE_MAX_DEPTH": str(max(100, args.jobs)),
+        "JOB_POLL_INTERVAL_SECONDS": "0.1",
+        "JOB_DEDUP_ENABLED": "true" if args.dedup else "false",
+        "GENAI_FILE_CACHE_ENABLED": "true" if args.file_cache else "false",
+        "TEMPLATE_CACHE_REALTIME": "false",
+        "GENAI_HEDGE_ENABLED": "true" if args.hedge else "false",
+        "MODEL_TIERING_ENABLED": "true" if args.tiering else "false",
+        # Hedge after a handful of jobs instead of the production default
+        "GENAI_HEDGE_MIN_SAMPLES": "5",
+        "GENAI_HEDGE_MIN_DELAY_SECONDS": "0",
+        "GENAI_BACKOFF_BASE_SECONDS": "0.2",
+    })
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+    from app.core.app import create_app
+    from app.core.metrics import peak_event_loop_lag
+    from benchmarks.fakes.gemini import install_fake_genai
+
+    install_fake_genai(f"http://127.0.0.1:{gemini_port}")
+    start_server(create_app(), app_port)
+
+    sampler = RssSampler()
+    results = []
+    try:
+        for size in args.sizes:
+            gemini_settings.screenshot_count = size
+            for input_mode in args.input_modes or [None]:
+                peak_event_loop_lag(reset=True)
+                result = asyncio.run(run_scenario(
+                    f"http://127.0.0.1:{app_port}", supabase_state, size, input_mode, args.jobs,
+                    args.concurrency, args.poll_interval, args.timeout, sampler
+                ))
+                result["peak_loop_lag_ms"] = round(peak_event_loop_lag() * 1000, 1)
+                results.append(result)
+                print(json.dumps(result), flush=True)
+    finally:
+        sampler.stop()
+
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_loop_lag_ms is not None:
+        blocked = [r for r in results if r["peak_loop_lag_ms"] > args.max_loop_lag_ms]
+        for r in blocked:
+            print(f"Event loop blocked for {r['peak_loop_lag_ms']} ms with {r['screenshots']} screenshots "
+                  f"({r['input_mode']} input), limit {args.max_loop_lag_ms} ms", file=sys.stderr)
+        if blocked:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
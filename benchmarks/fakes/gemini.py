@@ -0,0 +1,339 @@
+"""
+Local stand-in for the Gemini File API, generateContent (plain and streamed)
+and embeddings.
+
+The server side simulates latency and response size. install_fake_genai
+swaps the SDK entry points the app uses (genai.upload_file/delete_file, the
+GenerativeModel instance and the LangChain embedding model) for thin HTTP
+clients of this server, so every model call still crosses a socket and
+blocks a thread the way the real SDK does.
+"""
+import asyncio
+import base64
+import json
+import random
+import threading
+import uuid
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+
+@dataclass
+class FakeGeminiSettings:
+    """Latency and size knobs for the fake model."""
+    generate_latency_seconds: float = 2.0
+    generate_jitter_seconds: float = 0.5
+    upload_latency_seconds: float = 0.3
+    upload_bytes_per_second: float = 50 * 1024 * 1024
+    embed_latency_seconds: float = 0.05
+    stream_chunks: int = 16
+    # Share of generate requests answered with a 503, and of those stalling for stall_seconds first
+    failure_rate: float = 0.0
+    stall_rate: float = 0.0
+    stall_seconds: float = 60.0
+    # Generation latency of light-tier models ("lite" in the name) relative to the others
+    light_latency_factor: float = 0.5
+    response_steps: int = 20
+    step_text_chars: int = 300
+    screenshot_count: int = 10
+    embedding_dimensions: int = 768
+
+
+def build_article(settings: FakeGeminiSettings) -> dict:
+    """A generated article shaped like the SOP template output."""
+    filler = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 64)[:settings.step_text_chars]
+    steps = [
+        {
+            "step": f"Step {i + 1}: {filler[:80]}",
+            "explanation": filler,
+            "screenshotRef": f"screenshot_{i % max(settings.screenshot_count, 1)}.png",
+        }
+        for i in range(settings.response_steps)
+    ]
+    return {
+        "docTitle": "Benchmark SOP",
+        "shortDescription": filler[:120],
+        "title": "Benchmark SOP",
+        "introduction": {"paragraphs": [filler], "prerequisites": ["Access to the app"], "outcomes": ["Done"]},
+        "features": ["Feature A", "Feature B"],
+        "steps": steps,
+        "callouts": [filler[:160]],
+        "notes": [filler[:160]],
+        "conclusion": {"paragraphs": [filler], "nextSteps": ["Review the result"]},
+        "faq": [{"question": "Why?", "answer": filler[:200]}],
+    }
+
+
+def create_fake_gemini_app(settings: FakeGeminiSettings) -> FastAPI:
+    """Build the ASGI app; settings may be changed between benchmark scenarios."""
+    app = FastAPI()
+    files = {}
+    cached_contents = {}
+    lock = threading.Lock()
+
+    @app.post("/upload/v1beta/files")
+    async def upload_file(request: Request):
+        body = await request.body()
+        await asyncio.sleep(settings.upload_latency_seconds + len(body) / settings.upload_bytes_per_second)
+        file_id = uuid.uuid4().hex[:12]
+        name = f"files/{file_id}"
+        with lock:
+            files[name] = len(body)
+        return {
+            "file": {
+                "name": name,
+                "uri": f"{request.base_url}v1beta/{name}",
+                "mimeType": request.headers.get("content-type", "application/pdf"),
+                "sizeBytes": str(len(body)),
+                "state": "ACTIVE",
+            }
+        }
+
+    @app.get("/v1beta/files/{file_id}")
+    async def get_file(file_id: str, request: Request):
+        name = f"files/{file_id}"
+        with lock:
+            if name not in files:
+                return Response(json.dumps({"error": {"code": 404}}), status_code=404, media_type="application/json")
+            size = files[name]
+        return {"name": name, "uri": f"{request.base_url}v1beta/{name}", "sizeBytes": str(size), "state": "ACTIVE"}
+
+    @app.delete("/v1beta/files/{file_id}")
+    async def delete_file(file_id: str):
+        with lock:
+            files.pop(f"files/{file_id}", None)
+        return {}
+
+    @app.post("/v1beta/cachedContents")
+    async def create_cached_content(request: Request):
+        body = await request.json()
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        chars = sum(len(part.get("text", "")) for content in body.get("contents", []) for part in content.get("parts", []))
+        with lock:
+            cached_contents[name] = chars
+        return {"name": name, "model": body.get("model"), "ttl": body.get("ttl")}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def model_action(model_action: str, request: Request):
+        body = await request.json()
+        if model_action.endswith(":embedContent"):
+            await asyncio.sleep(settings.embed_latency_seconds)
+            return {"embedding": {"values": [random.random() for _ in range(settings.embedding_dimensions)]}}
+
+        parts = [part for content in body.get("contents", []) for part in content.get("parts", [])]
+        # Inline images cost transfer time like an upload does
+        inline_bytes = sum(len(part["inlineData"]["data"]) * 3 // 4 for part in parts if "inlineData" in part)
+        if random.random() < settings.failure_rate:
+            return Response(json.dumps({"error": {"code": 503, "status": "UNAVAILABLE"}}), status_code=503,
+                            media_type="application/json")
+        delay = settings.generate_latency_seconds + random.uniform(0, settings.generate_jitter_seconds)
+        if "lite" in model_action.split(":")[0]:
+            delay *= settings.light_latency_factor
+        if random.random() < settings.stall_rate:
+            delay += settings.stall_seconds
+        with lock:
+            cached_chars = cached_contents.get(body.get("cachedContent"), 0)
+        prompt_chars = sum(len(part.get("text", "")) for part in parts) + cached_chars
+        text = json.dumps(build_article(settings))
+        usage = {
+            "promptTokenCount": prompt_chars // 4,
+            "cachedContentTokenCount": cached_chars // 4,
+            "candidatesTokenCount": len(text) // 4,
+        }
+
+        if model_action.endswith(":streamGenerateContent"):
+            # The generation latency is spread over the chunks, as output tokens arrive
+            chunks = max(settings.stream_chunks, 1)
+            size = -(-len(text) // chunks)
+
+            async def events():
+                await asyncio.sleep(inline_bytes / settings.upload_bytes_per_second)
+                for i in range(0, len(text), size):
+                    await asyncio.sleep(delay / chunks)
+                    event = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[i:i + size]}]}}]}
+                    if i + size >= len(text):
+                        event["candidates"][0]["finishReason"] = "STOP"
+                        event["usageMetadata"] = usage
+                    yield f"data: {json.dumps(event)}\r\n\r\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay + inline_bytes / settings.upload_bytes_per_second)
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": usage,
+        }
+
+    return app
+
+
+class _FakeGeminiClient:
+    """Blocking HTTP client used by the SDK shims (called from worker threads, like the SDK)."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.http = httpx.Client(base_url=self.base_url, timeout=600)
+        # Model of each cached content created through this client
+        self.cached_content_models = {}
+
+    def upload_file(self, path, mime_type: Optional[str] = None, display_name: Optional[str] = None, **kwargs):
+        if hasattr(path, "read"):
+            data = path.read()
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+        response = self.http.post(
+            "/upload/v1beta/files", content=data,
+            headers={"content-type": mime_type or "application/octet-stream"}
+        )
+        response.raise_for_status()
+        file = response.json()["file"]
+        return SimpleNamespace(
+            name=file["name"], uri=file["uri"], display_name=display_name,
+            mime_type=file["mimeType"], size_bytes=int(file["sizeBytes"]),
+            state=SimpleNamespace(name=file["state"]),
+        )
+
+    def get_file(self, name, **kwargs):
+        response = self.http.get(f"/v1beta/{name}")
+        response.raise_for_status()
+        file = response.json()
+        return SimpleNamespace(name=file["name"], uri=file["uri"], state=SimpleNamespace(name=file["state"]))
+
+    def delete_file(self, name, **kwargs):
+        name = getattr(name, "name", name)
+        self.http.delete(f"/v1beta/{name}").raise_for_status()
+
+    def create_cached_content(self, model: str, contents, ttl=None, display_name: Optional[str] = None, **kwargs):
+        response = self.http.post("/v1beta/cachedContents", json={
+            "model": model, "contents": contents, "ttl": f"{ttl.total_seconds()}s" if ttl else None,
+        })
+        response.raise_for_status()
+        name = response.json()["name"]
+        self.cached_content_models[name] = model
+        return SimpleNamespace(name=name, model=model, display_name=display_name)
+
+    @staticmethod
+    def _generate_request(contents, cached_content: Optional[str]) -> dict:
+        parts = []
+        for content in contents if isinstance(contents, list) else [contents]:
+            if isinstance(content, str):
+                parts.append({"text": content})
+                continue
+            for part in content.get("parts", []) if isinstance(content, dict) else []:
+                if "text" in part:
+                    parts.append({"text": part["text"]})
+                elif "inline_data" in part:
+                    blob = part["inline_data"]
+                    parts.append({"inlineData": {
+                        "mimeType": blob["mime_type"], "data": base64.b64encode(blob["data"]).decode("ascii")
+                    }})
+                elif "file_data" in part:
+                    parts.append({"fileData": {
+                        "fileUri": part["file_data"]["file_uri"], "mimeType": part["file_data"]["mime_type"]
+                    }})
+        request = {"contents": [{"role": "user", "parts": parts}]}
+        if cached_content:
+            request["cachedContent"] = cached_content
+        return request
+
+    @staticmethod
+    def _usage(body: dict):
+        usage = body.get("usageMetadata")
+        if usage is None:
+            return None
+        return SimpleNamespace(
+            prompt_token_count=usage.get("promptTokenCount", 0),
+            cached_content_token_count=usage.get("cachedContentTokenCount", 0),
+            candidates_token_count=usage.get("candidatesTokenCount", 0),
+        )
+
+    def generate(self, model_name: str, contents, cached_content: Optional[str] = None) -> tuple:
+        """Returns (response text, usage metadata)."""
+        request = self._generate_request(contents, cached_content)
+        response = self.http.post(f"/v1beta/models/{model_name}:generateContent", json=request)
+        response.raise_for_status()
+        body = response.json()
+        return body["candidates"][0]["content"]["parts"][0]["text"], self._usage(body)
+
+    def generate_stream(self, model_name: str, contents, cached_content: Optional[str] = None):
+        """Yields (text chunk, usage metadata or None) as the server-sent events arrive."""
+        request = self._generate_request(contents, cached_content)
+        url = f"/v1beta/models/{model_name}:streamGenerateContent?alt=sse"
+        with self.http.stream("POST", url, json=request) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                body = json.loads(line[len("data: "):])
+                yield body["candidates"][0]["content"]["parts"][0]["text"], self._usage(body)
+
+    def embed(self, text: str) -> list:
+        response = self.http.post("/v1beta/models/embedding-001:embedContent", json={"content": {"parts": [{"text": text}]}})
+        response.raise_for_status()
+        return response.json()["embedding"]["values"]
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel.generate_content as used by the app."""
+
+    def __init__(self, client: _FakeGeminiClient, model_name: str = "gemini-2.0-flash",
+                 cached_content: Optional[str] = None):
+        self._client = client
+        self.model_name = model_name.removeprefix("models/")
+        self.cached_content = cached_content
+
+    def generate_content(self, contents=None, generation_config=None, stream: bool = False, **kwargs):
+        if stream:
+            return (
+                SimpleNamespace(text=text, usage_metadata=usage)
+                for text, usage in self._client.generate_stream(self.model_name, contents, self.cached_content)
+            )
+        text, usage = self._client.generate(self.model_name, contents, self.cached_content)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeEmbeddings:
+    """Drop-in for the LangChain embedding model."""
+
+    def __init__(self, client: _FakeGeminiClient):
+        self._client = client
+
+    def embed_query(self, text: str) -> list:
+        return self._client.embed(text)
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._client.embed(text) for text in texts]
+
+
+def install_fake_genai(base_url: str) -> None:
+    """
+    Point the app's Gemini calls at the fake server.
+    Must run after the app (and its ServiceManager) has been imported.
+    """
+    import google.generativeai as genai
+    from google.generativeai import caching
+    from app.config.pipeline_config import ModelTierConfig
+    from app.core.initializers import service_manager
+
+    client = _FakeGeminiClient(base_url)
+    model = FakeGenerativeModel(client)
+    genai.upload_file = client.upload_file
+    genai.get_file = client.get_file
+    caching.CachedContent.create = client.create_cached_content
+    genai.GenerativeModel.from_cached_content = (
+        lambda cached_content, generation_config=None, **kwargs: FakeGenerativeModel(
+            client, client.cached_content_models.get(cached_content, "gemini-2.0-flash"), cached_content=cached_content
+        )
+    )
+    genai.delete_file = client.delete_file
+    service_manager._genai_model = model
+    service_manager._tier_models = {
+        name: FakeGenerativeModel(client, name) for name in (ModelTierConfig.STANDARD_MODEL, ModelTierConfig.LIGHT_MODEL)
+    }
+    service_manager._embedding_model = FakeEmbeddings(client)
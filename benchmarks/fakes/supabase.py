@@ -0,0 +1,175 @@
+"""
+Local stand-in for the parts of Supabase the SOP pipeline talks to.
+
+Serves PostgREST-style table reads and writes, the match_jira_vectors RPC,
+and Storage folder listing and object downloads from in-memory state. It is
+just faithful enough for supabase-py and app.core.storage to work unchanged.
+"""
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request, Response
+
+# Shape of a PostgREST "single object requested but 0 or >1 rows" error
+_NOT_SINGLE_ERROR = {
+    "code": "PGRST116",
+    "details": "The result contains 0 rows",
+    "hint": None,
+    "message": "JSON object requested, multiple (or no) rows returned",
+}
+
+# Query parameters that are not column filters
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class FakeSupabaseState:
+    """Tables, RPC results and storage objects served by the fake."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[dict]] = {}
+        self.objects: Dict[str, Dict[str, tuple]] = {}
+        self.rpc_rows: Dict[str, List[dict]] = {}
+        self.lock = threading.Lock()
+
+    def add_row(self, table: str, row: dict) -> None:
+        with self.lock:
+            self.tables.setdefault(table, []).append(dict(row))
+
+    def add_object(self, bucket: str, path: str, data: bytes, mime_type: str) -> None:
+        """Store an object; identical bytes may be shared by many paths."""
+        etag = hashlib.md5(data).hexdigest()
+        with self.lock:
+            self.objects.setdefault(bucket, {})[path] = (data, mime_type, etag)
+
+    def remove_prefix(self, bucket: str, prefix: str) -> None:
+        with self.lock:
+            objects = self.objects.get(bucket, {})
+            for path in [p for p in objects if p.startswith(prefix)]:
+                del objects[path]
+
+    def get_rows(self, table: str) -> List[dict]:
+        with self.lock:
+            return [dict(row) for row in self.tables.get(table, [])]
+
+
+def _parse_filters(request: Request) -> Dict[str, str]:
+    filters = {}
+    for key, value in request.query_params.items():
+        if key in _RESERVED_PARAMS:
+            continue
+        if value.startswith("eq."):
+            filters[key] = value[3:]
+    return filters
+
+
+def _matches(row: dict, filters: Dict[str, str]) -> bool:
+    return all(str(row.get(column)) == value for column, value in filters.items())
+
+
+def _project(row: dict, select: Optional[str]) -> dict:
+    if not select or select.strip() == "*":
+        return row
+    columns = [column.strip() for column in select.split(",")]
+    return {column: row.get(column) for column in columns}
+
+
+def _respond(request: Request, rows: List[dict], status_code: int = 200) -> Response:
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return Response(json.dumps(_NOT_SINGLE_ERROR), status_code=406, media_type="application/json")
+        return Response(json.dumps(rows[0]), status_code=status_code, media_type="application/json")
+    return Response(json.dumps(rows), status_code=status_code, media_type="application/json")
+
+
+def create_fake_supabase_app(state: FakeSupabaseState) -> FastAPI:
+    """Build the ASGI app serving state."""
+    app = FastAPI()
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str):
+        return state.rpc_rows.get(function, [])
+
+    @app.get("/rest/v1/{table}")
+    async def select_rows(table: str, request: Request):
+        filters = _parse_filters(request)
+        select = request.query_params.get("select")
+        rows = [_project(row, select) for row in state.get_rows(table) if _matches(row, filters)]
+        return _respond(request, rows)
+
+    @app.post("/rest/v1/{table}")
+    async def insert_rows(table: str, request: Request):
+        payload = await request.json()
+        records = payload if isinstance(payload, list) else [payload]
+        merge = "merge-duplicates" in request.headers.get("prefer", "")
+        conflict_column = request.query_params.get("on_conflict", "id")
+        written = []
+        with state.lock:
+            rows = state.tables.setdefault(table, [])
+            for record in records:
+                existing = next(
+                    (row for row in rows if merge and row.get(conflict_column) == record.get(conflict_column)), None
+                )
+                if existing is not None:
+                    existing.update(record)
+                    written.append(dict(existing))
+                else:
+                    rows.append(dict(record))
+                    written.append(dict(record))
+        return _respond(request, written, status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update_rows(table: str, request: Request):
+        changes = await request.json()
+        filters = _parse_filters(request)
+        updated = []
+        with state.lock:
+            for row in state.tables.get(table, []):
+                if _matches(row, filters):
+                    row.update(changes)
+                    updated.append(dict(row))
+        return _respond(request, updated)
+
+    @app.delete("/rest/v1/{table}")
+    async def delete_rows(table: str, request: Request):
+        filters = _parse_filters(request)
+        with state.lock:
+            rows = state.tables.get(table, [])
+            deleted = [row for row in rows if _matches(row, filters)]
+            state.tables[table] = [row for row in rows if not _matches(row, filters)]
+        return _respond(request, deleted)
+
+    @app.post("/storage/v1/object/list/{bucket}")
+    async def list_objects(bucket: str, request: Request):
+        body = await request.json()
+        prefix = body.get("prefix", "").strip("/")
+        limit = int(body.get("limit", 100))
+        offset = int(body.get("offset", 0))
+        with state.lock:
+            entries = [
+                (path, data, mime_type, etag)
+                for path, (data, mime_type, etag) in state.objects.get(bucket, {}).items()
+                if path.rsplit("/", 1)[0] == prefix
+            ]
+        entries.sort(key=lambda entry: entry[0])
+        return [
+            {
+                "name": path.rsplit("/", 1)[-1],
+                "id": hashlib.md5(path.encode("utf-8")).hexdigest(),
+                "metadata": {"eTag": f'"{etag}"', "size": len(data), "mimetype": mime_type},
+            }
+            for path, data, mime_type, etag in entries[offset:offset + limit]
+        ]
+
+    @app.get("/storage/v1/object/{bucket}/{path:path}")
+    async def download_object(bucket: str, path: str):
+        with state.lock:
+            entry = state.objects.get(bucket, {}).get(path)
+        if entry is None:
+            return Response(json.dumps({"error": "not_found", "message": "Object not found"}),
+                            status_code=400, media_type="application/json")
+        data, mime_type, _ = entry
+        return Response(data, media_type=mime_type)
+
+    return app
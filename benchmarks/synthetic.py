@@ -0,0 +1,134 @@
+"""
+Synthetic recording sessions: screenshots, an event log and a template.
+"""
+import json
+import random
+from io import BytesIO
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw
+
+# A template schema shaped like the production SOP templates
+TEMPLATE_COMPONENTS = {
+    "type": "OBJECT",
+    "properties": {
+        "docTitle": {"type": "STRING"},
+        "shortDescription": {"type": "STRING"},
+        "title": {"type": "STRING"},
+        "introduction": {
+            "type": "OBJECT",
+            "properties": {
+                "paragraphs": {"type": "ARRAY", "items": {"type": "STRING"}},
+                "prerequisites": {"type": "ARRAY", "items": {"type": "STRING"}},
+                "outcomes": {"type": "ARRAY", "items": {"type": "STRING"}},
+            },
+        },
+        "features": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "steps": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "step": {"type": "STRING"},
+                    "explanation": {"type": "STRING"},
+                    "screenshotRef": {"type": "STRING"},
+                },
+                "required": ["step", "explanation"],
+            },
+        },
+        "callouts": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "notes": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "conclusion": {
+            "type": "OBJECT",
+            "properties": {
+                "paragraphs": {"type": "ARRAY", "items": {"type": "STRING"}},
+                "nextSteps": {"type": "ARRAY", "items": {"type": "STRING"}},
+            },
+        },
+        "faq": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"question": {"type": "STRING"}, "answer": {"type": "STRING"}},
+            },
+        },
+    },
+    "required": ["docTitle", "steps"],
+}
+
+
+def render_screenshot(index: int, width: int = 1280, height: int = 800) -> bytes:
+    """A PNG that looks roughly like an application screenshot (flat panels, text, an image, a cursor)."""
+    rng = random.Random(index)
+    image = Image.new("RGB", (width, height), (245, 246, 248))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 56], fill=(32, 41, 64))
+    draw.rectangle([0, 56, 220, height], fill=(228, 231, 236))
+    for row in range(rng.randint(6, 14)):
+        top = 80 + row * 48
+        draw.rectangle([250, top, width - 40, top + 36], fill=(255, 255, 255), outline=(210, 214, 220))
+        draw.text((262, top + 10), f"Field {index}-{row}: {'x' * rng.randint(5, 40)}", fill=(40, 40, 40))
+    # A photo-like panel so the PNG does not compress unrealistically well
+    panel = Image.effect_noise((width // 4, height // 4), 40 + index % 20).convert("RGB")
+    image.paste(panel, (width - width // 4 - 40, 80))
+    x, y = rng.randint(260, width - 60), rng.randint(80, height - 60)
+    draw.ellipse([x, y, x + 18, y + 18], outline=(220, 40, 40), width=3)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _recorded_event(event: str, index: int, timestamp: int, value: str = "") -> str:
+    page_url = f"https://app.example.com/section/{index // 5}"
+    fields = {
+        "event": event,
+        "tag": "input" if event == "input" else "button",
+        "id": f":r{index}:",
+        "classList": ["Polaris-TextField__Input", f"_Field_1c7zd_{index % 90}"],
+        "text": "" if event == "input" else f"Field {index}",
+        "value": value,
+        "placeholder": f"Placeholder {index}",
+        "pageURL": page_url,
+        "pageTitle": f"Section {index // 5}",
+        "newURL": page_url,
+        "timestamp": timestamp,
+        "scrollPosition": 0,
+    }
+    # The recorder leaves a trailing comma after the last field
+    return json.dumps(fields, indent=2)[:-2] + ",\n  \n}"
+
+
+def build_event_log(screenshot_names: List[str]) -> bytes:
+    """
+    Recorder event JSON shaped like the browser recorder's output (trailing commas included):
+    one click per screenshot, and a typed value with one input event per keystroke on every third.
+    """
+    events = []
+    timestamp = 1755967773503
+    for i, _ in enumerate(screenshot_names):
+        timestamp += 1000
+        events.append(_recorded_event("click", i, timestamp))
+        if i % 3 == 0:
+            typed = f"Example value {i}"
+            for length in range(1, len(typed) + 1):
+                timestamp += 120
+                events.append(_recorded_event("input", i, timestamp, typed[:length]))
+    return ("[" + ",\n".join(events) + ",]").encode("utf-8")
+
+
+def build_session(screenshot_count: int, width: int = 1280, height: int = 800) -> Tuple[List[Tuple[str, bytes]], bytes]:
+    """
+    Returns:
+        tuple: ([(screenshot file name, PNG bytes)], event JSON bytes)
+    """
+    screenshots = [
+        (f"screenshot_{i}.png", render_screenshot(i, width, height))
+        for i in range(screenshot_count)
+    ]
+    event_log = build_event_log([name for name, _ in screenshots])
+    return screenshots, event_log
+
+
+def template_row(template_id: str, user_id: str) -> dict:
+    """A private template row for the fake 'templates' table."""
+    return {"id": template_id, "user_id": user_id, "name": "Benchmark", "components": json.loads(json.dumps(TEMPLATE_COMPONENTS))}
@@ -0,0 +1,27 @@
+"""
+Gunicorn configuration for the production container (see Dockerfile).
+"""
+import os
+
+from prometheus_client import multiprocess
+
+bind = "0.0.0.0:8080"
+workers = 4
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+# Running jobs get JOB_SHUTDOWN_GRACE_SECONDS to finish when a worker stops, so allow a bit more
+graceful_timeout = 120
+keepalive = 5
+max_requests = 1000
+max_requests_jitter = 100
+accesslog = "-"
+errorlog = "-"
+
+
+def child_exit(server, worker):
+    """
+    Drop the live samples (e.g. sop_jobs_in_flight) of a worker that exited, was recycled
+    or killed on timeout, so they stop counting in the node's metrics.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,110 @@
+"""
+Tests for the event log compactor (app/utils/event_compactor.py).
+"""
+import json
+import os
+import sys
+
+import pytest
+
+for _module in ("dotenv", "loguru"):
+    pytest.importorskip(_module)
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from app.utils.event_compactor import compact_event_log, iter_events, merge_events
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('[{"event": "click"}, {"event": "input"}]', [{"event": "click"}, {"event": "input"}]),
+    # Trailing commas as written by the recorder
+    ('[\n{"event": "click",},\n{"event": "input", "classList": ["a", "b",],},\n]',
+     [{"event": "click"}, {"event": "input", "classList": ["a", "b"]}]),
+    # Commas, braces and escaped quotes inside strings are left alone
+    ('[{"text": "a,}b,]", "value": "say \\"hi\\",}"},]', [{"text": "a,}b,]", "value": 'say "hi",}'}]),
+    ('[{"text": "ends with a backslash \\\\"},]', [{"text": "ends with a backslash \\"}]),
+    # Concatenated and newline-delimited objects
+    ('{"event": "click"}{"event": "input"}', [{"event": "click"}, {"event": "input"}]),
+    ('{"event": "click"},\n{"event": "input"},\n', [{"event": "click"}, {"event": "input"}]),
+    # An object wrapping the events, and non-object entries
+    ('{"events": [{"event": "click"}, 1, "x"]}', [{"event": "click"}]),
+    ("", []),
+    ("  [ ]  ", []),
+])
+def test_iter_events(raw, expected):
+    assert list(iter_events(raw)) == expected
+
+
+@pytest.mark.parametrize("raw", ['[{"event": "click"', '[{"event": click}]', '{"a": 1} trailing'])
+def test_iter_events_rejects_invalid_json(raw):
+    with pytest.raises(ValueError):
+        list(iter_events(raw))
+
+
+def _input(value, element="name", event="input"):
+    return {"event": event, "tag": "INPUT", "id": element, "value": value}
+
+
+@pytest.mark.parametrize("events, expected", [
+    # A run of inputs on one element keeps only the last
+    ([_input("a"), _input("ab"), _input("abc")], [_input("abc")]),
+    # Keystrokes and inputs on the same element are one run
+    ([_input("a", event="keydown"), _input("a"), _input("a", event="keyup")], [_input("a", event="keyup")]),
+    # Runs on different elements are kept apart
+    ([_input("a"), _input("b", element="email"), _input("c")],
+     [_input("a"), _input("b", element="email"), _input("c")]),
+    # Any other event ends the run
+    ([_input("a"), {"event": "click"}, _input("ab")], [_input("a"), {"event": "click"}, _input("ab")]),
+    # Noise events are dropped and do not end a run
+    ([_input("a"), {"event": "mousemove"}, {"type": "Scroll"}, _input("ab")], [_input("ab")]),
+    ([{"event": "click"}, {"event": "click"}], [{"event": "click"}, {"event": "click"}]),
+    ([], []),
+])
+def test_merge_events(events, expected):
+    assert list(merge_events(events, noise_events=frozenset({"mousemove", "scroll"}))) == expected
+
+
+def _compact(events: list) -> list:
+    return json.loads(compact_event_log(json.dumps(events)))
+
+
+def test_page_fields_are_emitted_only_when_they_change():
+    page = {"pageURL": "https://app/a", "pageTitle": "A"}
+    events = [
+        {"event": "click", "id": "one", **page},
+        {"event": "click", "id": "two", **page},
+        {"event": "pageChange", "newURL": "https://app/b", "previousURL": "https://app/a", "pageTitle": "A"},
+        {"event": "click", "id": "three", "pageURL": "https://app/b", "pageTitle": "B"},
+    ]
+
+    assert _compact(events) == [
+        {"event": "click", "id": "one", "pageTitle": "A", "pageURL": "https://app/a"},
+        {"event": "click", "id": "two"},
+        {"event": "pageChange", "pageURL": "https://app/b"},
+        {"event": "click", "id": "three", "pageTitle": "B"},
+    ]
+
+
+def test_compact_form_drops_unused_fields_and_generated_classes():
+    event = {
+        "timestamp": 1, "x": 3, "value": "", "text": "  Save\n  changes ", "event": "click", "tag": "BUTTON",
+        "classList": ["btn", "css-1x2y3z", "sc-abc", "Button_root_12345_1"], "custom": "kept",
+    }
+
+    assert _compact([event]) == [
+        {"event": "click", "tag": "BUTTON", "classList": ["btn"], "text": "Save changes", "custom": "kept"}
+    ]
+
+
+def test_compact_event_log_is_one_event_per_line():
+    compact = compact_event_log('[{"event": "click",}, {"event": "mousemove"}, {"event": "submit"},]')
+
+    assert compact == '[\n{"event":"click"},\n{"event":"submit"}\n]'
+
+
+def test_undecodable_log_is_used_verbatim():
+    raw = "click on Save, then type the name"
+
+    assert compact_event_log(raw) == raw
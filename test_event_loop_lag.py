@@ -0,0 +1,122 @@
+"""
+Regression test: SOP generation must not block the event loop.
+
+Runs process_sop_generation against the benchmark's local Supabase and Gemini
+fakes (benchmarks/fakes) while monitor_event_loop_lag samples the loop, and
+fails if the loop was ever blocked longer than MAX_LOOP_LAG_SECONDS - which is
+what happens when blocking I/O (a sync Supabase call, a file write, PDF work)
+creeps back onto the loop.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+for _module in ("fastapi", "uvicorn", "httpx", "PIL", "pydantic", "google.generativeai"):
+    pytest.importorskip(_module)
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from benchmarks.e2e import BUCKET, FAKE_SERVICE_KEY, TEMPLATE_ID, USER_ID, _free_port, start_server
+from benchmarks.fakes.gemini import FakeGeminiSettings, create_fake_gemini_app
+from benchmarks.fakes.supabase import FakeSupabaseState, create_fake_supabase_app
+from benchmarks.synthetic import build_session, template_row
+
+# Longest the loop may be blocked at once; the fakes share the process, so allow some scheduling noise
+MAX_LOOP_LAG_SECONDS = 0.15
+
+SCREENSHOTS = 30
+
+# The app reads its configuration at import time, so the environment is set before any app import
+_SUPABASE_PORT, _GEMINI_PORT = _free_port(), _free_port()
+os.environ.update({
+    "SUPABASE_URL": f"http://127.0.0.1:{_SUPABASE_PORT}",
+    "SUPABASE_SERVICE_ROLE_KEY": FAKE_SERVICE_KEY,
+    "GOOGLE_API_KEY": "test",
+    "JOB_QUEUE_DB_PATH": os.path.join(tempfile.mkdtemp(prefix="sop-test-"), "job_queue.sqlite3"),
+    "JOB_DEDUP_ENABLED": "false",
+    "GENAI_FILE_CACHE_ENABLED": "false",
+    "TEMPLATE_CACHE_REALTIME": "false",
+    "SAVE_DEBUG_OUTPUT": "false",
+})
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+
+@pytest.fixture(scope="module")
+def supabase_state():
+    """Start the Supabase and Gemini fakes and point the app's model calls at the latter."""
+    state = FakeSupabaseState()
+    state.add_row("templates", template_row(TEMPLATE_ID, USER_ID))
+    state.rpc_rows["match_jira_vectors"] = [
+        {"issue_id": f"TEST-{i}", "text_data": "Test issue text " * 20, "score": 0.9 - i / 10} for i in range(5)
+    ]
+    settings = FakeGeminiSettings(
+        generate_latency_seconds=0.5, generate_jitter_seconds=0.0, upload_latency_seconds=0.1,
+        screenshot_count=SCREENSHOTS,
+    )
+    supabase_server = start_server(create_fake_supabase_app(state), _SUPABASE_PORT)
+    gemini_server = start_server(create_fake_gemini_app(settings), _GEMINI_PORT)
+
+    from app.services.pipeline_services.sop_pipeline import process_sop_generation  # noqa: F401 (imports the app)
+    from benchmarks.fakes.gemini import install_fake_genai
+
+    install_fake_genai(f"http://127.0.0.1:{_GEMINI_PORT}")
+    yield state
+
+    from app.services.file_services.image_pool import shutdown_image_pool
+
+    shutdown_image_pool()
+    supabase_server.should_exit = True
+    gemini_server.should_exit = True
+
+
+async def _run_job(job_id: str, input_mode: str) -> float:
+    """Run one job with the lag monitor on the same loop; returns the peak lag in seconds."""
+    from app.core.http_client import close_http_client
+    from app.core.metrics import monitor_event_loop_lag, peak_event_loop_lag
+    from app.services.pipeline_services.sop_pipeline import process_sop_generation
+
+    peak_event_loop_lag(reset=True)
+    monitor = asyncio.create_task(monitor_event_loop_lag(0.01))
+    try:
+        await process_sop_generation(
+            file_content=None,
+            file_filename=None,
+            user_id=USER_ID,
+            job_id=job_id,
+            query="Create a step by step guide for this session",
+            templates_id=TEMPLATE_ID,
+            integration_type="jira",
+            input_mode=input_mode,
+        )
+    finally:
+        monitor.cancel()
+        # The shared HTTP client belongs to this test's event loop
+        await close_http_client()
+    return peak_event_loop_lag()
+
+
+@pytest.mark.parametrize("input_mode", ["pdf", "images"])
+def test_generation_does_not_block_event_loop(supabase_state, input_mode):
+    job_id = f"test-{uuid.uuid4().hex[:8]}"
+    screenshots, event_log = build_session(SCREENSHOTS)
+    supabase_state.add_object(BUCKET, f"{USER_ID}/{job_id}/json/events.json", event_log, "application/json")
+    for name, data in screenshots:
+        supabase_state.add_object(BUCKET, f"{USER_ID}/{job_id}/screenshots/{name}", data, "image/png")
+
+    try:
+        peak_lag = asyncio.run(_run_job(job_id, input_mode))
+    finally:
+        supabase_state.remove_prefix(BUCKET, f"{USER_ID}/{job_id}/")
+
+    documents = [row for row in supabase_state.get_rows("generated_docs") if row.get("id") == job_id]
+    assert documents and documents[0].get("status") == "success"
+    assert peak_lag < MAX_LOOP_LAG_SECONDS, (
+        f"Event loop was blocked for {peak_lag * 1000:.0f} ms ({input_mode} input), "
+        f"limit {MAX_LOOP_LAG_SECONDS * 1000:.0f} ms"
+    )
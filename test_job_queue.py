@@ -0,0 +1,146 @@
+"""
+Tests for the persistent job queue's state machine (app/core/job_queue.py),
+run against a temporary SQLite database.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+for _module in ("dotenv", "loguru"):
+    pytest.importorskip(_module)
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from app.core.job_queue import JobQueue, QueueFullError
+
+WORKER = "worker-1"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "job_queue.sqlite3"))
+
+
+def test_claim_takes_oldest_job_and_counts_attempt(queue):
+    queue.enqueue("a", {"n": 1}, b"file")
+    queue.enqueue("b", {"n": 2})
+
+    job = queue.claim(WORKER)
+
+    assert (job.job_id, job.payload, job.file_content, job.attempts) == ("a", {"n": 1}, b"file", 1)
+    assert queue.get_status("a") == "running"
+    assert queue.depth() == 1
+
+
+def test_expired_lease_is_requeued(queue):
+    queue.enqueue("a", {})
+    queue.claim(WORKER, lease_seconds=-1)
+
+    assert queue.recover_expired(max_attempts=3) == []
+    assert queue.get_status("a") == "queued"
+    assert queue.renew_lease("a", WORKER) is False
+    assert queue.claim("worker-2").attempts == 2
+
+
+def test_live_lease_is_not_requeued(queue):
+    queue.enqueue("a", {})
+    queue.claim(WORKER, lease_seconds=60)
+
+    assert queue.recover_expired(max_attempts=3) == []
+    assert queue.get_status("a") == "running"
+
+
+def test_job_fails_when_attempts_reach_max(queue):
+    queue.enqueue("a", {}, b"file")
+    queue.claim(WORKER, lease_seconds=-1)
+    assert queue.recover_expired(max_attempts=2) == []
+
+    assert queue.claim(WORKER, lease_seconds=-1).attempts == 2
+    assert queue.recover_expired(max_attempts=2) == ["a"]
+    assert queue.get_status("a") == "failed"
+    assert queue.claim(WORKER) is None
+
+
+@pytest.mark.parametrize("interruptions, status, abandoned", [
+    (1, "queued", False),
+    (2, "failed", True),
+])
+def test_release_counts_interrupted_run(queue, interruptions, status, abandoned):
+    queue.enqueue("a", {})
+    results = []
+    for _ in range(interruptions):
+        queue.claim(WORKER)
+        results.append(queue.release("a", WORKER, max_attempts=2))
+
+    assert results[-1] is abandoned
+    assert queue.get_status("a") == status
+
+
+def test_deferred_job_is_claimed_after_delay(queue):
+    queue.enqueue("a", {})
+    queue.claim(WORKER)
+    queue.defer("a", WORKER, delay=60)
+
+    assert queue.get_status("a") == "queued"
+    assert queue.claim(WORKER) is None
+    first_deferred = queue.deferred_since("a")
+    assert first_deferred is not None
+
+    # Deferral does not use up attempts, and deferred_since keeps the first deferral
+    queue._conn.execute("UPDATE jobs SET available_at = ? WHERE id = 'a'", (time.time() - 1,))
+    job = queue.claim(WORKER)
+    assert (job.job_id, job.attempts) == ("a", 1)
+    queue.defer("a", WORKER, delay=0)
+    assert queue.deferred_since("a") == first_deferred
+
+
+def test_deferred_job_does_not_block_later_jobs(queue):
+    queue.enqueue("a", {})
+    queue.enqueue("b", {})
+    queue.claim(WORKER)
+    queue.defer("a", WORKER, delay=60)
+
+    assert queue.claim(WORKER).job_id == "b"
+
+
+def test_enqueue_raises_when_full(queue):
+    queue.enqueue("a", {}, max_depth=2)
+    queue.enqueue("b", {}, max_depth=2)
+
+    with pytest.raises(QueueFullError) as excinfo:
+        queue.enqueue("c", {}, max_depth=2)
+
+    assert excinfo.value.depth == 2
+    assert queue.get_status("c") is None
+    # Running jobs do not count towards the depth
+    queue.claim(WORKER)
+    assert queue.enqueue("c", {}, max_depth=2) is True
+
+
+@pytest.mark.parametrize("succeeded, status", [(True, "done"), (False, "failed")])
+def test_finished_job_can_be_enqueued_again(queue, succeeded, status):
+    queue.enqueue("a", {"n": 1})
+    queue.claim(WORKER)
+    queue.set_progress("a", {"stage": "generating"})
+    queue.complete("a", WORKER, succeeded=succeeded)
+    assert queue.get_status("a") == status
+
+    assert queue.enqueue("a", {"n": 2}, b"new") is True
+
+    job = queue.claim(WORKER)
+    assert (job.payload, job.file_content, job.attempts) == ({"n": 2}, b"new", 1)
+    assert queue.get_progress("a") is None
+
+
+@pytest.mark.parametrize("claimed", [False, True])
+def test_unfinished_job_is_not_enqueued_again(queue, claimed):
+    queue.enqueue("a", {"n": 1})
+    if claimed:
+        queue.claim(WORKER)
+
+    assert queue.enqueue("a", {"n": 2}) is False
+    assert queue.get_status("a") == ("running" if claimed else "queued")
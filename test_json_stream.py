@@ -0,0 +1,67 @@
+"""
+Tests for the incremental JSON member parser (app/utils/json_stream.py).
+"""
+import json
+import os
+import sys
+
+import pytest
+
+for _module in ("dotenv", "loguru"):
+    pytest.importorskip(_module)
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from app.utils.json_stream import JsonMemberStream
+
+DOCUMENTS = [
+    '{"docTitle": "Guide", "steps": [{"title": "Open", "body": "Click \\"Save\\", then {close}"}], "n": 3}',
+    # Escapes of every kind, including a string that ends in a backslash and an escaped unicode quote
+    '{"a": "back\\\\", "b": "\\u0022,}]", "c": "tab\\tnew\\nline", "d": "\\\\\\""}',
+    # Nested objects and arrays, commas inside them, and literals
+    '{"x": {"y": [1, 2, {"z": [3, 4]}], "w": {}}, "e": [], "t": true, "f": null, "num": -1.5e3}',
+    # Whitespace between tokens as a model emits it
+    '{\n  "docTitle" : "A" ,\n  "sections" : [\n    "one" ,\n    "two"\n  ]\n}\n',
+    '{}',
+    '{"only": "member"}',
+]
+
+
+def _feed(document: str, chunk_size: int) -> list:
+    stream = JsonMemberStream()
+    members = []
+    for start in range(0, len(document), chunk_size):
+        members.extend(stream.feed(document[start:start + chunk_size]))
+    assert stream.done
+    return members
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 10_000])
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_members_do_not_depend_on_chunking(document, chunk_size):
+    assert _feed(document, chunk_size) == list(json.loads(document).items())
+
+
+def test_members_are_returned_as_soon_as_complete():
+    stream = JsonMemberStream()
+
+    assert stream.feed('{"a": "x, y", "b": [1,') == [("a", "x, y")]
+    assert stream.feed(' 2]') == []
+    assert stream.feed(', "c"') == [("b", [1, 2])]
+    assert stream.feed(': {"d": 1}}') == [("c", {"d": 1})]
+    assert stream.done
+
+
+def test_text_after_the_object_is_ignored():
+    stream = JsonMemberStream()
+
+    assert stream.feed('{"a": 1} trailing') == [("a", 1)]
+    assert stream.feed('{"b": 2}') == []
+
+
+def test_undecodable_member_is_skipped():
+    stream = JsonMemberStream()
+
+    assert stream.feed('{"a": nope, "b": 2}') == [("b", 2)]
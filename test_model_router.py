@@ -0,0 +1,65 @@
+"""
+Tests for the model tier routing (app/services/ai_services/model_router.py).
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+for _module in ("dotenv", "loguru", "prometheus_client"):
+    pytest.importorskip(_module)
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from app.config.pipeline_config import ModelTierConfig
+from app.services.ai_services.model_router import TIER_LIGHT, TIER_STANDARD, count_schema_fields, route_model
+
+
+@pytest.fixture
+def tiering(monkeypatch):
+    monkeypatch.setattr(ModelTierConfig, "ENABLED", True)
+    monkeypatch.setattr(ModelTierConfig, "STANDARD_ONLY_OPERATIONS", frozenset({"rephrase"}))
+    monkeypatch.setattr(ModelTierConfig, "LIGHT_MAX_PROMPT_TOKENS", 1000)
+    monkeypatch.setattr(ModelTierConfig, "LIGHT_MAX_SCREENSHOTS", 15)
+    monkeypatch.setattr(ModelTierConfig, "LIGHT_MAX_SCHEMA_FIELDS", 10)
+    monkeypatch.setattr(ModelTierConfig, "SATURATION_QUEUE_DEPTH", 0)
+
+
+@pytest.mark.parametrize("operation, prompt_tokens, screenshots, schema_fields, tier, reason", [
+    ("generate_content", 500, 8, 5, TIER_LIGHT, "small"),
+    ("generate_content", 500, 15, 10, TIER_LIGHT, "small"),
+    ("generate_content", 500, 16, 5, TIER_STANDARD, "many_screenshots"),
+    ("generate_content", 1001, 1, 5, TIER_STANDARD, "large_prompt"),
+    ("generate_content", 500, 1, 11, TIER_STANDARD, "complex_template"),
+    ("mcp_agent", None, 0, 0, TIER_STANDARD, "unknown_size"),
+    ("rephrase", 10, 0, 0, TIER_STANDARD, "pinned"),
+])
+def test_route_by_size(tiering, operation, prompt_tokens, screenshots, schema_fields, tier, reason):
+    decision = asyncio.run(route_model(operation, prompt_tokens, screenshots, schema_fields))
+
+    assert (decision.tier, decision.reason) == (tier, reason)
+    expected_model = ModelTierConfig.LIGHT_MODEL if tier == TIER_LIGHT else ModelTierConfig.STANDARD_MODEL
+    assert decision.model_name == expected_model
+
+
+def test_disabled_tiering_uses_standard_model(monkeypatch):
+    monkeypatch.setattr(ModelTierConfig, "ENABLED", False)
+
+    decision = asyncio.run(route_model("generate_content", 10, 1, 1))
+
+    assert (decision.tier, decision.reason) == (TIER_STANDARD, "disabled")
+
+
+def test_count_schema_fields_includes_nested_properties():
+    schema = {
+        "type": "object",
+        "properties": {
+            "docTitle": {"type": "string"},
+            "steps": {"type": "array", "items": {"type": "object", "properties": {"title": {}, "body": {}}}},
+        },
+    }
+
+    assert count_schema_fields(schema) == 4
@@ -0,0 +1,113 @@
+"""
+Tests for /rephrase: each request is admitted by the node-wide rate limiter at
+interactive priority before the model is called, is answered with 429 and a
+Retry-After header when the quota does not free up in time, and stays on the
+standard model when model tiering is on.
+"""
+import os
+import sys
+import tempfile
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+for _module in ("fastapi", "multipart", "httpx", "pydantic", "langchain", "langchain_google_genai"):
+    pytest.importorskip(_module)
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+# The app reads its configuration at import time; no request here reaches Supabase
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ["JOB_QUEUE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="sop-test-"), "job_queue.sqlite3")
+
+MARKDOWN = "# Guide\n\n## Steps\n\nClick the Save button.\n\n## Notes\n\nNone."
+SECTION = "Click the Save button."
+
+
+class FakeChatModel:
+    """Stands in for ChatGoogleGenerativeAI and records the prompts it is sent."""
+
+    prompts = []
+
+    def __init__(self, model: str, **kwargs):
+        self.model = model
+
+    async def ainvoke(self, prompt):
+        FakeChatModel.prompts.append((self.model, prompt))
+        return SimpleNamespace(content="Select **Save**.")
+
+
+@pytest.fixture
+def rephrase(monkeypatch):
+    """Post to /rephrase through a limiter of its own scope; returns (post function, limiter)."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import routes
+    from app.config.pipeline_config import RateLimitConfig
+    from app.core.rate_limiter import RateLimiter
+
+    limiter = RateLimiter(f"test-{uuid.uuid4().hex[:8]}", requests_per_minute=1)
+    monkeypatch.setattr(RateLimitConfig, "ENABLED", True)
+    monkeypatch.setattr(RateLimitConfig, "INTERACTIVE_MAX_WAIT_SECONDS", 0.5)
+    monkeypatch.setattr(routes, "get_generate_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(routes, "ChatGoogleGenerativeAI", FakeChatModel)
+    FakeChatModel.prompts = []
+
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api/v1")
+    with TestClient(app) as client:
+        def post():
+            return client.post("/api/v1/rephrase", data={
+                "query": "Make it shorter", "markdown_text": MARKDOWN, "text_to_update": SECTION, "job_id": "job-1",
+            })
+        yield post, limiter
+
+
+def test_rephrase_is_admitted_at_interactive_priority(rephrase):
+    from prometheus_client import REGISTRY
+
+    post, limiter = rephrase
+    response = post()
+
+    assert response.status_code == 200
+    assert response.json() == {"rephrased_section": "Select **Save**.", "job_id": "job-1"}
+    assert len(FakeChatModel.prompts) == 1
+    _, prompt = FakeChatModel.prompts[0]
+    assert SECTION in str(prompt) and "Make it shorter" in str(prompt)
+    admitted = REGISTRY.get_sample_value(
+        "sop_rate_limit_wait_seconds_count", {"scope": limiter.scope, "priority": "interactive"}
+    )
+    assert admitted == 1
+
+
+def test_rephrase_returns_429_when_quota_is_exhausted(rephrase):
+    post, _ = rephrase
+    assert post().status_code == 200
+
+    response = post()
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert len(FakeChatModel.prompts) == 1
+
+
+def test_rephrase_uses_standard_model_when_tiering_is_on(rephrase, monkeypatch):
+    from prometheus_client import REGISTRY
+    from app.config.pipeline_config import ModelTierConfig
+
+    monkeypatch.setattr(ModelTierConfig, "ENABLED", True)
+    # Even a saturated queue must not move rephrasing to the light tier
+    monkeypatch.setattr(ModelTierConfig, "SATURATION_QUEUE_DEPTH", 1)
+    labels = {"operation": "rephrase", "tier": "standard", "reason": "pinned"}
+    before = REGISTRY.get_sample_value("sop_model_routing_total", labels) or 0
+    post, _ = rephrase
+
+    assert post().status_code == 200
+
+    assert [model for model, _ in FakeChatModel.prompts] == [ModelTierConfig.STANDARD_MODEL]
+    assert REGISTRY.get_sample_value("sop_model_routing_total", labels) == before + 1